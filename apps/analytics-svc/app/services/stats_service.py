@@ -4,7 +4,8 @@
 Содержит бизнес-логику для генерации статистики и аналитики.
 """
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from collections import defaultdict
 
@@ -15,6 +16,87 @@ from sqlalchemy.orm import selectinload
 from app.models.analytics import ScanEvent, UserActivity, PageView, AlbumView, EventType, DeviceType
 
 
+# Предвычисленные строковые значения перечислений для сборки ответов
+_DEVICE_VALUES: Dict[DeviceType, str] = {member: member.value for member in DeviceType}
+_EVENT_VALUES: Dict[EventType, str] = {member: member.value for member in EventType}
+
+
+def _period_filter(
+    timestamp_column,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> List[Any]:
+    """
+    Построение условий фильтрации по периоду.
+    
+    Args:
+        timestamp_column: Колонка с временной меткой события
+        start_date: Начальная дата
+        end_date: Конечная дата
+        
+    Returns:
+        List[Any]: Список условий для передачи в where()
+    """
+    conditions = []
+    if start_date:
+        conditions.append(timestamp_column >= start_date)
+    if end_date:
+        conditions.append(timestamp_column <= end_date)
+    return conditions
+
+
+def _period_info(start_date: Optional[datetime], end_date: Optional[datetime]) -> Dict[str, Optional[str]]:
+    """Описание периода статистики для ответа API."""
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None
+    }
+
+
+@dataclass(frozen=True)
+class StatsTarget:
+    """
+    Описание таблицы событий для расчета типовой статистики.
+    
+    Attributes:
+        model: Модель событий
+        id_column: Колонка с ID сущности
+        timestamp_column: Колонка с временной меткой события
+        averages: Колонки, по которым считаются средние значения
+        top_dimensions: Колонки для топ-10 значений
+    """
+    model: Any
+    id_column: Any
+    timestamp_column: Any
+    averages: Tuple[str, ...] = ()
+    top_dimensions: Tuple[str, ...] = ("country",)
+    
+    def filters(
+        self,
+        entity_id: int,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[Any]:
+        """Условия выборки событий сущности за период."""
+        return [self.id_column == entity_id, *_period_filter(self.timestamp_column, start_date, end_date)]
+
+
+_QR_CODE_TARGET = StatsTarget(
+    ScanEvent, ScanEvent.qr_code_id, ScanEvent.scan_timestamp,
+    top_dimensions=("country", "browser")
+)
+_ALBUM_TARGET = StatsTarget(
+    AlbumView, AlbumView.album_id, AlbumView.view_timestamp,
+    averages=("duration_seconds", "pages_viewed")
+)
+_PAGE_TARGET = StatsTarget(
+    PageView, PageView.page_id, PageView.view_timestamp,
+    averages=("duration_seconds",)
+)
+_USER_PAGE_TARGET = StatsTarget(PageView, PageView.user_id, PageView.view_timestamp)
+_USER_ALBUM_TARGET = StatsTarget(AlbumView, AlbumView.user_id, AlbumView.view_timestamp)
+
+
 class StatsService:
     """Сервис для работы со статистикой."""
     
@@ -27,85 +109,96 @@ class StatsService:
         """
         self.db = db
     
-    async def get_qr_code_stats(
+    async def _compute(
         self,
-        qr_code_id: int,
+        target: StatsTarget,
+        entity_id: int,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """
-        Получение статистики по QR коду.
+        Расчет общего набора агрегатов для цели статистики.
         
         Args:
-            qr_code_id: ID QR кода
+            target: Описание таблицы событий
+            entity_id: ID сущности
             start_date: Начальная дата
             end_date: Конечная дата
             
         Returns:
-            Dict[str, Any]: Статистика по QR коду
+            Dict[str, Any]: total, unique, avg_<колонка>, device_stats и <колонка>_stats
         """
-        # Базовый запрос
-        query = select(ScanEvent).where(ScanEvent.qr_code_id == qr_code_id)
-        
-        if start_date:
-            query = query.where(ScanEvent.scan_timestamp >= start_date)
-        if end_date:
-            query = query.where(ScanEvent.scan_timestamp <= end_date)
+        model = target.model
+        base_filter = target.filters(entity_id, start_date, end_date)
         
-        # Общее количество сканирований
-        total_scans_result = await self.db.execute(
-            select(func.count(ScanEvent.id)).where(ScanEvent.qr_code_id == qr_code_id)
-        )
-        total_scans = total_scans_result.scalar() or 0
-        
-        # Уникальные сканирования (по IP)
-        unique_scans_result = await self.db.execute(
-            select(func.count(func.distinct(ScanEvent.ip_address)))
-            .where(ScanEvent.qr_code_id == qr_code_id)
+        # Количество, уникальные (по IP) и средние значения одним запросом
+        totals_result = await self.db.execute(
+            select(
+                func.count(model.id).label('total'),
+                func.count(func.distinct(model.ip_address)).label('unique_count'),
+                *(func.avg(getattr(model, name)).label(f'avg_{name}') for name in target.averages)
+            )
+            .where(*base_filter)
         )
-        unique_scans = unique_scans_result.scalar() or 0
+        totals = totals_result.one()
+        stats: Dict[str, Any] = {
+            "total": totals.total or 0,
+            "unique": totals.unique_count or 0,
+        }
+        for name in target.averages:
+            stats[f"avg_{name}"] = round(getattr(totals, f'avg_{name}') or 0, 2)
         
         # Статистика по устройствам
         device_stats_result = await self.db.execute(
             select(
-                ScanEvent.device_type,
-                func.count(ScanEvent.id).label('count')
+                model.device_type,
+                func.count(model.id).label('count')
             )
-            .where(ScanEvent.qr_code_id == qr_code_id)
-            .group_by(ScanEvent.device_type)
+            .where(*base_filter)
+            .group_by(model.device_type)
         )
-        device_stats = {row.device_type.value: row.count for row in device_stats_result}
-        
-        # Статистика по странам
-        country_stats_result = await self.db.execute(
-            select(
-                ScanEvent.country,
-                func.count(ScanEvent.id).label('count')
+        stats["device_stats"] = {_DEVICE_VALUES[row.device_type]: row.count for row in device_stats_result}
+        
+        # Топ значений по измерениям (страны, браузеры)
+        for name in target.top_dimensions:
+            column = getattr(model, name)
+            top_result = await self.db.execute(
+                select(
+                    column.label('value'),
+                    func.count(model.id).label('count')
+                )
+                .where(*base_filter, column.isnot(None))
+                .group_by(column)
+                .order_by(desc('count'))
+                .limit(10)
             )
-            .where(and_(ScanEvent.qr_code_id == qr_code_id, ScanEvent.country.isnot(None)))
-            .group_by(ScanEvent.country)
-            .order_by(desc('count'))
-            .limit(10)
-        )
-        country_stats = {row.country: row.count for row in country_stats_result}
+            stats[f"{name}_stats"] = {row.value: row.count for row in top_result}
         
-        # Статистика по браузерам
-        browser_stats_result = await self.db.execute(
-            select(
-                ScanEvent.browser,
-                func.count(ScanEvent.id).label('count')
-            )
-            .where(and_(ScanEvent.qr_code_id == qr_code_id, ScanEvent.browser.isnot(None)))
-            .group_by(ScanEvent.browser)
-            .order_by(desc('count'))
-            .limit(10)
-        )
-        browser_stats = {row.browser: row.count for row in browser_stats_result}
+        return stats
+    
+    async def get_qr_code_stats(
+        self,
+        qr_code_id: int,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Получение статистики по QR коду.
+        
+        Args:
+            qr_code_id: ID QR кода
+            start_date: Начальная дата
+            end_date: Конечная дата
+            
+        Returns:
+            Dict[str, Any]: Статистика по QR коду
+        """
+        stats = await self._compute(_QR_CODE_TARGET, qr_code_id, start_date, end_date)
         
         # Последнее сканирование
         last_scan_result = await self.db.execute(
             select(ScanEvent)
-            .where(ScanEvent.qr_code_id == qr_code_id)
+            .where(*_QR_CODE_TARGET.filters(qr_code_id, start_date, end_date))
             .order_by(desc(ScanEvent.scan_timestamp))
             .limit(1)
         )
@@ -113,16 +206,13 @@ class StatsService:
         
         return {
             "qr_code_id": qr_code_id,
-            "total_scans": total_scans,
-            "unique_scans": unique_scans,
-            "device_stats": device_stats,
-            "country_stats": country_stats,
-            "browser_stats": browser_stats,
+            "total_scans": stats["total"],
+            "unique_scans": stats["unique"],
+            "device_stats": stats["device_stats"],
+            "country_stats": stats["country_stats"],
+            "browser_stats": stats["browser_stats"],
             "last_scan": last_scan.to_dict() if last_scan else None,
-            "period": {
-                "start_date": start_date.isoformat() if start_date else None,
-                "end_date": end_date.isoformat() if end_date else None
-            }
+            "period": _period_info(start_date, end_date)
         }
     
     async def get_user_stats(
@@ -148,50 +238,42 @@ class StatsService:
                 UserActivity.event_type,
                 func.count(UserActivity.id).label('count')
             )
-            .where(UserActivity.user_id == user_id)
+            .where(
+                UserActivity.user_id == user_id,
+                *_period_filter(UserActivity.event_timestamp, start_date, end_date)
+            )
             .group_by(UserActivity.event_type)
         )
-        activity_stats = {row.event_type.value: row.count for row in activity_stats_result}
+        activity_stats = {_EVENT_VALUES[row.event_type]: row.count for row in activity_stats_result}
         
-        # Статистика просмотров страниц
+        # Количество просмотров и среднее время на странице
         page_views_result = await self.db.execute(
-            select(func.count(PageView.id))
-            .where(PageView.user_id == user_id)
+            select(
+                func.count(PageView.id).label('total'),
+                func.avg(PageView.duration_seconds).label('avg_duration')
+            )
+            .where(*_USER_PAGE_TARGET.filters(user_id, start_date, end_date))
         )
-        total_page_views = page_views_result.scalar() or 0
+        page_views = page_views_result.one()
         
-        # Статистика просмотров альбомов
+        # Количество просмотров и среднее время в альбоме
         album_views_result = await self.db.execute(
-            select(func.count(AlbumView.id))
-            .where(AlbumView.user_id == user_id)
-        )
-        total_album_views = album_views_result.scalar() or 0
-        
-        # Среднее время на странице
-        avg_page_duration_result = await self.db.execute(
-            select(func.avg(PageView.duration_seconds))
-            .where(and_(PageView.user_id == user_id, PageView.duration_seconds.isnot(None)))
-        )
-        avg_page_duration = avg_page_duration_result.scalar() or 0
-        
-        # Среднее время в альбоме
-        avg_album_duration_result = await self.db.execute(
-            select(func.avg(AlbumView.duration_seconds))
-            .where(and_(AlbumView.user_id == user_id, AlbumView.duration_seconds.isnot(None)))
+            select(
+                func.count(AlbumView.id).label('total'),
+                func.avg(AlbumView.duration_seconds).label('avg_duration')
+            )
+            .where(*_USER_ALBUM_TARGET.filters(user_id, start_date, end_date))
         )
-        avg_album_duration = avg_album_duration_result.scalar() or 0
+        album_views = album_views_result.one()
         
         return {
             "user_id": user_id,
             "activity_stats": activity_stats,
-            "total_page_views": total_page_views,
-            "total_album_views": total_album_views,
-            "avg_page_duration_seconds": round(avg_page_duration, 2),
-            "avg_album_duration_seconds": round(avg_album_duration, 2),
-            "period": {
-                "start_date": start_date.isoformat() if start_date else None,
-                "end_date": end_date.isoformat() if end_date else None
-            }
+            "total_page_views": page_views.total or 0,
+            "total_album_views": album_views.total or 0,
+            "avg_page_duration_seconds": round(page_views.avg_duration or 0, 2),
+            "avg_album_duration_seconds": round(album_views.avg_duration or 0, 2),
+            "period": _period_info(start_date, end_date)
         }
     
     async def get_album_stats(
@@ -211,70 +293,17 @@ class StatsService:
         Returns:
             Dict[str, Any]: Статистика альбома
         """
-        # Общее количество просмотров
-        total_views_result = await self.db.execute(
-            select(func.count(AlbumView.id))
-            .where(AlbumView.album_id == album_id)
-        )
-        total_views = total_views_result.scalar() or 0
-        
-        # Уникальные просмотры
-        unique_views_result = await self.db.execute(
-            select(func.count(func.distinct(AlbumView.ip_address)))
-            .where(AlbumView.album_id == album_id)
-        )
-        unique_views = unique_views_result.scalar() or 0
-        
-        # Среднее время в альбоме
-        avg_duration_result = await self.db.execute(
-            select(func.avg(AlbumView.duration_seconds))
-            .where(and_(AlbumView.album_id == album_id, AlbumView.duration_seconds.isnot(None)))
-        )
-        avg_duration = avg_duration_result.scalar() or 0
-        
-        # Среднее количество просмотренных страниц
-        avg_pages_viewed_result = await self.db.execute(
-            select(func.avg(AlbumView.pages_viewed))
-            .where(and_(AlbumView.album_id == album_id, AlbumView.pages_viewed.isnot(None)))
-        )
-        avg_pages_viewed = avg_pages_viewed_result.scalar() or 0
-        
-        # Статистика по устройствам
-        device_stats_result = await self.db.execute(
-            select(
-                AlbumView.device_type,
-                func.count(AlbumView.id).label('count')
-            )
-            .where(AlbumView.album_id == album_id)
-            .group_by(AlbumView.device_type)
-        )
-        device_stats = {row.device_type.value: row.count for row in device_stats_result}
-        
-        # Статистика по странам
-        country_stats_result = await self.db.execute(
-            select(
-                AlbumView.country,
-                func.count(AlbumView.id).label('count')
-            )
-            .where(and_(AlbumView.album_id == album_id, AlbumView.country.isnot(None)))
-            .group_by(AlbumView.country)
-            .order_by(desc('count'))
-            .limit(10)
-        )
-        country_stats = {row.country: row.count for row in country_stats_result}
+        stats = await self._compute(_ALBUM_TARGET, album_id, start_date, end_date)
         
         return {
             "album_id": album_id,
-            "total_views": total_views,
-            "unique_views": unique_views,
-            "avg_duration_seconds": round(avg_duration, 2),
-            "avg_pages_viewed": round(avg_pages_viewed, 2),
-            "device_stats": device_stats,
-            "country_stats": country_stats,
-            "period": {
-                "start_date": start_date.isoformat() if start_date else None,
-                "end_date": end_date.isoformat() if end_date else None
-            }
+            "total_views": stats["total"],
+            "unique_views": stats["unique"],
+            "avg_duration_seconds": stats["avg_duration_seconds"],
+            "avg_pages_viewed": stats["avg_pages_viewed"],
+            "device_stats": stats["device_stats"],
+            "country_stats": stats["country_stats"],
+            "period": _period_info(start_date, end_date)
         }
     
     async def get_page_stats(
@@ -294,62 +323,16 @@ class StatsService:
         Returns:
             Dict[str, Any]: Статистика страницы
         """
-        # Общее количество просмотров
-        total_views_result = await self.db.execute(
-            select(func.count(PageView.id))
-            .where(PageView.page_id == page_id)
-        )
-        total_views = total_views_result.scalar() or 0
-        
-        # Уникальные просмотры
-        unique_views_result = await self.db.execute(
-            select(func.count(func.distinct(PageView.ip_address)))
-            .where(PageView.page_id == page_id)
-        )
-        unique_views = unique_views_result.scalar() or 0
-        
-        # Среднее время на странице
-        avg_duration_result = await self.db.execute(
-            select(func.avg(PageView.duration_seconds))
-            .where(and_(PageView.page_id == page_id, PageView.duration_seconds.isnot(None)))
-        )
-        avg_duration = avg_duration_result.scalar() or 0
-        
-        # Статистика по устройствам
-        device_stats_result = await self.db.execute(
-            select(
-                PageView.device_type,
-                func.count(PageView.id).label('count')
-            )
-            .where(PageView.page_id == page_id)
-            .group_by(PageView.device_type)
-        )
-        device_stats = {row.device_type.value: row.count for row in device_stats_result}
-        
-        # Статистика по странам
-        country_stats_result = await self.db.execute(
-            select(
-                PageView.country,
-                func.count(PageView.id).label('count')
-            )
-            .where(and_(PageView.page_id == page_id, PageView.country.isnot(None)))
-            .group_by(PageView.country)
-            .order_by(desc('count'))
-            .limit(10)
-        )
-        country_stats = {row.country: row.count for row in country_stats_result}
+        stats = await self._compute(_PAGE_TARGET, page_id, start_date, end_date)
         
         return {
             "page_id": page_id,
-            "total_views": total_views,
-            "unique_views": unique_views,
-            "avg_duration_seconds": round(avg_duration, 2),
-            "device_stats": device_stats,
-            "country_stats": country_stats,
-            "period": {
-                "start_date": start_date.isoformat() if start_date else None,
-                "end_date": end_date.isoformat() if end_date else None
-            }
+            "total_views": stats["total"],
+            "unique_views": stats["unique"],
+            "avg_duration_seconds": stats["avg_duration_seconds"],
+            "device_stats": stats["device_stats"],
+            "country_stats": stats["country_stats"],
+            "period": _period_info(start_date, end_date)
         }
     
     async def get_daily_stats(
@@ -5,11 +5,33 @@
 базовый URL и другие параметры.
 """
 
+from functools import cached_property, lru_cache
+from typing import List
+
 from app.commons.settings import CommonSettings
 
+# Безопасные CORS origins по умолчанию
+DEFAULT_CORS_ORIGINS = [
+    "http://localhost:3000",
+    "http://localhost:3001",
+    "http://127.0.0.1:3000",
+    "http://127.0.0.1:3001",
+]
+
+
+def _split_origins(value: str) -> List[str]:
+    """Разбивает строку origins через запятую, отбрасывая пустые элементы."""
+    return [origin.strip() for origin in value.split(',') if origin.strip()]
+
 
 class Settings(CommonSettings):
-    """Настройки для API Gateway."""
+    """
+    Настройки для API Gateway сервиса.
+    
+    Расширяет базовые настройки специфичными для API Gateway параметрами.
+    """
+    
+    model_config = {"env_prefix": ""}  # Без префикса для переменных окружения
     
     # URL микросервисов
     auth_service_url: str = "http://auth-svc:8000"
@@ -28,35 +50,56 @@ class Settings(CommonSettings):
     web_origins: str = "http://localhost:3000,http://127.0.0.1:3000,https://yourdomain.com"
     cors_allow_credentials: bool = True
     
-    @property
-    def cors_origins(self) -> list:
-        """Получает список разрешенных CORS origins."""
-        admin_origins = self.admin_origins.split(',') if self.admin_origins else []
-        web_origins = self.web_origins.split(',') if self.web_origins else []
-        origins = admin_origins + web_origins
+    @cached_property
+    def cors_origins(self) -> List[str]:
+        """
+        Получает список разрешенных CORS origins.
         
-        # Если origins не заданы, используем безопасные по умолчанию
-        if not origins:
-            origins = [
-                "http://localhost:3000", 
-                "http://localhost:3001",
-                "http://127.0.0.1:3000", 
-                "http://127.0.0.1:3001"
-            ]
+        Строки admin_origins и web_origins разбираются один раз,
+        результат кэшируется на экземпляре настроек.
+        """
+        origins = _split_origins(self.admin_origins) + _split_origins(self.web_origins)
         
-        return origins
+        # Если origins не заданы, используем безопасные по умолчанию
+        return origins or list(DEFAULT_CORS_ORIGINS)
+    
+    # Проверка исключенных путей регулярным выражением re2 (нужен google-re2)
+    exclude_paths_use_regex: bool = False
+    
+    # Доверять ли X-Forwarded-For (включено, если gateway стоит за прокси)
+    trust_proxy_headers: bool = True
+    
+    # Кэш проверенных токенов
+    auth_token_cache_ttl_seconds: int = 30
+    auth_token_cache_max_size: int = 10000
+    
+    # Тела запросов с Content-Length не больше этого размера (байт) буферизуются
+    # и повторяются при редиректах 307/308; большие тела передаются потоком
+    proxy_buffer_body_max_bytes: int = 1024 * 1024
     
     # Настройки rate limiting
     rate_limit_requests_per_minute: int = 60
     rate_limit_requests_per_hour: int = 1000
+    # Общий учет лимитов в Redis для всех воркеров (иначе - в памяти процесса)
+    rate_limit_use_redis: bool = False
     
     # Настройки логирования
     log_level: str = "INFO"
     log_format: str = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}"
+    log_serialize: bool = True
+    # Логировать каждый N-й успешный (2xx) запрос; 4xx/5xx логируются всегда
+    log_sample_rate: int = 1
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
     """
-    Настройки для API Gateway сервиса.
+    Получает настройки API Gateway.
     
-    Расширяет базовые настройки специфичными для API Gateway параметрами.
-    """
+    Настройки создаются один раз на процесс, повторные вызовы
+    возвращают закэшированный экземпляр.
     
-    model_config = {"env_prefix": ""}  # Без префикса для переменных окружения
\ No newline at end of file
+    Returns:
+        Settings: Настройки сервиса
+    """
+    return Settings()
@@ -0,0 +1,111 @@
+"""
+HTTP клиенты API Gateway.
+
+Содержит общие httpx клиенты с пулом соединений к микросервисам,
+которые создаются один раз на процесс и переиспользуются между запросами.
+"""
+
+from typing import Optional
+
+import httpx
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Параметры пула соединений к auth-svc
+AUTH_CLIENT_LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=100,
+    keepalive_expiry=30.0,
+)
+AUTH_CLIENT_TIMEOUT = httpx.Timeout(connect=2.0, read=5.0, write=5.0, pool=5.0)
+
+# Параметры пула соединений к проксируемым микросервисам
+PROXY_CLIENT_LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=100,
+    keepalive_expiry=30.0,
+)
+PROXY_CLIENT_TIMEOUT = httpx.Timeout(30.0)
+
+# Проверка здоровья сервисов должна отвечать быстро, поэтому у нее свой клиент
+HEALTH_CLIENT_TIMEOUT = httpx.Timeout(5.0)
+
+_auth_client: Optional[httpx.AsyncClient] = None
+_proxy_client: Optional[httpx.AsyncClient] = None
+_health_client: Optional[httpx.AsyncClient] = None
+
+
+def get_auth_client() -> httpx.AsyncClient:
+    """
+    Получает общий HTTP клиент для auth-svc.
+
+    Клиент создается лениво при первом обращении и держит keep-alive
+    соединения, поэтому проверка токена не платит за установку TCP/TLS.
+    HTTP/2 согласуется через TLS (ALPN) и позволяет мультиплексировать
+    параллельные запросы в одном соединении; по http:// используется HTTP/1.1.
+
+    Returns:
+        httpx.AsyncClient: Клиент с base_url auth-svc
+    """
+    global _auth_client
+    if _auth_client is None or _auth_client.is_closed:
+        _auth_client = httpx.AsyncClient(
+            base_url=settings.auth_service_url,
+            http2=True,
+            limits=AUTH_CLIENT_LIMITS,
+            timeout=AUTH_CLIENT_TIMEOUT,
+        )
+    return _auth_client
+
+
+def get_proxy_client() -> httpx.AsyncClient:
+    """
+    Получает общий HTTP клиент для проксирования запросов к микросервисам.
+
+    Клиент без base_url: адрес сервиса определяется маршрутом прокси.
+    По умолчанию запрашивается несжатый ответ (Accept-Encoding: identity),
+    так как тело передается клиенту без распаковки; Accept-Encoding
+    клиента, если он есть, передается в сервис вместо этого значения.
+
+    Returns:
+        httpx.AsyncClient: Клиент с пулом соединений
+    """
+    global _proxy_client
+    if _proxy_client is None or _proxy_client.is_closed:
+        _proxy_client = httpx.AsyncClient(
+            http2=True,
+            limits=PROXY_CLIENT_LIMITS,
+            timeout=PROXY_CLIENT_TIMEOUT,
+            follow_redirects=True,
+            headers={"Accept-Encoding": "identity"},
+        )
+    return _proxy_client
+
+
+def get_health_client() -> httpx.AsyncClient:
+    """
+    Получает общий HTTP клиент для проверки здоровья микросервисов.
+
+    Returns:
+        httpx.AsyncClient: Клиент с коротким таймаутом
+    """
+    global _health_client
+    if _health_client is None or _health_client.is_closed:
+        _health_client = httpx.AsyncClient(timeout=HEALTH_CLIENT_TIMEOUT)
+    return _health_client
+
+
+async def close_http_clients() -> None:
+    """Закрывает общие HTTP клиенты при остановке приложения."""
+    global _auth_client, _proxy_client, _health_client
+    if _auth_client is not None:
+        await _auth_client.aclose()
+        _auth_client = None
+    if _proxy_client is not None:
+        await _proxy_client.aclose()
+        _proxy_client = None
+    if _health_client is not None:
+        await _health_client.aclose()
+        _health_client = None
@@ -0,0 +1,33 @@
+"""
+Настройка логирования API Gateway.
+
+Конфигурирует loguru так, чтобы форматирование и запись логов
+выполнялись в фоновом потоке, а не в корутине запроса.
+"""
+
+import sys
+
+from loguru import logger
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def configure_logging() -> None:
+    """
+    Настраивает sink loguru для сервиса.
+
+    Записи ставятся в очередь (enqueue=True) и сериализуются в JSON
+    вместе с контекстом из logger.bind(...).
+    """
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        level=settings.log_level,
+        format=settings.log_format,
+        enqueue=True,
+        serialize=settings.log_serialize,
+        backtrace=False,
+        diagnose=False,
+    )
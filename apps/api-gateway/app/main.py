@@ -1,16 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware as FastAPICORSMiddleware
 
 from app.routes import health, proxy, auth
 from app.middleware import AuthMiddleware, RateLimitMiddleware, LoggingMiddleware
-from app.config import Settings
+from app.middleware.rate_limit_middleware import close_rate_limiters, load_rate_limit_script
+from app.config import get_settings
+from app.http_clients import close_http_clients
+from app.redis_client import close_redis
+from app.logging_config import configure_logging
+
+settings = get_settings()
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Управление жизненным циклом приложения."""
+    # Загружаем Lua скрипт rate limiting в Redis до первых запросов
+    await load_rate_limit_script()
+    yield
+    # Останавливаем фоновую очистку rate limiting, закрываем общие HTTP клиенты и Redis
+    await close_rate_limiters()
+    await close_http_clients()
+    await close_redis()
 
-settings = Settings()
 
 app = FastAPI(
     title="API Gateway",
     description="API Gateway для QR-Albums",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Добавляем middleware в правильном порядке
@@ -19,7 +40,11 @@ app = FastAPI(
 app.add_middleware(AuthMiddleware)
 
 # Rate limiting
-app.add_middleware(RateLimitMiddleware, requests_per_minute=60, requests_per_hour=1000)
+app.add_middleware(
+    RateLimitMiddleware,
+    requests_per_minute=settings.rate_limit_requests_per_minute,
+    requests_per_hour=settings.rate_limit_requests_per_hour,
+)
 
 # Логирование
 app.add_middleware(LoggingMiddleware)
@@ -4,96 +4,254 @@ Middleware для аутентификации.
 Проверяет JWT токены и добавляет информацию о пользователе в запрос.
 """
 
-import httpx
-from typing import Optional, Dict, Any
-from fastapi import Request, HTTPException, status
+import base64
+import hashlib
+import json
+import time
+from typing import Optional, Dict, Any, Tuple
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.config import Settings
+from app.config import get_settings
+from .prefix_trie import build_prefix_matcher
+from app.http_clients import get_auth_client
 
-settings = Settings()
+settings = get_settings()
 
+# Путь проверки токена относительно base_url клиента auth-svc
+AUTH_VERIFY_PATH = "/auth/verify"
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """Middleware для аутентификации пользователей."""
+# Префикс значения заголовка Authorization (заголовки в ASGI scope - bytes)
+_BEARER_PREFIX = b"Bearer "
+
+
+class TokenCache:
+    """
+    In-process кэш результатов проверки токенов с TTL.
+    
+    Ключом служит хэш токена, поэтому сами токены в памяти не хранятся.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_size: int):
+        """
+        Инициализация кэша.
+        
+        Args:
+            ttl_seconds: Время жизни записи в секундах
+            max_size: Максимальное количество записей
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: Dict[bytes, Tuple[float, Dict[str, Any]]] = {}
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        """Вычисляет ключ кэша для токена."""
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
     
-    def __init__(self, app, exclude_paths: Optional[list] = None):
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает информацию о пользователе для токена из кэша.
+        
+        Args:
+            token: JWT токен
+            
+        Returns:
+            Optional[Dict[str, Any]]: Информация о пользователе или None
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, user_info = entry
+        if time.monotonic() >= expires_at:
+            self._entries.pop(key, None)
+            return None
+        return user_info
+    
+    def set(self, token: str, user_info: Dict[str, Any], exp: Optional[float] = None) -> None:
+        """
+        Сохраняет результат проверки токена.
+        
+        Если известно время истечения токена, запись не переживает сам токен.
+        
+        Args:
+            token: JWT токен
+            user_info: Информация о пользователе
+            exp: Время истечения токена (unix-время)
+        """
+        ttl = self.ttl_seconds
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        
+        # Вытесняем самую старую запись при переполнении
+        if len(self._entries) >= self.max_size:
+            self._entries.pop(next(iter(self._entries)), None)
+        
+        self._entries[self._key(token)] = (time.monotonic() + ttl, user_info)
+
+
+def _unverified_exp(token: str) -> Optional[float]:
+    """
+    Читает claim exp из payload токена без проверки подписи.
+    
+    Подпись проверяет auth-svc, значение используется только для
+    ограничения времени жизни записи кэша.
+    
+    Args:
+        token: JWT токен
+        
+    Returns:
+        Optional[float]: Время истечения токена (unix-время) или None
+    """
+    try:
+        segment = token.split(".")[1]
+        payload = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except (IndexError, ValueError):
+        return None
+    exp = payload.get("exp") if isinstance(payload, dict) else None
+    return exp if isinstance(exp, (int, float)) else None
+
+
+# Пути, по умолчанию исключенные из проверки аутентификации, и matcher для них
+# (строится один раз на процесс, а не для каждого экземпляра middleware)
+_DEFAULT_AUTH_EXCLUDE = (
+    "/health",
+    "/health/ready",
+    "/healthz",
+    "/docs",
+    "/openapi.json",
+    "/redoc",
+    "/auth/login",
+    "/auth/register",
+    "/auth/refresh",
+    "/admin-api/v1/auth/login",
+    "/admin-api/v1/auth/register",
+    "/admin-api/v1/auth/refresh",
+    "/api/v1/auth/login",
+    "/api/v1/auth/register",
+    "/api/v1/auth/refresh",
+    "/scan/",  # Публичные сканирования
+    "/api/services",  # Список сервисов
+    "/api/services/",  # Проверка здоровья сервисов
+)
+_DEFAULT_AUTH_EXCLUDE_MATCHER = build_prefix_matcher(
+    _DEFAULT_AUTH_EXCLUDE, use_regex=settings.exclude_paths_use_regex
+)
+
+# Общий кэш для AuthMiddleware и OptionalAuthMiddleware
+_token_cache = TokenCache(
+    ttl_seconds=settings.auth_token_cache_ttl_seconds,
+    max_size=settings.auth_token_cache_max_size,
+)
+
+
+class AuthMiddleware:
+    """
+    Middleware для аутентификации пользователей.
+    
+    В режиме required=True запросы без действительного токена отклоняются
+    (кроме исключенных путей). В режиме required=False токен проверяется,
+    если он передан, но запрос пропускается в любом случае.
+    """
+    
+    def __init__(self, app: ASGIApp, *, required: bool = True, exclude_paths: Optional[list] = None):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
+            required: Требовать ли аутентификацию
             exclude_paths: Список путей, исключенных из проверки аутентификации
         """
-        super().__init__(app)
-        self.exclude_paths = exclude_paths or [
-            "/health",
-            "/health/ready",
-            "/healthz",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-            "/auth/login",
-            "/auth/register",
-            "/auth/refresh",
-            "/admin-api/v1/auth/login",
-            "/admin-api/v1/auth/register",
-            "/admin-api/v1/auth/refresh",
-            "/api/v1/auth/login",
-            "/api/v1/auth/register",
-            "/api/v1/auth/refresh",
-            "/scan/",  # Публичные сканирования
-            "/api/services",  # Список сервисов
-            "/api/services/",  # Проверка здоровья сервисов
-        ]
+        self.app = app
+        self.required = required
+        if exclude_paths:
+            self.exclude_paths = exclude_paths
+            self._exclude_matcher = build_prefix_matcher(
+                exclude_paths, use_regex=settings.exclude_paths_use_regex
+            )
+        else:
+            self.exclude_paths = _DEFAULT_AUTH_EXCLUDE
+            self._exclude_matcher = _DEFAULT_AUTH_EXCLUDE_MATCHER
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с проверкой аутентификации.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Инициализируем состояние аутентификации (scope["state"] - это request.state)
+        state = scope.setdefault("state", {})
+        state["user"] = None
+        state["user_id"] = None
+        state["is_authenticated"] = False
+        
         # Проверяем, нужно ли исключить путь из проверки аутентификации
-        if self._should_exclude_path(request.url.path):
-            return await call_next(request)
+        if self.required and self._should_exclude_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
         
         # Получаем токен из заголовка Authorization
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(
+        token = self._get_bearer_token(scope)
+        if token is None:
+            if not self.required:
+                await self.app(scope, receive, send)
+                return
+            response = JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={"detail": "Токен аутентификации не предоставлен"}
             )
+            await response(scope, receive, send)
+            return
         
-        token = auth_header.split(" ")[1]
-        
-        try:
-            # Проверяем токен через auth-svc
-            user_info = await self._verify_token(token)
-            if not user_info:
-                return JSONResponse(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    content={"detail": "Недействительный токен аутентификации"}
-                )
-            
+        # Проверяем токен через auth-svc
+        user_info = await self._verify_token(token)
+        if user_info:
             # Добавляем информацию о пользователе в запрос
-            request.state.user = user_info
-            request.state.user_id = user_info.get("user_id")
-            request.state.is_authenticated = True
-            
-        except Exception as e:
-            return JSONResponse(
+            state["user"] = user_info
+            state["user_id"] = user_info.get("user_id")
+            state["is_authenticated"] = True
+        elif self.required:
+            response = JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": f"Ошибка проверки токена: {str(e)}"}
+                content={"detail": "Недействительный токен аутентификации"}
             )
+            await response(scope, receive, send)
+            return
         
-        return await call_next(request)
+        await self.app(scope, receive, send)
+    
+    @staticmethod
+    def _get_bearer_token(scope: Scope) -> Optional[str]:
+        """
+        Получает Bearer токен напрямую из заголовков ASGI scope.
+        
+        Префикс проверяется на bytes, декодируется только сам токен.
+        
+        Args:
+            scope: ASGI scope запроса
+            
+        Returns:
+            Optional[str]: Токен или None, если заголовок отсутствует или не Bearer
+        """
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if not value.startswith(_BEARER_PREFIX):
+                    return None
+                return value[len(_BEARER_PREFIX):].strip().decode("latin-1")
+        return None
     
     def _should_exclude_path(self, path: str) -> bool:
         """
@@ -105,10 +263,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         Returns:
             bool: True если путь нужно исключить
         """
-        for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):
-                return True
-        return False
+        return self._exclude_matcher.has_prefix(path)
     
     async def _verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
@@ -120,92 +275,41 @@ class AuthMiddleware(BaseHTTPMiddleware):
         Returns:
             Optional[Dict[str, Any]]: Информация о пользователе или None
         """
+        cached = _token_cache.get(token)
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{settings.auth_service_url}/auth/verify",
-                    headers={"Authorization": f"Bearer {token}"},
-                    timeout=5.0
-                )
+            client = get_auth_client()
+            response = await client.get(
+                AUTH_VERIFY_PATH,
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            
+            if response.status_code == 200:
+                user_info = response.json()
+                # auth-svc возвращает exp в ответе; для старых версий без него
+                # срок жизни берется из самого токена
+                exp = user_info.get("exp")
+                if not isinstance(exp, (int, float)):
+                    exp = _unverified_exp(token)
+                _token_cache.set(token, user_info, exp)
+                return user_info
+            else:
+                return None
                 
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return None
-                    
         except Exception:
             return None
 
 
-class OptionalAuthMiddleware(BaseHTTPMiddleware):
-    """Middleware для опциональной аутентификации."""
+class OptionalAuthMiddleware(AuthMiddleware):
+    """Middleware для опциональной аутентификации (AuthMiddleware с required=False)."""
     
-    def __init__(self, app):
+    def __init__(self, app: ASGIApp):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
-        """
-        super().__init__(app)
-    
-    async def dispatch(self, request: Request, call_next):
-        """
-        Обработка запроса с опциональной проверкой аутентификации.
-        
-        Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
-        """
-        # Инициализируем состояние аутентификации
-        request.state.user = None
-        request.state.user_id = None
-        request.state.is_authenticated = False
-        
-        # Получаем токен из заголовка Authorization
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            
-            try:
-                # Проверяем токен через auth-svc
-                user_info = await self._verify_token(token)
-                if user_info:
-                    request.state.user = user_info
-                    request.state.user_id = user_info.get("user_id")
-                    request.state.is_authenticated = True
-                    
-            except Exception:
-                # Игнорируем ошибки аутентификации для опционального middleware
-                pass
-        
-        return await call_next(request)
-    
-    async def _verify_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """
-        Проверяет токен через auth-svc.
-        
-        Args:
-            token: JWT токен
-            
-        Returns:
-            Optional[Dict[str, Any]]: Информация о пользователе или None
+            app: ASGI приложение
         """
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{settings.auth_service_url}/auth/verify",
-                    headers={"Authorization": f"Bearer {token}"},
-                    timeout=5.0
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return None
-                    
-        except Exception:
-            return None
+        super().__init__(app, required=False)
@@ -4,23 +4,77 @@ Middleware для CORS.
 Настраивает Cross-Origin Resource Sharing для API Gateway.
 """
 
-from typing import List, Optional
-from fastapi import Request
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware as FastAPICORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.config import Settings
+# Статические значения CORS заголовков для Development/Production middleware
+_DEFAULT_ALLOW_METHODS = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
+_DEFAULT_ALLOW_HEADERS = (
+    "Accept, Accept-Language, Content-Language, Content-Type, "
+    "Authorization, X-Requested-With, X-CSRFToken, X-API-Key"
+)
+_DEFAULT_EXPOSE_HEADERS = "X-Total-Count, X-Page-Count, X-Current-Page"
+_DEFAULT_MAX_AGE = "600"
 
-settings = Settings()
+# Количество origins, для которых кэшируются заголовки preflight ответа
+_PREFLIGHT_CACHE_SIZE = 32
 
 
-class CORSMiddleware(BaseHTTPMiddleware):
+def _is_preflight(scope: Scope, headers: Headers) -> bool:
+    """
+    Проверяет, является ли запрос preflight запросом CORS.
+    
+    Args:
+        scope: ASGI scope запроса
+        headers: Заголовки запроса
+        
+    Returns:
+        bool: True для OPTIONS с заголовком Access-Control-Request-Method
+    """
+    return scope["method"] == "OPTIONS" and "access-control-request-method" in headers
+
+
+async def _send_preflight(send: Send, headers: List[Tuple[bytes, bytes]]) -> None:
+    """
+    Отправляет ответ на preflight запрос с заранее собранными заголовками.
+    
+    Args:
+        send: ASGI send
+        headers: Заголовки ответа в формате ASGI
+    """
+    await send({"type": "http.response.start", "status": 204, "headers": headers})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _send_with_headers(send: Send, add_headers) -> Send:
+    """
+    Оборачивает send для добавления заголовков к началу ответа.
+    
+    Args:
+        send: ASGI send
+        add_headers: Функция, добавляющая заголовки в MutableHeaders
+        
+    Returns:
+        Send: Обернутый send
+    """
+    async def send_wrapper(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            add_headers(MutableHeaders(scope=message))
+        await send(message)
+    
+    return send_wrapper
+
+
+class CORSMiddleware:
     """Кастомный middleware для CORS."""
     
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         allow_origins: Optional[List[str]] = None,
         allow_credentials: bool = True,
         allow_methods: Optional[List[str]] = None,
@@ -32,7 +86,7 @@ class CORSMiddleware(BaseHTTPMiddleware):
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
             allow_origins: Разрешенные источники
             allow_credentials: Разрешить credentials
             allow_methods: Разрешенные HTTP методы
@@ -40,9 +94,11 @@ class CORSMiddleware(BaseHTTPMiddleware):
             expose_headers: Заголовки для экспозиции
             max_age: Максимальное время кэширования preflight запросов
         """
-        super().__init__(app)
+        self.app = app
         
         self.allow_origins = allow_origins or ["*"]
+        self._allow_any_origin = "*" in self.allow_origins
+        self._allowed_origins_set = frozenset(self.allow_origins)
         self.allow_credentials = allow_credentials
         self.allow_methods = allow_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
         self.allow_headers = allow_headers or [
@@ -61,41 +117,64 @@ class CORSMiddleware(BaseHTTPMiddleware):
             "X-Current-Page",
         ]
         self.max_age = max_age
+        
+        # Значения заголовков не меняются после инициализации, собираем их один раз
+        self._methods_header = ", ".join(self.allow_methods)
+        self._headers_header = ", ".join(self.allow_headers)
+        self._expose_header = ", ".join(self.expose_headers)
+        self._max_age_header = str(self.max_age)
+        
+        # Заголовки preflight ответа зависят только от origin
+        self._preflight_headers = lru_cache(maxsize=_PREFLIGHT_CACHE_SIZE)(self._build_preflight_headers)
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с CORS заголовками.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Получаем origin из запроса
-        origin = request.headers.get("Origin")
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        
+        # Запросы без Origin (сервис-сервис, curl, Postman) не являются CORS запросами
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
         
         # Проверяем, разрешен ли origin
-        if self._is_origin_allowed(origin):
-            # Обрабатываем preflight запрос
-            if request.method == "OPTIONS":
-                response = Response()
-                self._add_cors_headers(response, origin)
-                return response
+        preflight = _is_preflight(scope, headers)
+        origin_allowed = self._is_origin_allowed(origin)
+        if origin_allowed:
+            # Обрабатываем preflight запрос, не вызывая приложение
+            if preflight:
+                await _send_preflight(send, self._preflight_headers(origin))
+                return
             
             # Обрабатываем обычный запрос
-            response = await call_next(request)
-            self._add_cors_headers(response, origin)
-            return response
+            await self.app(
+                scope,
+                receive,
+                _send_with_headers(
+                    send, lambda headers: self._add_cors_headers(headers, origin, origin_allowed)
+                ),
+            )
         else:
             # Origin не разрешен
-            if request.method == "OPTIONS":
+            if preflight:
                 response = Response(status_code=403)
-                return response
+                await response(scope, receive, send)
+                return
             
             # Обрабатываем обычный запрос без CORS заголовков
-            return await call_next(request)
+            await self.app(scope, receive, send)
     
     def _is_origin_allowed(self, origin: Optional[str]) -> bool:
         """
@@ -110,151 +189,174 @@ class CORSMiddleware(BaseHTTPMiddleware):
         if not origin:
             return True  # Разрешаем запросы без origin (например, из Postman)
         
-        if "*" in self.allow_origins:
+        if self._allow_any_origin:
             return True
         
-        return origin in self.allow_origins
+        return origin in self._allowed_origins_set
+    
+    def _build_preflight_headers(self, origin: str) -> List[Tuple[bytes, bytes]]:
+        """
+        Собирает заголовки preflight ответа для разрешенного origin.
+        
+        Args:
+            origin: Origin из заголовка запроса
+            
+        Returns:
+            List[Tuple[bytes, bytes]]: Заголовки в формате ASGI
+        """
+        headers = MutableHeaders()
+        self._add_cors_headers(headers, origin, True)
+        return headers.raw
     
-    def _add_cors_headers(self, response: Response, origin: Optional[str]) -> None:
+    def _add_cors_headers(self, headers: MutableHeaders, origin: Optional[str], origin_allowed: bool) -> None:
         """
         Добавляет CORS заголовки к ответу.
         
         Args:
-            response: HTTP ответ
+            headers: Заголовки ответа
             origin: Origin из заголовка запроса
+            origin_allowed: Результат проверки origin, уже выполненной в __call__
         """
-        if origin and self._is_origin_allowed(origin):
-            response.headers["Access-Control-Allow-Origin"] = origin
-        elif "*" in self.allow_origins:
-            response.headers["Access-Control-Allow-Origin"] = "*"
+        if origin and origin_allowed:
+            headers["Access-Control-Allow-Origin"] = origin
+        elif self._allow_any_origin:
+            headers["Access-Control-Allow-Origin"] = "*"
         
         if self.allow_credentials:
-            response.headers["Access-Control-Allow-Credentials"] = "true"
+            headers["Access-Control-Allow-Credentials"] = "true"
         
-        response.headers["Access-Control-Allow-Methods"] = ", ".join(self.allow_methods)
-        response.headers["Access-Control-Allow-Headers"] = ", ".join(self.allow_headers)
-        response.headers["Access-Control-Expose-Headers"] = ", ".join(self.expose_headers)
-        response.headers["Access-Control-Max-Age"] = str(self.max_age)
+        headers["Access-Control-Allow-Methods"] = self._methods_header
+        headers["Access-Control-Allow-Headers"] = self._headers_header
+        headers["Access-Control-Expose-Headers"] = self._expose_header
+        headers["Access-Control-Max-Age"] = self._max_age_header
 
 
-class DevelopmentCORSMiddleware(BaseHTTPMiddleware):
+class DevelopmentCORSMiddleware:
     """CORS middleware для разработки (более мягкие настройки)."""
     
-    def __init__(self, app):
+    def __init__(self, app: ASGIApp):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
         """
-        super().__init__(app)
+        self.app = app
+        
+        # Заголовки preflight ответа не зависят от запроса, собираем их один раз
+        headers = MutableHeaders()
+        self._add_development_cors_headers(headers)
+        self._preflight_response_headers = headers.raw
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с CORS заголовками для разработки.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
-        # Обрабатываем preflight запрос
-        if request.method == "OPTIONS":
-            response = Response()
-            self._add_development_cors_headers(response)
-            return response
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Обрабатываем preflight запрос, не вызывая приложение
+        if _is_preflight(scope, Headers(scope=scope)):
+            await _send_preflight(send, self._preflight_response_headers)
+            return
         
         # Обрабатываем обычный запрос
-        response = await call_next(request)
-        self._add_development_cors_headers(response)
-        return response
+        await self.app(scope, receive, _send_with_headers(send, self._add_development_cors_headers))
     
-    def _add_development_cors_headers(self, response: Response) -> None:
+    def _add_development_cors_headers(self, headers: MutableHeaders) -> None:
         """
         Добавляет CORS заголовки для разработки.
         
         Args:
-            response: HTTP ответ
+            headers: Заголовки ответа
         """
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
-        response.headers["Access-Control-Allow-Headers"] = (
-            "Accept, Accept-Language, Content-Language, Content-Type, "
-            "Authorization, X-Requested-With, X-CSRFToken, X-API-Key"
-        )
-        response.headers["Access-Control-Expose-Headers"] = (
-            "X-Total-Count, X-Page-Count, X-Current-Page"
-        )
-        response.headers["Access-Control-Max-Age"] = "600"
+        headers["Access-Control-Allow-Origin"] = "*"
+        headers["Access-Control-Allow-Credentials"] = "true"
+        headers["Access-Control-Allow-Methods"] = _DEFAULT_ALLOW_METHODS
+        headers["Access-Control-Allow-Headers"] = _DEFAULT_ALLOW_HEADERS
+        headers["Access-Control-Expose-Headers"] = _DEFAULT_EXPOSE_HEADERS
+        headers["Access-Control-Max-Age"] = _DEFAULT_MAX_AGE
 
 
-class ProductionCORSMiddleware(BaseHTTPMiddleware):
+class ProductionCORSMiddleware:
     """CORS middleware для продакшена (строгие настройки)."""
     
-    def __init__(self, app, allowed_origins: List[str]):
+    def __init__(self, app: ASGIApp, allowed_origins: List[str]):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
             allowed_origins: Список разрешенных origins
         """
-        super().__init__(app)
+        self.app = app
         self.allowed_origins = allowed_origins
+        self._allowed_origins_set = frozenset(allowed_origins)
+        
+        # Набор origins фиксирован, поэтому заголовки preflight ответа собираются заранее
+        self._preflight_headers: Dict[str, List[Tuple[bytes, bytes]]] = {}
+        for origin in self._allowed_origins_set:
+            headers = MutableHeaders()
+            self._add_production_cors_headers(headers, origin)
+            self._preflight_headers[origin] = headers.raw
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с CORS заголовками для продакшена.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
-        origin = request.headers.get("Origin")
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        preflight = _is_preflight(scope, headers)
         
         # Проверяем, разрешен ли origin
-        if origin and origin in self.allowed_origins:
-            # Обрабатываем preflight запрос
-            if request.method == "OPTIONS":
-                response = Response()
-                self._add_production_cors_headers(response, origin)
-                return response
+        if origin and origin in self._allowed_origins_set:
+            # Обрабатываем preflight запрос, не вызывая приложение
+            if preflight:
+                await _send_preflight(send, self._preflight_headers[origin])
+                return
             
             # Обрабатываем обычный запрос
-            response = await call_next(request)
-            self._add_production_cors_headers(response, origin)
-            return response
+            await self.app(
+                scope,
+                receive,
+                _send_with_headers(send, lambda headers: self._add_production_cors_headers(headers, origin)),
+            )
         else:
             # Origin не разрешен
-            if request.method == "OPTIONS":
+            if preflight:
                 response = Response(status_code=403)
-                return response
+                await response(scope, receive, send)
+                return
             
             # Обрабатываем обычный запрос без CORS заголовков
-            return await call_next(request)
+            await self.app(scope, receive, send)
     
-    def _add_production_cors_headers(self, response: Response, origin: str) -> None:
+    def _add_production_cors_headers(self, headers: MutableHeaders, origin: str) -> None:
         """
         Добавляет CORS заголовки для продакшена.
         
         Args:
-            response: HTTP ответ
+            headers: Заголовки ответа
             origin: Разрешенный origin
         """
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
-        response.headers["Access-Control-Allow-Headers"] = (
-            "Accept, Accept-Language, Content-Language, Content-Type, "
-            "Authorization, X-Requested-With, X-CSRFToken, X-API-Key"
-        )
-        response.headers["Access-Control-Expose-Headers"] = (
-            "X-Total-Count, X-Page-Count, X-Current-Page"
-        )
-        response.headers["Access-Control-Max-Age"] = "600"
+        headers["Access-Control-Allow-Origin"] = origin
+        headers["Access-Control-Allow-Credentials"] = "true"
+        headers["Access-Control-Allow-Methods"] = _DEFAULT_ALLOW_METHODS
+        headers["Access-Control-Allow-Headers"] = _DEFAULT_ALLOW_HEADERS
+        headers["Access-Control-Expose-Headers"] = _DEFAULT_EXPOSE_HEADERS
+        headers["Access-Control-Max-Age"] = _DEFAULT_MAX_AGE
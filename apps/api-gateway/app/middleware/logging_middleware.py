@@ -4,87 +4,171 @@ Middleware для логирования запросов.
 Логирует все HTTP запросы с детальной информацией.
 """
 
-import time
-import json
-from typing import Dict, Any
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+import asyncio
+from time import perf_counter
+from typing import Dict, Any, List, Mapping, Optional
+
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from loguru import logger
 
-from app.config import Settings
+from app.config import get_settings
+from .prefix_trie import build_prefix_matcher
+
+settings = get_settings()
+
+# Методы, для которых логируется тело запроса
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+# Заголовки, которые не попадают в логи
+_SENSITIVE_HEADERS = frozenset({"authorization", "cookie"})
+
+# Пути, по умолчанию исключенные из логирования, и matcher для них
+# (строится один раз на процесс, а не для каждого экземпляра middleware)
+_DEFAULT_LOG_EXCLUDE = (
+    "/healthz",
+    "/docs",
+    "/openapi.json",
+    "/redoc",
+)
+_DEFAULT_LOG_EXCLUDE_MATCHER = build_prefix_matcher(
+    _DEFAULT_LOG_EXCLUDE, use_regex=settings.exclude_paths_use_regex
+)
 
-settings = Settings()
+# Уровни логирования завершенного запроса
+_LEVEL_INFO = "INFO"
+_LEVEL_WARNING = "WARNING"
+_LEVEL_ERROR = "ERROR"
+
+# Максимальное количество записей, ожидающих записи в лог
+_LOG_QUEUE_MAX_SIZE = 1000
+
+
+def _get_log_level(status_code: int) -> str:
+    """
+    Определяет уровень логирования по статусу ответа.
+    
+    Args:
+        status_code: HTTP статус ответа
+        
+    Returns:
+        str: Уровень логирования loguru
+    """
+    if status_code >= 400:
+        return _LEVEL_ERROR
+    if status_code >= 300:
+        return _LEVEL_WARNING
+    return _LEVEL_INFO
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+def _get_client_ip(scope: Scope, headers: Mapping[str, str], trust_proxy: bool) -> str:
+    """
+    Получает IP адрес клиента.
+    
+    Args:
+        scope: ASGI scope запроса
+        headers: Заголовки запроса
+        trust_proxy: Учитывать ли X-Forwarded-For
+        
+    Returns:
+        str: IP адрес клиента
+    """
+    # Учитываем X-Forwarded-For только за доверенным прокси
+    if trust_proxy:
+        forwarded_for = headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",", 1)[0].strip()
+    
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class LoggingMiddleware:
     """Middleware для логирования HTTP запросов."""
     
-    def __init__(self, app, exclude_paths: list = None):
+    def __init__(self, app: ASGIApp, exclude_paths: Optional[list] = None):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
             exclude_paths: Список путей, исключенных из логирования
         """
-        super().__init__(app)
-        self.exclude_paths = exclude_paths or [
-            "/healthz",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-        ]
+        self.app = app
+        if exclude_paths:
+            self.exclude_paths = exclude_paths
+            self._exclude_matcher = build_prefix_matcher(
+                exclude_paths, use_regex=settings.exclude_paths_use_regex
+            )
+        else:
+            self.exclude_paths = _DEFAULT_LOG_EXCLUDE
+            self._exclude_matcher = _DEFAULT_LOG_EXCLUDE_MATCHER
+        self._trust_proxy = settings.trust_proxy_headers
+        self._sample_rate = max(1, settings.log_sample_rate)
+        self._sample_counter = 0
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с логированием.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
         # Проверяем, нужно ли исключить путь из логирования
-        if self._should_exclude_path(request.url.path):
-            return await call_next(request)
+        if scope["type"] != "http" or self._should_exclude_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
         
         # Засекаем время начала обработки
-        start_time = time.time()
+        start_time = perf_counter()
         
         # Получаем информацию о запросе
-        request_info = self._get_request_info(request)
+        request_info = self._get_request_info(scope)
         
-        # Логируем входящий запрос
-        logger.info(
-            "Incoming request",
-            **request_info
-        )
+        # Успешные запросы логируем с семплированием
+        sampled = self._is_sampled()
         
-        # Обрабатываем запрос
-        response = await call_next(request)
+        # Логируем входящий запрос
+        if sampled:
+            logger.bind(**request_info).info("Incoming request")
         
-        # Вычисляем время обработки
-        process_time = time.time() - start_time
+        # Запоминаем начало ответа и время обработки до него
+        response_start: Dict[str, Any] = {}
         
-        # Получаем информацию об ответе
-        response_info = self._get_response_info(response, process_time)
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_start["message"] = message
+                response_start["process_time"] = perf_counter() - start_time
+            await send(message)
         
-        # Логируем ответ
-        log_level = "info"
-        if response.status_code >= 400:
-            log_level = "error"
-        elif response.status_code >= 300:
-            log_level = "warning"
-        
-        getattr(logger, log_level)(
-            "Request completed",
-            **request_info,
-            **response_info
-        )
+        # Обрабатываем запрос
+        await self.app(scope, receive, send_wrapper)
+        
+        if not response_start:
+            return
+        
+        # Логируем ответ (ошибки и редиректы логируются всегда)
+        log_level = _get_log_level(response_start["message"]["status"])
+        if sampled or log_level != _LEVEL_INFO:
+            response_info = self._get_response_info(
+                response_start["message"], response_start["process_time"]
+            )
+            logger.bind(**request_info, **response_info).log(log_level, "Request completed")
+    
+    def _is_sampled(self) -> bool:
+        """
+        Определяет, попадает ли запрос в выборку для логирования.
         
-        return response
+        Returns:
+            bool: True для каждого N-го запроса, где N = log_sample_rate
+        """
+        if self._sample_rate == 1:
+            return True
+        self._sample_counter += 1
+        return self._sample_counter % self._sample_rate == 0
     
     def _should_exclude_path(self, path: str) -> bool:
         """
@@ -96,139 +180,132 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         Returns:
             bool: True если путь нужно исключить
         """
-        for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):
-                return True
-        return False
+        return self._exclude_matcher.has_prefix(path)
     
-    def _get_request_info(self, request: Request) -> Dict[str, Any]:
+    def _get_request_info(self, scope: Scope) -> Dict[str, Any]:
         """
         Получает информацию о запросе.
         
         Args:
-            request: HTTP запрос
+            scope: ASGI scope запроса
             
         Returns:
             Dict[str, Any]: Информация о запросе
         """
-        # Получаем IP адрес
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Учитываем X-Forwarded-For для прокси
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-        
-        # Получаем User-Agent
-        user_agent = request.headers.get("User-Agent", "unknown")
-        
-        # Получаем Referer
-        referer = request.headers.get("Referer")
+        headers = Headers(scope=scope)
         
         # Получаем информацию о пользователе
-        user_id = None
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            user_id = request.state.user_id
+        user_id = scope.get("state", {}).get("user_id") or None
         
         return {
-            "method": request.method,
-            "path": request.url.path,
-            "query_params": str(request.query_params),
-            "client_ip": client_ip,
-            "user_agent": user_agent,
-            "referer": referer,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_params": scope.get("query_string", b"").decode("latin-1"),
+            "client_ip": _get_client_ip(scope, headers, self._trust_proxy),
+            "user_agent": headers.get("user-agent", "unknown"),
+            "referer": headers.get("referer"),
             "user_id": user_id,
-            "content_type": request.headers.get("Content-Type"),
-            "content_length": request.headers.get("Content-Length"),
+            "content_type": headers.get("content-type"),
+            "content_length": headers.get("content-length"),
         }
     
-    def _get_response_info(self, response, process_time: float) -> Dict[str, Any]:
+    def _get_response_info(self, message: Message, process_time: float) -> Dict[str, Any]:
         """
         Получает информацию об ответе.
         
         Args:
-            response: HTTP ответ
+            message: ASGI сообщение http.response.start
             process_time: Время обработки в секундах
             
         Returns:
             Dict[str, Any]: Информация об ответе
         """
+        headers = Headers(raw=message.get("headers", []))
         return {
-            "status_code": response.status_code,
+            "status_code": message["status"],
             "process_time": round(process_time, 4),
-            "response_size": response.headers.get("Content-Length", 0),
+            "response_size": headers.get("content-length", 0),
         }
 
 
-class DetailedLoggingMiddleware(BaseHTTPMiddleware):
+class DetailedLoggingMiddleware:
     """Детальный middleware для логирования с дополнительной информацией."""
     
-    def __init__(self, app, exclude_paths: list = None):
+    def __init__(self, app: ASGIApp, exclude_paths: Optional[list] = None):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
             exclude_paths: Список путей, исключенных из логирования
         """
-        super().__init__(app)
-        self.exclude_paths = exclude_paths or [
-            "/healthz",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-        ]
+        self.app = app
+        if exclude_paths:
+            self.exclude_paths = exclude_paths
+            self._exclude_matcher = build_prefix_matcher(
+                exclude_paths, use_regex=settings.exclude_paths_use_regex
+            )
+        else:
+            self.exclude_paths = _DEFAULT_LOG_EXCLUDE
+            self._exclude_matcher = _DEFAULT_LOG_EXCLUDE_MATCHER
+        self._trust_proxy = settings.trust_proxy_headers
+        self._log_queue: Optional[asyncio.Queue] = None
+        self._log_worker: Optional[asyncio.Task] = None
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с детальным логированием.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
         # Проверяем, нужно ли исключить путь из логирования
-        if self._should_exclude_path(request.url.path):
-            return await call_next(request)
+        if scope["type"] != "http" or self._should_exclude_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
         
         # Засекаем время начала обработки
-        start_time = time.time()
+        start_time = perf_counter()
         
         # Получаем информацию о запросе
-        request_info = self._get_detailed_request_info(request)
+        request_info = self._get_detailed_request_info(scope)
         
         # Логируем входящий запрос
-        logger.info(
-            "Incoming request",
-            **request_info
-        )
+        logger.bind(**request_info).info("Incoming request")
+        
+        # Перехватываем тело запроса по мере чтения обработчиком,
+        # разбор откладываем до завершения запроса
+        body_chunks: List[bytes] = []
+        if scope["method"] in _BODY_METHODS:
+            receive = self._capture_body(receive, body_chunks)
+        
+        # Запоминаем начало ответа и время обработки до него
+        response_start: Dict[str, Any] = {}
+        
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_start["message"] = message
+                response_start["process_time"] = perf_counter() - start_time
+            await send(message)
         
         # Обрабатываем запрос
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
         
-        # Вычисляем время обработки
-        process_time = time.time() - start_time
+        if not response_start:
+            return
         
         # Получаем информацию об ответе
-        response_info = self._get_detailed_response_info(response, process_time)
+        message = response_start["message"]
+        response_info = self._get_detailed_response_info(message, response_start["process_time"])
         
         # Логируем ответ
-        log_level = "info"
-        if response.status_code >= 400:
-            log_level = "error"
-        elif response.status_code >= 300:
-            log_level = "warning"
-        
-        getattr(logger, log_level)(
-            "Request completed",
-            **request_info,
-            **response_info
+        self._enqueue_log_record(
+            _get_log_level(message["status"]),
+            {**request_info, **response_info},
+            b"".join(body_chunks) if body_chunks else None
         )
-        
-        return response
     
     def _should_exclude_path(self, path: str) -> bool:
         """
@@ -240,84 +317,136 @@ class DetailedLoggingMiddleware(BaseHTTPMiddleware):
         Returns:
             bool: True если путь нужно исключить
         """
-        for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):
-                return True
-        return False
+        return self._exclude_matcher.has_prefix(path)
     
-    def _get_detailed_request_info(self, request: Request) -> Dict[str, Any]:
+    def _get_detailed_request_info(self, scope: Scope) -> Dict[str, Any]:
         """
         Получает детальную информацию о запросе.
         
         Args:
-            request: HTTP запрос
+            scope: ASGI scope запроса
             
         Returns:
             Dict[str, Any]: Детальная информация о запросе
         """
-        # Получаем IP адрес
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Учитываем X-Forwarded-For для прокси
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-        
-        # Получаем все заголовки
-        headers = dict(request.headers)
+        # Собираем заголовки за один проход, сразу без чувствительных
+        # (ключи в ASGI scope уже в нижнем регистре)
+        headers = {
+            k: v for k, v in Headers(scope=scope).items()
+            if k not in _SENSITIVE_HEADERS
+        }
         
         # Получаем информацию о пользователе
-        user_id = None
-        is_authenticated = False
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            user_id = request.state.user_id
-            is_authenticated = True
-        
-        # Получаем тело запроса (только для POST/PUT/PATCH)
-        body = None
-        if request.method in ["POST", "PUT", "PATCH"]:
-            try:
-                # Читаем тело запроса синхронно
-                body_bytes = request._body
-                if body_bytes:
-                    # Пытаемся декодировать как JSON
-                    try:
-                        body = json.loads(body_bytes.decode())
-                    except:
-                        # Если не JSON, оставляем как строку
-                        body = body_bytes.decode()[:1000]  # Ограничиваем размер
-            except:
-                body = "Error reading body"
+        user_id = scope.get("state", {}).get("user_id") or None
+        is_authenticated = user_id is not None
         
         return {
-            "method": request.method,
-            "path": request.url.path,
-            "query_params": str(request.query_params),
-            "client_ip": client_ip,
-            "user_agent": headers.get("User-Agent", "unknown"),
-            "referer": headers.get("Referer"),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_params": scope.get("query_string", b"").decode("latin-1"),
+            "client_ip": _get_client_ip(scope, headers, self._trust_proxy),
+            "user_agent": headers.get("user-agent", "unknown"),
+            "referer": headers.get("referer"),
             "user_id": user_id,
             "is_authenticated": is_authenticated,
-            "content_type": headers.get("Content-Type"),
-            "content_length": headers.get("Content-Length"),
-            "headers": {k: v for k, v in headers.items() if k.lower() not in ["authorization", "cookie"]},
-            "body": body,
+            "content_type": headers.get("content-type"),
+            "content_length": headers.get("content-length"),
+            "headers": headers,
         }
     
-    def _get_detailed_response_info(self, response, process_time: float) -> Dict[str, Any]:
+    def _get_detailed_response_info(self, message: Message, process_time: float) -> Dict[str, Any]:
         """
         Получает детальную информацию об ответе.
         
         Args:
-            response: HTTP ответ
+            message: ASGI сообщение http.response.start
             process_time: Время обработки в секундах
             
         Returns:
             Dict[str, Any]: Детальная информация об ответе
         """
+        headers = Headers(raw=message.get("headers", []))
         return {
-            "status_code": response.status_code,
+            "status_code": message["status"],
             "process_time": round(process_time, 4),
-            "response_size": response.headers.get("Content-Length", 0),
-            "response_headers": dict(response.headers),
+            "response_size": headers.get("content-length", 0),
+            "response_headers": dict(headers),
         }
+    
+    @staticmethod
+    def _capture_body(receive: Receive, body_chunks: List[bytes]) -> Receive:
+        """
+        Оборачивает receive для перехвата тела запроса без его предварительного чтения.
+        
+        Args:
+            receive: ASGI receive
+            body_chunks: Список, который заполняется частями тела по мере чтения
+            
+        Returns:
+            Receive: Обернутый receive
+        """
+        async def receive_and_capture() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                body_chunks.append(message.get("body", b""))
+            return message
+        
+        return receive_and_capture
+    
+    def _enqueue_log_record(
+        self,
+        log_level: str,
+        record: Dict[str, Any],
+        body_bytes: Optional[bytes]
+    ) -> None:
+        """
+        Ставит запись о завершенном запросе в очередь фонового логирования.
+        
+        Args:
+            log_level: Уровень логирования
+            record: Информация о запросе и ответе
+            body_bytes: Необработанное тело запроса
+        """
+        if self._log_queue is None:
+            self._log_queue = asyncio.Queue(maxsize=_LOG_QUEUE_MAX_SIZE)
+        if self._log_worker is None or self._log_worker.done():
+            self._log_worker = asyncio.create_task(self._process_log_queue())
+        
+        try:
+            self._log_queue.put_nowait((log_level, record, body_bytes))
+        except asyncio.QueueFull:
+            # Не задерживаем запрос, если логирование не успевает
+            logger.bind(path=record.get("path")).warning("Detailed log queue is full, dropping record")
+    
+    async def _process_log_queue(self) -> None:
+        """Фоновая задача: разбирает тела запросов и пишет записи в лог."""
+        while True:
+            log_level, record, body_bytes = await self._log_queue.get()
+            try:
+                record["body"] = self._decode_body(body_bytes)
+                logger.bind(**record).log(log_level, "Request completed")
+            except Exception as e:
+                logger.error(f"Error writing detailed request log: {str(e)}")
+            finally:
+                self._log_queue.task_done()
+    
+    @staticmethod
+    def _decode_body(body_bytes: Optional[bytes]) -> Any:
+        """
+        Декодирует тело запроса для логирования.
+        
+        Args:
+            body_bytes: Необработанное тело запроса
+            
+        Returns:
+            Any: JSON объект, строка (не более 1000 символов) или None
+        """
+        if not body_bytes:
+            return None
+        
+        # Пытаемся декодировать как JSON (orjson принимает bytes напрямую)
+        try:
+            return orjson.loads(body_bytes)
+        except orjson.JSONDecodeError:
+            # Если не JSON, оставляем как строку
+            return body_bytes.decode(errors="replace")[:1000]  # Ограничиваем размер
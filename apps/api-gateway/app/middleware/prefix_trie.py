@@ -0,0 +1,161 @@
+"""
+Префиксное дерево для проверки путей.
+
+Используется middleware для быстрой проверки, начинается ли путь
+запроса с одного из исключенных префиксов.
+"""
+
+import re
+from typing import Any, Dict, Iterable
+
+try:
+    import re2
+except ImportError:  # google-re2 - необязательная зависимость
+    re2 = None
+
+# Маркер конца префикса в узле дерева (пустая строка не совпадает ни с одним символом пути)
+_TERMINAL = ""
+
+
+class PrefixTrie:
+    """Префиксное дерево (dict-of-dicts) для набора строковых префиксов."""
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        """
+        Инициализация дерева.
+
+        Args:
+            prefixes: Префиксы для добавления в дерево
+        """
+        self._root: Dict[str, Any] = {}
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str) -> None:
+        """
+        Добавляет префикс в дерево.
+
+        Args:
+            prefix: Префикс пути
+        """
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_TERMINAL] = True
+
+    def has_prefix(self, path: str) -> bool:
+        """
+        Проверяет, начинается ли путь с одного из префиксов дерева.
+
+        Путь проходится один раз, поиск завершается на первом
+        совпавшем префиксе или на первом несовпадающем символе.
+
+        Args:
+            path: Путь запроса
+
+        Returns:
+            bool: True если путь начинается с одного из префиксов
+        """
+        node = self._root
+        if _TERMINAL in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if _TERMINAL in node:
+                return True
+        return False
+
+
+class RegexPrefixMatcher:
+    """
+    Проверка префиксов одним скомпилированным регулярным выражением.
+    
+    Используется с google-re2, где сопоставление выполняется за O(len(path))
+    в C-коде независимо от количества префиксов.
+    """
+
+    def __init__(self, prefixes: Iterable[str], engine: Any = re):
+        """
+        Инициализация matcher.
+
+        Args:
+            prefixes: Префиксы путей
+            engine: Модуль регулярных выражений (re2 или re)
+        """
+        pattern = "^(?:" + "|".join(re.escape(prefix) for prefix in prefixes) + ")"
+        self._regex = engine.compile(pattern)
+
+    def has_prefix(self, path: str) -> bool:
+        """
+        Проверяет, начинается ли путь с одного из префиксов.
+
+        Args:
+            path: Путь запроса
+
+        Returns:
+            bool: True если путь начинается с одного из префиксов
+        """
+        return self._regex.match(path) is not None
+
+
+class ScreenedPrefixMatcher:
+    """
+    Быстрый отсев путей перед основной проверкой префиксов.
+    
+    Большинство путей (например, /api/v1/users/...) не исключены; их можно
+    отбросить по одному символу после ведущего "/" без обхода дерева.
+    """
+
+    def __init__(self, matcher: Any, prefixes: Iterable[str]):
+        """
+        Инициализация matcher.
+
+        Args:
+            matcher: Основной matcher с методом has_prefix(path)
+            prefixes: Префиксы путей длиной не менее двух символов
+        """
+        self._matcher = matcher
+        self._second_chars = frozenset(prefix[1] for prefix in prefixes)
+
+    def has_prefix(self, path: str) -> bool:
+        """
+        Проверяет, начинается ли путь с одного из префиксов.
+
+        Args:
+            path: Путь запроса
+
+        Returns:
+            bool: True если путь начинается с одного из префиксов
+        """
+        if len(path) < 2 or path[1] not in self._second_chars:
+            return False
+        return self._matcher.has_prefix(path)
+
+
+def build_prefix_matcher(prefixes: Iterable[str], use_regex: bool = False):
+    """
+    Создает matcher для набора префиксов.
+
+    Регулярное выражение используется только если это включено
+    и установлен google-re2, иначе используется PrefixTrie. Перед основной
+    проверкой пути отсеиваются по символу после ведущего "/".
+
+    Args:
+        prefixes: Префиксы путей
+        use_regex: Использовать ли регулярное выражение re2
+
+    Returns:
+        Объект с методом has_prefix(path)
+    """
+    prefixes = list(prefixes)
+    if use_regex and re2 is not None and prefixes:
+        matcher = RegexPrefixMatcher(prefixes, engine=re2)
+    else:
+        matcher = PrefixTrie(prefixes)
+    
+    # Отсев по второму символу корректен, только если все префиксы длиннее одного символа
+    if prefixes and all(len(prefix) >= 2 for prefix in prefixes):
+        return ScreenedPrefixMatcher(matcher, prefixes)
+    return matcher
@@ -4,233 +4,430 @@ Middleware для rate limiting.
 Ограничивает количество запросов от одного IP или пользователя.
 """
 
+import asyncio
 import time
-from typing import Dict, Optional
-from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-from app.config import Settings
+import orjson
+from fastapi import status
+from loguru import logger
+from redis.exceptions import RedisError
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-settings = Settings()
+from app.config import get_settings
+from app.redis_client import get_redis
+from .prefix_trie import build_prefix_matcher
 
+settings = get_settings()
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware для ограничения скорости запросов."""
+# Фиксированные окна в Redis: по счетчику на минуту и на час для каждого клиента.
+# Скрипт атомарно проверяет оба лимита и увеличивает счетчики; TTL ставится
+# при создании счетчика. Возвращает 1, если запрос разрешен, иначе 0.
+# KEYS: счетчик минуты, счетчик часа; ARGV: лимит в минуту, лимит в час
+RATE_LIMIT_SCRIPT = """
+if (tonumber(redis.call('GET', KEYS[1])) or 0) >= tonumber(ARGV[1])
+    or (tonumber(redis.call('GET', KEYS[2])) or 0) >= tonumber(ARGV[2]) then
+    return 0
+end
+if redis.call('INCR', KEYS[1]) == 1 then redis.call('EXPIRE', KEYS[1], 60) end
+if redis.call('INCR', KEYS[2]) == 1 then redis.call('EXPIRE', KEYS[2], 3600) end
+return 1
+"""
+
+
+async def load_rate_limit_script() -> None:
+    """
+    Загружает скрипт rate limiting в Redis (SCRIPT LOAD) при старте приложения.
+    
+    Первые запросы сразу выполняются через EVALSHA без ответа NOSCRIPT.
+    Недоступность Redis при старте не мешает запуску: скрипт будет
+    загружен при первом вызове.
+    """
+    if not settings.rate_limit_use_redis:
+        return
+    try:
+        await get_redis().script_load(RATE_LIMIT_SCRIPT)
+    except RedisError as e:
+        logger.warning(f"Failed to preload rate limit script: {e}")
+
+
+# Ответ 429 не зависит от запроса, поэтому тело и заголовки сериализуются один раз
+_LIMIT_EXCEEDED_BODY = orjson.dumps({
+    "detail": "Превышен лимит запросов",
+    "retry_after": 60
+})
+_LIMIT_EXCEEDED_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_LIMIT_EXCEEDED_BODY)).encode()),
+    (b"retry-after", b"60"),
+]
+
+# Сколько символов X-Forwarded-For просматривается при поиске первого адреса
+_MAX_FORWARDED_FOR_LENGTH = 256
+
+
+class RedisRateLimiter:
+    """
+    Rate limiter с фиксированными окнами в Redis.
+    
+    Состояние общее для всех воркеров gateway, проверка и запись
+    выполняются одним вызовом EVALSHA.
+    """
     
-    def __init__(self, app, requests_per_minute: int = 60, requests_per_hour: int = 1000):
+    def __init__(self, redis_client):
         """
-        Инициализация middleware.
+        Инициализация limiter.
         
         Args:
-            app: FastAPI приложение
-            requests_per_minute: Максимальное количество запросов в минуту
-            requests_per_hour: Максимальное количество запросов в час
+            redis_client: Асинхронный клиент Redis
         """
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests_per_hour = requests_per_hour
-        self.requests: Dict[str, list] = {}
-        self.exclude_paths = [
-            "/healthz",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-        ]
+        # Script вызывает EVALSHA по заранее вычисленному sha и загружает скрипт при NOSCRIPT
+        self._script = redis_client.register_script(RATE_LIMIT_SCRIPT)
     
-    async def dispatch(self, request: Request, call_next):
+    async def try_acquire(self, client_id: str, requests_per_minute: int, requests_per_hour: int) -> bool:
         """
-        Обработка запроса с проверкой rate limiting.
+        Проверяет лимиты и записывает запрос клиента.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
+            client_id: Идентификатор клиента
+            requests_per_minute: Максимальное количество запросов в минуту
+            requests_per_hour: Максимальное количество запросов в час
             
         Returns:
-            HTTP ответ
+            bool: True если запрос разрешен
         """
-        # Проверяем, нужно ли исключить путь из rate limiting
-        if self._should_exclude_path(request.url.path):
-            return await call_next(request)
-        
-        # Получаем идентификатор клиента
-        client_id = self._get_client_id(request)
-        
-        # Проверяем rate limit
-        if not self._check_rate_limit(client_id):
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "detail": "Превышен лимит запросов",
-                    "retry_after": 60
-                },
-                headers={"Retry-After": "60"}
-            )
-        
-        # Записываем запрос
-        self._record_request(client_id)
-        
-        return await call_next(request)
+        # Окна в Redis общие для процессов, поэтому нужны часы реального времени
+        now = time.time_ns() // 1_000_000_000
+        # Hash tag {client_id} держит оба счетчика в одном слоте Redis Cluster
+        allowed = await self._script(
+            keys=[f"rl:{{{client_id}}}:m:{now // 60}", f"rl:{{{client_id}}}:h:{now // 3600}"],
+            args=[requests_per_minute, requests_per_hour],
+        )
+        return allowed == 1
+
+
+# Пути, исключенные из rate limiting, и matcher для них (строится один раз на процесс)
+_DEFAULT_RATE_LIMIT_EXCLUDE = (
+    "/healthz",
+    "/docs",
+    "/openapi.json",
+    "/redoc",
+)
+_DEFAULT_RATE_LIMIT_EXCLUDE_MATCHER = build_prefix_matcher(
+    _DEFAULT_RATE_LIMIT_EXCLUDE, use_regex=settings.exclude_paths_use_regex
+)
+
+# Состояние in-process limiter разбито на шарды с ограниченным размером (LRU),
+# чтобы память не росла неограниченно при большом количестве уникальных IP
+_BUCKET_SHARDS = 256
+_MAX_BUCKETS_PER_SHARD = 1024
+
+# Период фоновой очистки и время простоя, после которого bucket клиента удаляется.
+# За час простоя оба окна полностью пополняются, поэтому удаление не меняет лимитов.
+_CLEANUP_INTERVAL_SECONDS = 60
+_BUCKET_IDLE_MS = 3_600_000
+
+
+class _TokenBucket:
+    """Состояние token bucket одного клиента (изменяется на месте)."""
     
-    def _should_exclude_path(self, path: str) -> bool:
+    __slots__ = ("minute_tokens", "hour_tokens", "last_ms")
+    
+    def __init__(self, minute_tokens: float, hour_tokens: float, last_ms: int):
+        self.minute_tokens = minute_tokens
+        self.hour_tokens = hour_tokens
+        self.last_ms = last_ms
+
+
+class TokenBucketLimiter:
+    """
+    Rate limiter на token bucket в памяти процесса.
+    
+    На клиента хранится только остаток токенов минутного и часового окна
+    и время последнего обращения; проверка и запись выполняются за O(1).
+    try_acquire не содержит await, поэтому в event loop выполняется
+    атомарно и не требует блокировок; общий для воркеров учет - в Redis.
+    """
+    
+    def __init__(self):
+        """Инициализация limiter."""
+        self.shards: List["OrderedDict[str, _TokenBucket]"] = [
+            OrderedDict() for _ in range(_BUCKET_SHARDS)
+        ]
+    
+    def try_acquire(self, client_id: str, requests_per_minute: int, requests_per_hour: int) -> bool:
         """
-        Проверяет, нужно ли исключить путь из rate limiting.
+        Проверяет лимиты и списывает токен клиента.
+        
+        Токены пополняются непрерывно: requests_per_minute за минуту
+        и requests_per_hour за час, но не выше соответствующего лимита.
         
         Args:
-            path: Путь запроса
+            client_id: Идентификатор клиента
+            requests_per_minute: Максимальное количество запросов в минуту
+            requests_per_hour: Максимальное количество запросов в час
             
         Returns:
-            bool: True если путь нужно исключить
+            bool: True если запрос разрешен
         """
-        for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):
-                return True
-        return False
+        now_ms = time.monotonic_ns() // 1_000_000
+        
+        shard = self.shards[hash(client_id) & (_BUCKET_SHARDS - 1)]
+        bucket = shard.get(client_id)
+        if bucket is None:
+            bucket = _TokenBucket(float(requests_per_minute), float(requests_per_hour), now_ms)
+            shard[client_id] = bucket
+            # Вытесняем давно не обращавшегося клиента при переполнении шарда
+            if len(shard) > _MAX_BUCKETS_PER_SHARD:
+                shard.popitem(last=False)
+        else:
+            shard.move_to_end(client_id)
+            # Пополняем токены за прошедшее время, состояние обновляется на месте
+            elapsed_ms = now_ms - bucket.last_ms
+            if elapsed_ms:
+                bucket.minute_tokens = min(
+                    requests_per_minute, bucket.minute_tokens + elapsed_ms * requests_per_minute / 60_000
+                )
+                bucket.hour_tokens = min(
+                    requests_per_hour, bucket.hour_tokens + elapsed_ms * requests_per_hour / 3_600_000
+                )
+                bucket.last_ms = now_ms
+        
+        if bucket.minute_tokens < 1 or bucket.hour_tokens < 1:
+            return False
+        
+        bucket.minute_tokens -= 1
+        bucket.hour_tokens -= 1
+        return True
     
-    def _get_client_id(self, request: Request) -> str:
+    def evict_idle(self) -> int:
         """
-        Получает идентификатор клиента для rate limiting.
+        Удаляет buckets клиентов, не обращавшихся дольше _BUCKET_IDLE_MS.
+        
+        Шарды упорядочены по времени последнего обращения, поэтому
+        просматриваются только устаревшие записи в начале каждого шарда.
         
-        Args:
-            request: HTTP запрос
-            
         Returns:
-            str: Идентификатор клиента
+            int: Количество удаленных записей
         """
-        # Приоритет: user_id > IP адрес
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            return f"user:{request.state.user_id}"
-        
-        # Получаем IP адрес
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Учитываем X-Forwarded-For для прокси
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-        
-        return f"ip:{client_ip}"
+        cutoff_ms = time.monotonic_ns() // 1_000_000 - _BUCKET_IDLE_MS
+        evicted = 0
+        for shard in self.shards:
+            while shard:
+                client_id, bucket = next(iter(shard.items()))
+                if bucket.last_ms >= cutoff_ms:
+                    break
+                del shard[client_id]
+                evicted += 1
+        return evicted
+
+
+def _get_client_ip(scope: Scope) -> str:
+    """
+    Получает IP адрес клиента.
+    
+    Из X-Forwarded-For берется только первый адрес: заголовок обрезается
+    и не разбивается целиком, поэтому длинный заголовок не увеличивает работу.
+    
+    Args:
+        scope: ASGI scope запроса
+        
+    Returns:
+        str: IP адрес клиента
+    """
+    # Учитываем X-Forwarded-For для прокси
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for" and value:
+            forwarded_for = value[:_MAX_FORWARDED_FOR_LENGTH]
+            comma = forwarded_for.find(b",")
+            return (forwarded_for if comma < 0 else forwarded_for[:comma]).strip().decode("latin-1")
     
-    def _check_rate_limit(self, client_id: str) -> bool:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _get_client_id(scope: Scope) -> str:
+    """
+    Получает идентификатор клиента для rate limiting.
+    
+    Args:
+        scope: ASGI scope запроса
+        
+    Returns:
+        str: Идентификатор клиента
+    """
+    # Приоритет: user_id > IP адрес
+    user_id = scope.get("state", {}).get("user_id")
+    if user_id:
+        return f"user:{user_id}"
+    
+    return f"ip:{_get_client_ip(scope)}"
+
+
+async def _send_rate_limit_exceeded(send: Send) -> None:
+    """
+    Отправляет заранее собранный ответ 429 о превышении лимита запросов.
+    
+    Args:
+        send: ASGI send
+    """
+    await send({
+        "type": "http.response.start",
+        "status": status.HTTP_429_TOO_MANY_REQUESTS,
+        "headers": _LIMIT_EXCEEDED_HEADERS,
+    })
+    await send({"type": "http.response.body", "body": _LIMIT_EXCEEDED_BODY})
+
+
+# Экземпляры RateLimiter процесса: их фоновые задачи останавливаются при завершении приложения
+_rate_limiters: "weakref.WeakSet[RateLimiter]" = weakref.WeakSet()
+
+
+class RateLimiter:
+    """
+    Rate limiter для middleware: Redis, если он включен, иначе память процесса.
+    
+    Проверка лимитов и запись запроса выполняются одним вызовом try_acquire.
+    """
+    
+    def __init__(self):
+        """Инициализация limiter."""
+        self.redis_limiter = RedisRateLimiter(get_redis()) if settings.rate_limit_use_redis else None
+        # Учет в памяти процесса (без Redis или при его недоступности)
+        self.local_limiter = TokenBucketLimiter()
+        self._cleanup_task: Optional[asyncio.Task] = None
+        # Redis недоступен: переход на учет в памяти и восстановление логируются
+        # по одному разу, а не на каждый запрос
+        self._redis_unavailable = False
+        _rate_limiters.add(self)
+    
+    async def try_acquire(self, client_id: str, requests_per_minute: int, requests_per_hour: int) -> bool:
         """
-        Проверяет, не превышен ли rate limit для клиента.
+        Проверяет лимиты и записывает запрос клиента.
         
         Args:
             client_id: Идентификатор клиента
+            requests_per_minute: Максимальное количество запросов в минуту
+            requests_per_hour: Максимальное количество запросов в час
             
         Returns:
             bool: True если запрос разрешен
         """
-        current_time = time.time()
-        
-        # Получаем историю запросов для клиента
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-        
-        client_requests = self.requests[client_id]
-        
-        # Удаляем старые запросы (старше часа)
-        client_requests[:] = [
-            req_time for req_time in client_requests
-            if current_time - req_time < 3600
-        ]
-        
-        # Проверяем лимит в час
-        if len(client_requests) >= self.requests_per_hour:
-            return False
-        
-        # Проверяем лимит в минуту
-        minute_ago = current_time - 60
-        recent_requests = [
-            req_time for req_time in client_requests
-            if req_time > minute_ago
-        ]
-        
-        if len(recent_requests) >= self.requests_per_minute:
-            return False
-        
-        return True
+        if self.redis_limiter is not None:
+            try:
+                allowed = await self.redis_limiter.try_acquire(
+                    client_id, requests_per_minute, requests_per_hour
+                )
+            except RedisError as e:
+                if not self._redis_unavailable:
+                    self._redis_unavailable = True
+                    logger.warning(f"Redis rate limiter unavailable, using in-process limits: {e}")
+            else:
+                if self._redis_unavailable:
+                    self._redis_unavailable = False
+                    logger.info("Redis rate limiter recovered")
+                return allowed
+        
+        # Очистка нужна только учету в памяти процесса: при работающем Redis она не запускается
+        self._start_cleanup()
+        return self.local_limiter.try_acquire(client_id, requests_per_minute, requests_per_hour)
+    
+    async def close(self) -> None:
+        """Останавливает фоновую очистку (при остановке приложения)."""
+        task, self._cleanup_task = self._cleanup_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     
-    def _record_request(self, client_id: str) -> None:
+    def _start_cleanup(self) -> None:
+        """Запускает фоновую очистку в event loop приложения, если она не запущена."""
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+    
+    async def _cleanup_loop(self) -> None:
         """
-        Записывает запрос для клиента.
+        Фоновая задача: периодически удаляет buckets неактивных клиентов.
         
-        Args:
-            client_id: Идентификатор клиента
+        С Redis учет в памяти используется только на время его недоступности,
+        поэтому после удаления всех buckets задача завершается до следующего сбоя.
         """
-        current_time = time.time()
-        
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-        
-        self.requests[client_id].append(current_time)
-        
-        # Очищаем старые записи периодически
-        if len(self.requests[client_id]) > self.requests_per_hour * 2:
-            self.requests[client_id] = self.requests[client_id][-self.requests_per_hour:]
+        while True:
+            await asyncio.sleep(_CLEANUP_INTERVAL_SECONDS)
+            evicted = self.local_limiter.evict_idle()
+            if evicted:
+                logger.debug(f"Rate limiter evicted {evicted} idle clients")
+            if self.redis_limiter is not None and not any(self.local_limiter.shards):
+                return
 
 
-class AdvancedRateLimitMiddleware(BaseHTTPMiddleware):
-    """Продвинутый middleware для rate limiting с разными лимитами для разных эндпоинтов."""
+async def close_rate_limiters() -> None:
+    """Останавливает фоновые задачи всех rate limiter процесса при остановке приложения."""
+    for limiter in list(_rate_limiters):
+        await limiter.close()
+
+
+class RateLimitMiddleware:
+    """Middleware для ограничения скорости запросов."""
     
-    def __init__(self, app):
+    __slots__ = (
+        "app",
+        "requests_per_minute",
+        "requests_per_hour",
+        "limiter",
+        "exclude_paths",
+        "_exclude_matcher",
+    )
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        requests_per_minute: Optional[int] = None,
+        requests_per_hour: Optional[int] = None,
+    ):
         """
         Инициализация middleware.
         
         Args:
-            app: FastAPI приложение
+            app: ASGI приложение
+            requests_per_minute: Максимальное количество запросов в минуту (по умолчанию из настроек)
+            requests_per_hour: Максимальное количество запросов в час (по умолчанию из настроек)
         """
-        super().__init__(app)
-        self.rate_limits = {
-            "/auth/": {"requests_per_minute": 10, "requests_per_hour": 100},
-            "/api/": {"requests_per_minute": 60, "requests_per_hour": 1000},
-            "/scan/": {"requests_per_minute": 30, "requests_per_hour": 500},
-            "default": {"requests_per_minute": 30, "requests_per_hour": 500},
-        }
-        self.requests: Dict[str, list] = {}
-        self.exclude_paths = [
-            "/healthz",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-        ]
+        self.app = app
+        self.requests_per_minute = requests_per_minute or settings.rate_limit_requests_per_minute
+        self.requests_per_hour = requests_per_hour or settings.rate_limit_requests_per_hour
+        self.limiter = RateLimiter()
+        self.exclude_paths = _DEFAULT_RATE_LIMIT_EXCLUDE
+        self._exclude_matcher = _DEFAULT_RATE_LIMIT_EXCLUDE_MATCHER
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Обработка запроса с проверкой rate limiting.
         
         Args:
-            request: HTTP запрос
-            call_next: Следующий middleware/handler
-            
-        Returns:
-            HTTP ответ
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
         # Проверяем, нужно ли исключить путь из rate limiting
-        if self._should_exclude_path(request.url.path):
-            return await call_next(request)
-        
-        # Получаем лимиты для пути
-        rate_limit = self._get_rate_limit_for_path(request.url.path)
+        if scope["type"] != "http" or self._should_exclude_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
         
         # Получаем идентификатор клиента
-        client_id = self._get_client_id(request)
+        client_id = _get_client_id(scope)
         
-        # Проверяем rate limit
-        if not self._check_rate_limit(client_id, rate_limit):
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "detail": "Превышен лимит запросов",
-                    "retry_after": 60
-                },
-                headers={"Retry-After": "60"}
-            )
+        # Проверяем rate limit и записываем запрос
+        if not await self.limiter.try_acquire(client_id, self.requests_per_minute, self.requests_per_hour):
+            await _send_rate_limit_exceeded(send)
+            return
         
-        # Записываем запрос
-        self._record_request(client_id)
-        
-        return await call_next(request)
+        await self.app(scope, receive, send)
     
     def _should_exclude_path(self, path: str) -> bool:
         """
@@ -242,105 +439,99 @@ class AdvancedRateLimitMiddleware(BaseHTTPMiddleware):
         Returns:
             bool: True если путь нужно исключить
         """
-        for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):
-                return True
-        return False
+        return self._exclude_matcher.has_prefix(path)
+
+
+class AdvancedRateLimitMiddleware:
+    """Продвинутый middleware для rate limiting с разными лимитами для разных эндпоинтов."""
+    
+    __slots__ = (
+        "app",
+        "rate_limits",
+        "_rate_limit_prefixes",
+        "_default_rate_limit",
+        "limiter",
+        "exclude_paths",
+        "_exclude_matcher",
+    )
     
-    def _get_rate_limit_for_path(self, path: str) -> Dict[str, int]:
+    def __init__(self, app: ASGIApp):
         """
-        Получает лимиты для пути.
+        Инициализация middleware.
         
         Args:
-            path: Путь запроса
-            
-        Returns:
-            Dict[str, int]: Лимиты для пути
+            app: ASGI приложение
         """
-        for prefix, limits in self.rate_limits.items():
-            if path.startswith(prefix):
-                return limits
-        return self.rate_limits["default"]
+        self.app = app
+        self.rate_limits = {
+            "/auth/": {"requests_per_minute": 10, "requests_per_hour": 100},
+            "/api/": {"requests_per_minute": 60, "requests_per_hour": 1000},
+            "/scan/": {"requests_per_minute": 30, "requests_per_hour": 500},
+            "default": {"requests_per_minute": 30, "requests_per_hour": 500},
+        }
+        # Префиксы от длинных к коротким: первое совпадение - самое специфичное
+        self._rate_limit_prefixes: List[Tuple[str, Dict[str, int]]] = sorted(
+            ((prefix, limits) for prefix, limits in self.rate_limits.items() if prefix != "default"),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self._default_rate_limit = self.rate_limits["default"]
+        self.limiter = RateLimiter()
+        self.exclude_paths = _DEFAULT_RATE_LIMIT_EXCLUDE
+        self._exclude_matcher = _DEFAULT_RATE_LIMIT_EXCLUDE_MATCHER
     
-    def _get_client_id(self, request: Request) -> str:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
-        Получает идентификатор клиента для rate limiting.
+        Обработка запроса с проверкой rate limiting.
         
         Args:
-            request: HTTP запрос
-            
-        Returns:
-            str: Идентификатор клиента
+            scope: ASGI scope запроса
+            receive: ASGI receive
+            send: ASGI send
         """
-        # Приоритет: user_id > IP адрес
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            return f"user:{request.state.user_id}"
+        # Проверяем, нужно ли исключить путь из rate limiting
+        if scope["type"] != "http" or self._should_exclude_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        
+        # Получаем лимиты для пути
+        prefix, rate_limit = self._get_rate_limit_for_path(scope["path"])
         
-        # Получаем IP адрес
-        client_ip = request.client.host if request.client else "unknown"
+        # Получаем идентификатор клиента; у каждого префикса свой bucket
+        client_id = f"{_get_client_id(scope)}:{prefix}"
         
-        # Учитываем X-Forwarded-For для прокси
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
+        # Проверяем rate limit и записываем запрос
+        if not await self.limiter.try_acquire(
+            client_id, rate_limit["requests_per_minute"], rate_limit["requests_per_hour"]
+        ):
+            await _send_rate_limit_exceeded(send)
+            return
         
-        return f"ip:{client_ip}"
+        await self.app(scope, receive, send)
     
-    def _check_rate_limit(self, client_id: str, rate_limit: Dict[str, int]) -> bool:
+    def _should_exclude_path(self, path: str) -> bool:
         """
-        Проверяет, не превышен ли rate limit для клиента.
+        Проверяет, нужно ли исключить путь из rate limiting.
         
         Args:
-            client_id: Идентификатор клиента
-            rate_limit: Лимиты для проверки
+            path: Путь запроса
             
         Returns:
-            bool: True если запрос разрешен
+            bool: True если путь нужно исключить
         """
-        current_time = time.time()
-        
-        # Получаем историю запросов для клиента
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-        
-        client_requests = self.requests[client_id]
-        
-        # Удаляем старые запросы (старше часа)
-        client_requests[:] = [
-            req_time for req_time in client_requests
-            if current_time - req_time < 3600
-        ]
-        
-        # Проверяем лимит в час
-        if len(client_requests) >= rate_limit["requests_per_hour"]:
-            return False
-        
-        # Проверяем лимит в минуту
-        minute_ago = current_time - 60
-        recent_requests = [
-            req_time for req_time in client_requests
-            if req_time > minute_ago
-        ]
-        
-        if len(recent_requests) >= rate_limit["requests_per_minute"]:
-            return False
-        
-        return True
+        return self._exclude_matcher.has_prefix(path)
     
-    def _record_request(self, client_id: str) -> None:
+    def _get_rate_limit_for_path(self, path: str) -> Tuple[str, Dict[str, int]]:
         """
-        Записывает запрос для клиента.
+        Получает лимиты для пути.
         
         Args:
-            client_id: Идентификатор клиента
+            path: Путь запроса
+            
+        Returns:
+            Tuple[str, Dict[str, int]]: Префикс (или "default") и лимиты для пути
         """
-        current_time = time.time()
-        
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-        
-        self.requests[client_id].append(current_time)
-        
-        # Очищаем старые записи периодически
-        if len(self.requests[client_id]) > 2000:  # Максимум 2000 записей на клиента
-            self.requests[client_id] = self.requests[client_id][-1000:]
+        for prefix, limits in self._rate_limit_prefixes:
+            if path.startswith(prefix):
+                return prefix, limits
+        return "default", self._default_rate_limit
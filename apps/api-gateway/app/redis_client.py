@@ -0,0 +1,48 @@
+"""
+Redis клиент API Gateway.
+
+Содержит общий асинхронный клиент Redis, который создается один раз
+на процесс и используется, например, для распределенного rate limiting.
+"""
+
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Таймауты операций с Redis (секунды): rate limiting не должен надолго задерживать запрос
+REDIS_SOCKET_TIMEOUT = 0.5
+REDIS_CONNECT_TIMEOUT = 1.0
+
+_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Получает общий клиент Redis.
+
+    Клиент создается лениво; соединения устанавливаются пулом
+    при первой команде.
+
+    Returns:
+        redis.Redis: Клиент Redis
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        )
+    return _redis
+
+
+async def close_redis() -> None:
+    """Закрывает общий клиент Redis при остановке приложения."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
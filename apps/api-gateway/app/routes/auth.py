@@ -3,17 +3,60 @@
 """
 
 import httpx
-from typing import Dict, Any, Optional
+from typing import Optional
 from fastapi import APIRouter, Request, HTTPException, status, Depends
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 from pydantic import BaseModel, Field
 from loguru import logger
 
-from app.config import Settings
+from app.http_clients import get_auth_client
 
-settings = Settings()
 router = APIRouter()
 
+# Таймаут запросов к auth-svc из роутов (дольше, чем проверка токена в middleware)
+AUTH_ROUTE_TIMEOUT = 10.0
+
+# Тело запроса сериализуется pydantic (model_dump_json), поэтому тип задаем явно
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _passthrough_json(response: httpx.Response) -> Response:
+    """
+    Возвращает тело ответа auth-svc клиенту без разбора и повторной сериализации JSON.
+    
+    Args:
+        response: Ответ auth-svc
+        
+    Returns:
+        Response: Ответ с исходным телом
+    """
+    return Response(
+        content=response.content,
+        media_type=response.headers.get("content-type", "application/json"),
+    )
+
+
+async def bearer_token(request: Request) -> str:
+    """
+    Получает Bearer токен из заголовка Authorization.
+    
+    Args:
+        request: HTTP запрос
+        
+    Returns:
+        str: Токен
+        
+    Raises:
+        HTTPException: Если токен не предоставлен
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Токен не предоставлен"
+        )
+    return auth_header[7:].strip()
+
 
 class LoginRequest(BaseModel):
     """Запрос на вход."""
@@ -35,39 +78,44 @@ class RefreshTokenRequest(BaseModel):
 
 
 @router.post("/auth/login")
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, client: httpx.AsyncClient = Depends(get_auth_client)):
     """
     Вход пользователя в систему.
     
     Args:
         request: Данные для входа
+        client: Общий HTTP клиент auth-svc
         
     Returns:
         Dict[str, Any]: Токены и информация о пользователе
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{settings.auth_service_url}/auth/login",
-                json=request.dict()
+        response = await client.post(
+            "/auth/login",
+            content=request.model_dump_json(),
+            headers=JSON_HEADERS,
+            timeout=AUTH_ROUTE_TIMEOUT
+        )
+        
+        if response.status_code == 200:
+            logger.info(f"User logged in: {request.email}")
+            # Оборачиваем тело auth-svc в {"success": true, "data": ...} без разбора JSON
+            return Response(
+                content=b'{"success":true,"data":' + (response.content or b"null") + b'}',
+                media_type="application/json",
             )
+        else:
+            # Handle non-200 responses - return the error response directly
+            try:
+                error_data = response.json() if response.content else {"detail": "Ошибка входа"}
+                detail = error_data.get("detail", "Ошибка входа")
+            except Exception:
+                detail = "Ошибка входа"
+            
+            logger.error(f"Login failed for user {request.email}: {response.status_code} - {detail}")
+            # Return the error response in the expected format
+            return {"success": False, "data": None, "error": detail}
             
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"User logged in: {request.email}")
-                return {"success": True, "data": data}
-            else:
-                # Handle non-200 responses - return the error response directly
-                try:
-                    error_data = response.json() if response.content else {"detail": "Ошибка входа"}
-                    detail = error_data.get("detail", "Ошибка входа")
-                except Exception:
-                    detail = "Ошибка входа"
-                
-                logger.error(f"Login failed for user {request.email}: {response.status_code} - {detail}")
-                # Return the error response in the expected format
-                return {"success": False, "data": None, "error": detail}
-                
     except httpx.TimeoutException:
         logger.error(f"Timeout when logging in user: {request.email}")
         return {"success": False, "data": None, "error": "Таймаут при входе в систему"}
@@ -83,34 +131,35 @@ async def login(request: LoginRequest):
 
 
 @router.post("/auth/register")
-async def register(request: RegisterRequest):
+async def register(request: RegisterRequest, client: httpx.AsyncClient = Depends(get_auth_client)):
     """
     Регистрация нового пользователя.
     
     Args:
         request: Данные для регистрации
+        client: Общий HTTP клиент auth-svc
         
     Returns:
         Dict[str, Any]: Информация о созданном пользователе
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{settings.auth_service_url}/auth/register",
-                json=request.dict()
+        response = await client.post(
+            "/auth/register",
+            content=request.model_dump_json(),
+            headers=JSON_HEADERS,
+            timeout=AUTH_ROUTE_TIMEOUT
+        )
+        
+        if response.status_code == 201:
+            logger.info(f"User registered: {request.email}")
+            return _passthrough_json(response)
+        else:
+            error_data = response.json() if response.content else {"detail": "Ошибка регистрации"}
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_data.get("detail", "Ошибка регистрации")
             )
             
-            if response.status_code == 201:
-                data = response.json()
-                logger.info(f"User registered: {request.email}")
-                return data
-            else:
-                error_data = response.json() if response.content else {"detail": "Ошибка регистрации"}
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_data.get("detail", "Ошибка регистрации")
-                )
-                
     except httpx.TimeoutException:
         logger.error(f"Timeout when registering user: {request.email}")
         raise HTTPException(
@@ -132,34 +181,35 @@ async def register(request: RegisterRequest):
 
 
 @router.post("/auth/refresh")
-async def refresh_token(request: RefreshTokenRequest):
+async def refresh_token(request: RefreshTokenRequest, client: httpx.AsyncClient = Depends(get_auth_client)):
     """
     Обновление токена доступа.
     
     Args:
         request: Refresh токен
+        client: Общий HTTP клиент auth-svc
         
     Returns:
         Dict[str, Any]: Новые токены
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{settings.auth_service_url}/auth/refresh",
-                json=request.dict()
+        response = await client.post(
+            "/auth/refresh",
+            content=request.model_dump_json(),
+            headers=JSON_HEADERS,
+            timeout=AUTH_ROUTE_TIMEOUT
+        )
+        
+        if response.status_code == 200:
+            logger.info("Token refreshed successfully")
+            return _passthrough_json(response)
+        else:
+            error_data = response.json() if response.content else {"detail": "Ошибка обновления токена"}
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_data.get("detail", "Ошибка обновления токена")
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                logger.info("Token refreshed successfully")
-                return data
-            else:
-                error_data = response.json() if response.content else {"detail": "Ошибка обновления токена"}
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_data.get("detail", "Ошибка обновления токена")
-                )
-                
     except httpx.TimeoutException:
         logger.error("Timeout when refreshing token")
         raise HTTPException(
@@ -181,51 +231,46 @@ async def refresh_token(request: RefreshTokenRequest):
 
 
 @router.get("/auth/me")
-async def get_current_user(request: Request):
+async def get_current_user(
+    request: Request,
+    token: str = Depends(bearer_token),
+    client: httpx.AsyncClient = Depends(get_auth_client),
+):
     """
     Получение информации о текущем пользователе.
     
     Args:
-        request: HTTP запрос (должен содержать токен)
+        request: HTTP запрос
+        token: Bearer токен из заголовка Authorization
+        client: Общий HTTP клиент auth-svc
         
     Returns:
         Dict[str, Any]: Информация о пользователе
     """
     # Проверяем, что пользователь аутентифицирован
-    if not hasattr(request.state, 'is_authenticated') or not request.state.is_authenticated:
+    if not getattr(request.state, "is_authenticated", False):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Пользователь не аутентифицирован"
         )
     
     try:
-        # Получаем токен из заголовка
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Токен не предоставлен"
-            )
-        
-        token = auth_header.split(" ")[1]
+        response = await client.get(
+            "/auth/me",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=AUTH_ROUTE_TIMEOUT
+        )
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{settings.auth_service_url}/auth/me",
-                headers={"Authorization": f"Bearer {token}"}
+        if response.status_code == 200:
+            logger.info(f"User info retrieved: {request.state.user_id}")
+            return _passthrough_json(response)
+        else:
+            error_data = response.json() if response.content else {"detail": "Ошибка получения информации о пользователе"}
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_data.get("detail", "Ошибка получения информации о пользователе")
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"User info retrieved: {request.state.user_id}")
-                return data
-            else:
-                error_data = response.json() if response.content else {"detail": "Ошибка получения информации о пользователе"}
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_data.get("detail", "Ошибка получения информации о пользователе")
-                )
-                
     except httpx.TimeoutException:
         logger.error(f"Timeout when getting user info: {request.state.user_id}")
         raise HTTPException(
@@ -247,50 +292,46 @@ async def get_current_user(request: Request):
 
 
 @router.post("/auth/logout")
-async def logout(request: Request):
+async def logout(
+    request: Request,
+    token: str = Depends(bearer_token),
+    client: httpx.AsyncClient = Depends(get_auth_client),
+):
     """
     Выход пользователя из системы.
     
     Args:
-        request: HTTP запрос (должен содержать токен)
+        request: HTTP запрос
+        token: Bearer токен из заголовка Authorization
+        client: Общий HTTP клиент auth-svc
         
     Returns:
         Dict[str, str]: Сообщение об успешном выходе
     """
     # Проверяем, что пользователь аутентифицирован
-    if not hasattr(request.state, 'is_authenticated') or not request.state.is_authenticated:
+    if not getattr(request.state, "is_authenticated", False):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Пользователь не аутентифицирован"
         )
     
     try:
-        # Получаем токен из заголовка
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Токен не предоставлен"
-            )
-        
-        token = auth_header.split(" ")[1]
+        response = await client.post(
+            "/auth/logout",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=AUTH_ROUTE_TIMEOUT
+        )
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{settings.auth_service_url}/auth/logout",
-                headers={"Authorization": f"Bearer {token}"}
+        if response.status_code == 200:
+            logger.info(f"User logged out: {request.state.user_id}")
+            return {"message": "Успешный выход из системы"}
+        else:
+            error_data = response.json() if response.content else {"detail": "Ошибка выхода"}
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_data.get("detail", "Ошибка выхода")
             )
             
-            if response.status_code == 200:
-                logger.info(f"User logged out: {request.state.user_id}")
-                return {"message": "Успешный выход из системы"}
-            else:
-                error_data = response.json() if response.content else {"detail": "Ошибка выхода"}
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_data.get("detail", "Ошибка выхода")
-                )
-                
     except httpx.TimeoutException:
         logger.error(f"Timeout when logging out user: {request.state.user_id}")
         raise HTTPException(
@@ -2,16 +2,53 @@
 Роуты для проксирования запросов к микросервисам.
 """
 
+import asyncio
+import time
 import httpx
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from fastapi import APIRouter, Request, HTTPException, status, Depends
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from loguru import logger
 
-from app.config import Settings
+from app.config import get_settings
+from app.http_clients import get_proxy_client, get_health_client
 
-settings = Settings()
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Заголовки запроса, передаваемые в микросервис (имена в ASGI - bytes в нижнем регистре)
+_FORWARDED_REQUEST_HEADERS = frozenset({
+    b"authorization",
+    b"content-type",
+    b"accept",
+    b"accept-encoding",
+    b"user-agent",
+    b"x-forwarded-for",
+    b"x-real-ip",
+})
+
+# Время жизни закэшированных результатов проверки здоровья сервисов (секунды)
+HEALTH_CACHE_TTL_SECONDS = 2.0
+
+# Методы, тело которых передается в микросервис
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+# Заголовки ответа, которые не передаются клиенту (bytes в нижнем регистре): hop-by-hop
+# заголовки (RFC 7230) и Server, чтобы не раскрывать версии внутренних сервисов и не
+# дублировать Server gateway. Content-Encoding и Content-Length сохраняются:
+# тело передается без перекодирования
+_EXCLUDED_RESPONSE_HEADERS = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"trailers",
+    b"transfer-encoding",
+    b"upgrade",
+    b"server",
+})
 
 
 class ServiceProxy:
@@ -19,6 +56,7 @@ class ServiceProxy:
     
     def __init__(self):
         """Инициализация прокси."""
+        settings = get_settings()
         self.service_urls = {
             "auth": settings.auth_service_url,
             "user-profile": settings.user_profile_service_url,
@@ -31,6 +69,22 @@ class ServiceProxy:
             "moderation": settings.moderation_service_url,
             "print": settings.print_service_url,
         }
+        
+        # Псевдонимы сервисов: имя в пути -> (сервис, префикс пути в сервисе)
+        self.service_aliases = {
+            "albums": ("album", "/albums"),
+        }
+        
+        # Таблица маршрутизации: имя в пути -> (сервис, базовый URL с префиксом пути).
+        # Строится один раз, чтобы не разбирать псевдонимы и URL на каждый запрос
+        self._service_targets = {
+            name: (name, url.rstrip("/")) for name, url in self.service_urls.items()
+        }
+        for alias, (target_name, path_prefix) in self.service_aliases.items():
+            self._service_targets[alias] = (target_name, self._service_targets[target_name][1] + path_prefix)
+        
+        # Порог буферизации тела запроса (байт)
+        self.buffer_body_max_bytes = settings.proxy_buffer_body_max_bytes
     
     async def proxy_request(
         self,
@@ -57,14 +111,15 @@ class ServiceProxy:
         Returns:
             StreamingResponse: Ответ от микросервиса
         """
-        if service_name not in self.service_urls:
+        target = self._service_targets.get(service_name)
+        if target is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Сервис {service_name} не найден"
             )
         
-        service_url = self.service_urls[service_name]
-        target_url = f"{service_url}{path}"
+        service_name, base_url = target
+        target_url = base_url + path
         
         # Подготавливаем заголовки
         proxy_headers = self._prepare_headers(request, headers)
@@ -72,36 +127,61 @@ class ServiceProxy:
         # Подготавливаем параметры
         query_params = self._prepare_params(request, params)
         
+        # Небольшое тело с известной длиной читается целиком: его можно отправить
+        # повторно при редиректе 307/308. Остальные тела передаются потоком,
+        # без буферизации в памяти gateway (Content-Length клиента сохраняется)
+        content = None
+        streamed = False
+        if method in _BODY_METHODS:
+            content_length = request.headers.get("content-length")
+            if self._is_bufferable(content_length):
+                content = await request.body()
+            else:
+                content = request.stream()
+                streamed = True
+                if content_length is not None:
+                    proxy_headers["content-length"] = content_length
+        
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Выполняем запрос к микросервису
-                response = await client.request(
-                    method=method,
-                    url=target_url,
-                    headers=proxy_headers,
-                    params=query_params,
-                    json=data if data else None,
-                    content=await request.body() if method in ["POST", "PUT", "PATCH"] else None,
-                    follow_redirects=True
-                )
-                
-                # Логируем запрос
-                logger.info(
-                    f"Proxied request to {service_name}",
-                    method=method,
-                    url=target_url,
-                    status_code=response.status_code,
-                    user_id=getattr(request.state, 'user_id', None)
-                )
-                
-                # Возвращаем ответ как поток
-                return StreamingResponse(
-                    self._stream_response(response),
-                    status_code=response.status_code,
-                    headers=self._filter_headers(response.headers),
-                    media_type=response.headers.get("content-type")
-                )
-                
+            client = get_proxy_client()
+            # Выполняем запрос к микросервису, тело ответа читается по мере отправки клиенту
+            upstream_request = client.build_request(
+                method=method,
+                url=target_url,
+                headers=proxy_headers,
+                params=query_params,
+                json=data if data else None,
+                content=content
+            )
+            # Потоковое тело нельзя отправить повторно, поэтому такие запросы
+            # не следуют редиректам: ответ 3xx передается клиенту
+            response = await client.send(
+                upstream_request, stream=True, follow_redirects=not streamed
+            )
+            
+            # Логируем запрос
+            logger.info(
+                f"Proxied request to {service_name}",
+                method=method,
+                url=target_url,
+                status_code=response.status_code,
+                user_id=request.scope.get("state", {}).get("user_id")
+            )
+            
+            # Возвращаем ответ как поток; соединение возвращается в пул после отправки
+            proxy_response = StreamingResponse(
+                self._stream_response(response),
+                status_code=response.status_code,
+                background=BackgroundTask(response.aclose)
+            )
+            # Заголовки передаются в исходном виде, включая повторяющиеся (Set-Cookie)
+            proxy_response.raw_headers = self._filter_headers(
+                response.headers,
+                location_base=(base_url, self._public_base(request, path)),
+                response_url=response.url,
+            )
+            return proxy_response
+            
         except httpx.TimeoutException:
             logger.error(f"Timeout when proxying to {service_name}: {target_url}")
             raise HTTPException(
@@ -114,13 +194,47 @@ class ServiceProxy:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Сервис недоступен"
             )
-        except Exception as e:
-            logger.error(f"Error when proxying to {service_name}: {str(e)}")
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            # Остальные исключения обрабатываются обработчиком ошибок приложения
+            logger.error(f"Error when proxying to {service_name}", error=repr(e))
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Ошибка при обращении к сервису"
             )
     
+    def _is_bufferable(self, content_length: Optional[str]) -> bool:
+        """
+        Проверяет, можно ли прочитать тело запроса целиком.
+        
+        Args:
+            content_length: Значение Content-Length запроса
+            
+        Returns:
+            bool: True если длина известна и не превышает порог буферизации
+        """
+        if content_length is None or not content_length.isdigit():
+            return False
+        return int(content_length) <= self.buffer_body_max_bytes
+    
+    @staticmethod
+    def _public_base(request: Request, path: str) -> Optional[str]:
+        """
+        Определяет путь gateway, соответствующий базовому URL сервиса.
+        
+        Args:
+            request: Исходный запрос
+            path: Путь в сервисе
+            
+        Returns:
+            Optional[str]: Путь gateway без пути в сервисе или None
+        """
+        request_path = request.url.path
+        if not path:
+            return request_path.rstrip("/")
+        if not request_path.endswith(path):
+            return None
+        return request_path[:len(request_path) - len(path)]
+    
     def _prepare_headers(self, request: Request, additional_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
         """
         Подготавливает заголовки для проксирования.
@@ -134,25 +248,18 @@ class ServiceProxy:
         """
         headers = {}
         
-        # Копируем важные заголовки
-        important_headers = [
-            "Authorization",
-            "Content-Type",
-            "Accept",
-            "User-Agent",
-            "X-Forwarded-For",
-            "X-Real-IP",
-        ]
-        
-        for header in important_headers:
-            if header in request.headers:
-                headers[header] = request.headers[header]
-        
-        # Добавляем информацию о пользователе
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            headers["X-User-ID"] = str(request.state.user_id)
-        
-        if hasattr(request.state, 'is_authenticated') and request.state.is_authenticated:
+        # Копируем важные заголовки за один проход по заголовкам запроса
+        for name, value in request.headers.raw:
+            if name in _FORWARDED_REQUEST_HEADERS:
+                headers[name.decode("latin-1")] = value.decode("latin-1")
+        
+        # Добавляем информацию о пользователе (scope["state"] - это request.state)
+        state = request.scope.get("state", {})
+        user_id = state.get("user_id")
+        if user_id:
+            headers["X-User-ID"] = str(user_id)
+        
+        if state.get("is_authenticated"):
             headers["X-Authenticated"] = "true"
         
         # Добавляем дополнительные заголовки
@@ -161,62 +268,108 @@ class ServiceProxy:
         
         return headers
     
-    def _prepare_params(self, request: Request, additional_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _prepare_params(
+        self, request: Request, additional_params: Optional[Dict[str, Any]] = None
+    ) -> Union[bytes, Dict[str, Any]]:
         """
         Подготавливает параметры для проксирования.
         
+        Без дополнительных параметров строка запроса передается как есть,
+        без разбора в словарь (повторяющиеся параметры сохраняются).
+        
         Args:
             request: Исходный запрос
             additional_params: Дополнительные параметры
             
         Returns:
-            Dict[str, Any]: Параметры для проксирования
+            Union[bytes, Dict[str, Any]]: Строка запроса или параметры для проксирования
         """
+        if not additional_params:
+            return request.scope["query_string"]
+        
         params = dict(request.query_params)
         
         # Добавляем дополнительные параметры
-        if additional_params:
-            params.update(additional_params)
+        params.update(additional_params)
         
         return params
     
-    def _filter_headers(self, response_headers: httpx.Headers) -> Dict[str, str]:
+    def _filter_headers(
+        self,
+        response_headers: httpx.Headers,
+        location_base: Optional[Tuple[str, Optional[str]]] = None,
+        response_url: Optional[httpx.URL] = None
+    ) -> List[Tuple[bytes, bytes]]:
         """
         Фильтрует заголовки ответа.
         
+        Location, указывающий на сам сервис, переписывается в путь gateway:
+        внутренние адреса сервисов клиенту недоступны.
+        
         Args:
             response_headers: Заголовки ответа от микросервиса
+            location_base: Базовый URL сервиса и соответствующий ему путь gateway
+            response_url: URL ответа, относительно которого разрешается Location
             
         Returns:
-            Dict[str, str]: Отфильтрованные заголовки
+            List[Tuple[bytes, bytes]]: Отфильтрованные заголовки в формате ASGI
         """
-        # Заголовки, которые нужно исключить
-        exclude_headers = {
-            "content-encoding",
-            "content-length",
-            "transfer-encoding",
-            "connection",
-            "server",
-        }
+        headers = []
+        for key, value in response_headers.raw:
+            key = key.lower()
+            if key in _EXCLUDED_RESPONSE_HEADERS:
+                continue
+            if key == b"location" and location_base is not None:
+                value = self._rewrite_location(value, *location_base, response_url)
+            headers.append((key, value))
+        return headers
+    
+    @staticmethod
+    def _rewrite_location(
+        value: bytes,
+        base_url: str,
+        public_base: Optional[str],
+        response_url: Optional[httpx.URL]
+    ) -> bytes:
+        """
+        Переводит Location из адреса сервиса в путь gateway.
+        
+        Args:
+            value: Значение заголовка Location
+            base_url: Базовый URL сервиса
+            public_base: Путь gateway, соответствующий base_url
+            response_url: URL ответа сервиса
+            
+        Returns:
+            bytes: Location для клиента (без изменений, если он ведет не в сервис)
+        """
+        if public_base is None:
+            return value
         
-        filtered_headers = {}
-        for key, value in response_headers.items():
-            if key.lower() not in exclude_headers:
-                filtered_headers[key] = value
+        location = value.decode("latin-1")
+        if response_url is not None:
+            location = str(response_url.join(location))
+        if not location.startswith(base_url):
+            return value
         
-        return filtered_headers
+        rest = location[len(base_url):]
+        if rest and rest[0] not in "/?#":
+            return value
+        return (public_base + rest).encode("latin-1")
     
     async def _stream_response(self, response: httpx.Response):
         """
         Потоково возвращает ответ от микросервиса.
         
+        Чанки передаются как есть, без распаковки Content-Encoding на gateway.
+        
         Args:
             response: Ответ от микросервиса
             
         Yields:
             bytes: Чанки данных
         """
-        async for chunk in response.aiter_bytes():
+        async for chunk in response.aiter_raw():
             yield chunk
 
 
@@ -238,37 +391,35 @@ async def list_services():
     }
 
 
-@router.get("/services/{service_name}/health")
-async def check_service_health(service_name: str):
+# Кэш проверки здоровья: имя сервиса -> (время истечения, результат)
+_health_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# Одновременные промахи кэша ждут одного обновления вместо отдельных запросов
+_health_refresh_lock = asyncio.Lock()
+
+
+async def _probe_service_health(client: httpx.AsyncClient, service_name: str, service_url: str) -> Dict[str, Any]:
     """
-    Проверяет здоровье сервиса.
+    Запрашивает /healthz сервиса.
     
     Args:
+        client: HTTP клиент для проверки здоровья
         service_name: Имя сервиса
+        service_url: URL сервиса
         
     Returns:
         Dict[str, Any]: Статус здоровья сервиса
     """
-    if service_name not in service_proxy.service_urls:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Сервис {service_name} не найден"
-        )
-    
-    service_url = service_proxy.service_urls[service_name]
-    
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{service_url}/healthz")
-            
-            return {
-                "service": service_name,
-                "url": service_url,
-                "status": "healthy" if response.status_code == 200 else "unhealthy",
-                "status_code": response.status_code,
-                "response_time": response.elapsed.total_seconds()
-            }
-            
+        response = await client.get(f"{service_url}/healthz")
+        
+        return {
+            "service": service_name,
+            "url": service_url,
+            "status": "healthy" if response.status_code == 200 else "unhealthy",
+            "status_code": response.status_code,
+            "response_time": response.elapsed.total_seconds()
+        }
+        
     except Exception as e:
         return {
             "service": service_name,
@@ -278,123 +429,75 @@ async def check_service_health(service_name: str):
         }
 
 
-# Создаем отдельные маршруты для каждого сервиса
-@router.api_route("/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_auth(path: str, request: Request):
-    """Проксирует запросы к сервису аутентификации."""
-    return await service_proxy.proxy_request(
-        service_name="auth",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/user-profile/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_user_profile(path: str, request: Request):
-    """Проксирует запросы к сервису профилей пользователей."""
-    return await service_proxy.proxy_request(
-        service_name="user-profile",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/album/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_album(path: str, request: Request):
-    """Проксирует запросы к сервису альбомов."""
-    return await service_proxy.proxy_request(
-        service_name="album",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/albums", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_albums_root(request: Request):
-    """Проксирует запросы к сервису альбомов (корневой путь)."""
-    return await service_proxy.proxy_request(
-        service_name="album",
-        path="/albums",
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/albums/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_albums(path: str, request: Request):
-    """Проксирует запросы к сервису альбомов (множественное число)."""
-    return await service_proxy.proxy_request(
-        service_name="album",
-        path=f"/albums/{path}" if not path.startswith("/") else f"/albums{path}",
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/media/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_media(path: str, request: Request):
-    """Проксирует запросы к сервису медиа."""
-    return await service_proxy.proxy_request(
-        service_name="media",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/qr/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_qr(path: str, request: Request):
-    """Проксирует запросы к сервису QR-кодов."""
-    return await service_proxy.proxy_request(
-        service_name="qr",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
-
-@router.api_route("/analytics/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_analytics(path: str, request: Request):
-    """Проксирует запросы к сервису аналитики."""
-    return await service_proxy.proxy_request(
-        service_name="analytics",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
+async def _get_service_health(service_name: str) -> Dict[str, Any]:
+    """
+    Получает статус здоровья сервиса из кэша.
+    
+    При устаревшем кэше все сервисы проверяются параллельно одним обновлением.
+    
+    Args:
+        service_name: Имя сервиса
+        
+    Returns:
+        Dict[str, Any]: Статус здоровья сервиса
+    """
+    entry = _health_cache.get(service_name)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    
+    async with _health_refresh_lock:
+        # Кэш мог обновиться, пока запрос ждал блокировку
+        entry = _health_cache.get(service_name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        
+        client = get_health_client()
+        services = list(service_proxy.service_urls.items())
+        results = await asyncio.gather(
+            *(_probe_service_health(client, name, url) for name, url in services)
+        )
+        expires_at = time.monotonic() + HEALTH_CACHE_TTL_SECONDS
+        for (name, _), result in zip(services, results):
+            _health_cache[name] = (expires_at, result)
+    
+    return _health_cache[service_name][1]
 
-@router.api_route("/billing/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_billing(path: str, request: Request):
-    """Проксирует запросы к сервису биллинга."""
-    return await service_proxy.proxy_request(
-        service_name="billing",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
 
-@router.api_route("/notification/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_notification(path: str, request: Request):
-    """Проксирует запросы к сервису уведомлений."""
-    return await service_proxy.proxy_request(
-        service_name="notification",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
+@router.get("/services/{service_name}/health")
+async def check_service_health(service_name: str):
+    """
+    Проверяет здоровье сервиса.
+    
+    Args:
+        service_name: Имя сервиса
+        
+    Returns:
+        Dict[str, Any]: Статус здоровья сервиса
+    """
+    if service_name not in service_proxy.service_urls:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Сервис {service_name} не найден"
+        )
+    
+    return await _get_service_health(service_name)
 
-@router.api_route("/moderation/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_moderation(path: str, request: Request):
-    """Проксирует запросы к сервису модерации."""
-    return await service_proxy.proxy_request(
-        service_name="moderation",
-        path=f"/{path}" if not path.startswith("/") else path,
-        request=request,
-        method=request.method
-    )
 
-@router.api_route("/print/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy_to_print(path: str, request: Request):
-    """Проксирует запросы к сервису печати."""
+# Единый маршрут для всех сервисов: /{service_name}/{path}
+@router.api_route("/{service_name}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
+@router.api_route("/{service_name}/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
+async def proxy_to_service(service_name: str, request: Request, path: str = ""):
+    """
+    Проксирует запросы к микросервису по имени сервиса из пути.
+    
+    Args:
+        service_name: Имя сервиса или его псевдоним
+        request: Исходный запрос
+        path: Путь в сервисе
+    """
     return await service_proxy.proxy_request(
-        service_name="print",
-        path=f"/{path}" if not path.startswith("/") else path,
+        service_name=service_name,
+        path=f"/{path}" if path and not path.startswith("/") else path,
         request=request,
         method=request.method
     )
@@ -0,0 +1,10 @@
+"""
+Общие настройки тестов API Gateway.
+
+Тесты запускаются из каталога сервиса: python -m pytest tests
+"""
+
+import os
+
+# Настройки gateway читаются при импорте модулей app, поэтому задаются заранее
+os.environ.setdefault("JWT_SECRET", "test-secret-key-for-api-gateway-unit-tests")
@@ -0,0 +1,159 @@
+"""
+Тесты для middleware аутентификации.
+
+Покрывают in-process кэш результатов проверки токенов: TTL, ограничение
+записи сроком жизни токена (exp) и вытеснение при переполнении.
+"""
+
+import base64
+import json
+
+import httpx
+import pytest
+
+from app.middleware import auth_middleware
+from app.middleware.auth_middleware import AuthMiddleware, TokenCache
+
+USER_INFO = {"user_id": 1, "email": "user@example.com", "is_active": True}
+
+
+def _make_token(claims: dict) -> str:
+    """Собирает JWT с указанными claims (подпись не проверяется gateway)."""
+    def segment(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{segment({'alg': 'HS256', 'typ': 'JWT'})}.{segment(claims)}.signature"
+
+
+class FakeClock:
+    """Управляемые часы вместо time.monotonic и time.time."""
+    
+    def __init__(self):
+        self.now = 1_700_000_000.0
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """Подменяет часы модуля аутентификации."""
+    fake = FakeClock()
+    monkeypatch.setattr(auth_middleware.time, "monotonic", fake)
+    monkeypatch.setattr(auth_middleware.time, "time", fake)
+    return fake
+
+
+class TestTokenCache:
+    """Тесты TokenCache."""
+    
+    def test_entry_expires_after_ttl(self, clock):
+        """Запись живет не дольше ttl_seconds."""
+        cache = TokenCache(ttl_seconds=30, max_size=10)
+        cache.set("token", USER_INFO)
+        
+        clock.advance(29)
+        assert cache.get("token") == USER_INFO
+        clock.advance(1)
+        assert cache.get("token") is None
+        assert not cache._entries
+    
+    def test_exp_caps_ttl(self, clock):
+        """Запись не переживает сам токен."""
+        cache = TokenCache(ttl_seconds=30, max_size=10)
+        cache.set("token", USER_INFO, exp=clock.now + 5)
+        
+        clock.advance(4)
+        assert cache.get("token") == USER_INFO
+        clock.advance(1)
+        assert cache.get("token") is None
+    
+    def test_expired_token_is_not_cached(self, clock):
+        """Уже истекший токен в кэш не попадает."""
+        cache = TokenCache(ttl_seconds=30, max_size=10)
+        cache.set("token", USER_INFO, exp=clock.now - 1)
+        
+        assert cache.get("token") is None
+        assert not cache._entries
+    
+    def test_oldest_entry_evicted_at_max_size(self, clock):
+        """При переполнении вытесняется самая старая запись."""
+        cache = TokenCache(ttl_seconds=30, max_size=2)
+        for token in ("a", "b", "c"):
+            cache.set(token, {"token": token})
+        
+        assert cache.get("a") is None
+        assert cache.get("b") == {"token": "b"}
+        assert cache.get("c") == {"token": "c"}
+        assert len(cache._entries) == 2
+
+
+class FakeAuthService:
+    """Обработчик /auth/verify: отвечает заданным user_info и считает вызовы."""
+    
+    def __init__(self):
+        self.responses = {}
+        self.calls = 0
+    
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        return httpx.Response(200, json=self.responses[token])
+
+
+class TestVerifyTokenCaching:
+    """Тесты кэширования ответа auth-svc в AuthMiddleware._verify_token."""
+    
+    @pytest.fixture
+    def auth_svc(self, monkeypatch, clock) -> FakeAuthService:
+        """Подменяет клиент auth-svc и общий кэш токенов."""
+        fake = FakeAuthService()
+        client = httpx.AsyncClient(base_url="http://auth-svc", transport=httpx.MockTransport(fake))
+        monkeypatch.setattr(auth_middleware, "get_auth_client", lambda: client)
+        monkeypatch.setattr(auth_middleware, "_token_cache", TokenCache(ttl_seconds=60, max_size=10))
+        return fake
+    
+    @pytest.fixture
+    def middleware(self) -> AuthMiddleware:
+        """Middleware без вложенного приложения (вызывается только _verify_token)."""
+        return AuthMiddleware(app=None)
+    
+    @pytest.mark.asyncio
+    async def test_exp_from_response_caps_cache(self, auth_svc, middleware, clock):
+        """exp из ответа /verify ограничивает срок жизни записи."""
+        token = _make_token({"sub": "1"})
+        auth_svc.responses[token] = {**USER_INFO, "exp": clock.now + 10}
+        
+        await middleware._verify_token(token)
+        clock.advance(9)
+        await middleware._verify_token(token)
+        assert auth_svc.calls == 1
+        
+        clock.advance(1)
+        await middleware._verify_token(token)
+        assert auth_svc.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_exp_read_from_token_without_response_exp(self, auth_svc, middleware, clock):
+        """Без exp в ответе срок жизни записи берется из claim exp токена."""
+        token = _make_token({"sub": "1", "exp": int(clock.now) + 10})
+        auth_svc.responses[token] = USER_INFO
+        
+        await middleware._verify_token(token)
+        clock.advance(10)
+        await middleware._verify_token(token)
+        
+        assert auth_svc.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_malformed_token_uses_cache_ttl(self, auth_svc, middleware, clock):
+        """Токен без читаемого payload кэшируется на ttl_seconds."""
+        auth_svc.responses["opaque-token"] = USER_INFO
+        
+        await middleware._verify_token("opaque-token")
+        clock.advance(59)
+        assert await middleware._verify_token("opaque-token") == USER_INFO
+        
+        assert auth_svc.calls == 1
@@ -0,0 +1,158 @@
+"""
+Тесты для проверки путей по префиксам.
+
+Сравнивают matchers с наивной проверкой через str.startswith.
+"""
+
+import re
+
+import pytest
+
+from app.middleware.prefix_trie import (
+    PrefixTrie,
+    RegexPrefixMatcher,
+    ScreenedPrefixMatcher,
+    build_prefix_matcher,
+)
+
+PREFIXES = (
+    "/health",
+    "/health/ready",
+    "/docs",
+    "/openapi.json",
+    "/auth/login",
+    "/api/v1/auth/login",
+    "/scan/",
+    "/api/services",
+)
+
+PATHS = (
+    "",
+    "/",
+    "/h",
+    "/health",
+    "/healthz",
+    "/health/ready",
+    "/heal",
+    "/docs/oauth2-redirect",
+    "/doc",
+    "/openapi.json",
+    "/openapi.yaml",
+    "/auth/login",
+    "/auth/logout",
+    "/api/v1/auth/login",
+    "/api/v1/auth/register",
+    "/api/v1/users/1",
+    "/scan/abc",
+    "/scan",
+    "/api/services/album",
+    "/api/servic",
+    "/ünïcode/path",
+)
+
+
+def _expected(path: str, prefixes=PREFIXES) -> bool:
+    """Эталонная проверка префиксов."""
+    return any(path.startswith(prefix) for prefix in prefixes)
+
+
+class TestPrefixTrie:
+    """Тесты PrefixTrie."""
+    
+    @pytest.mark.parametrize("path", PATHS)
+    def test_matches_startswith(self, path):
+        """Результат совпадает с наивной проверкой."""
+        assert PrefixTrie(PREFIXES).has_prefix(path) == _expected(path)
+    
+    def test_empty_trie_matches_nothing(self):
+        """Пустое дерево не совпадает ни с одним путем."""
+        trie = PrefixTrie()
+        
+        assert not trie.has_prefix("/")
+        assert not trie.has_prefix("")
+    
+    def test_empty_prefix_matches_everything(self):
+        """Пустой префикс совпадает с любым путем."""
+        trie = PrefixTrie([""])
+        
+        assert trie.has_prefix("")
+        assert trie.has_prefix("/anything")
+    
+    def test_add_after_construction(self):
+        """Префиксы можно добавлять после создания дерева."""
+        trie = PrefixTrie(["/a"])
+        trie.add("/b/c")
+        
+        assert trie.has_prefix("/b/cd")
+        assert not trie.has_prefix("/b/")
+
+
+class TestRegexPrefixMatcher:
+    """Тесты RegexPrefixMatcher (с модулем re вместо google-re2)."""
+    
+    @pytest.mark.parametrize("path", PATHS)
+    def test_matches_startswith(self, path):
+        """Результат совпадает с наивной проверкой."""
+        assert RegexPrefixMatcher(PREFIXES, engine=re).has_prefix(path) == _expected(path)
+    
+    def test_special_characters_are_escaped(self):
+        """Символы регулярных выражений в префиксах экранируются."""
+        matcher = RegexPrefixMatcher(["/a.b", "/c+"], engine=re)
+        
+        assert matcher.has_prefix("/a.b/x")
+        assert not matcher.has_prefix("/axb")
+        assert not matcher.has_prefix("/ccc")
+
+
+class TestBuildPrefixMatcher:
+    """Тесты build_prefix_matcher."""
+    
+    @pytest.mark.parametrize("use_regex", [False, True])
+    @pytest.mark.parametrize("path", PATHS)
+    def test_matches_startswith(self, path, use_regex):
+        """Результат не зависит от выбранной реализации."""
+        assert build_prefix_matcher(PREFIXES, use_regex=use_regex).has_prefix(path) == _expected(path)
+    
+    def test_empty_prefixes(self):
+        """Пустой набор префиксов не совпадает ни с одним путем."""
+        assert not build_prefix_matcher([]).has_prefix("/health")
+
+
+class TestScreenedPrefixMatcher:
+    """Тесты отсева путей по символу после ведущего "/"."""
+    
+    @pytest.mark.parametrize("path", PATHS)
+    def test_matches_startswith(self, path):
+        """Отсев не меняет результат основной проверки."""
+        matcher = ScreenedPrefixMatcher(PrefixTrie(PREFIXES), PREFIXES)
+        
+        assert matcher.has_prefix(path) == _expected(path)
+    
+    def test_screened_paths_skip_inner_matcher(self):
+        """Пути с неизвестным вторым символом отбрасываются без основной проверки."""
+        calls = []
+        
+        class RecordingMatcher:
+            def has_prefix(self, path):
+                calls.append(path)
+                return True
+        
+        matcher = ScreenedPrefixMatcher(RecordingMatcher(), PREFIXES)
+        
+        assert not matcher.has_prefix("/users/1")
+        assert not matcher.has_prefix("/")
+        assert not matcher.has_prefix("")
+        assert matcher.has_prefix("/health")
+        assert calls == ["/health"]
+    
+    def test_short_prefix_disables_screening(self):
+        """Префикс из одного символа не позволяет отсев: используется основной matcher."""
+        prefixes = ("/", "/docs")
+        matcher = build_prefix_matcher(prefixes)
+        
+        assert not isinstance(matcher, ScreenedPrefixMatcher)
+        assert matcher.has_prefix("/users/1")
+    
+    def test_builder_screens_regular_prefixes(self):
+        """Для обычных префиксов build_prefix_matcher включает отсев."""
+        assert isinstance(build_prefix_matcher(PREFIXES), ScreenedPrefixMatcher)
@@ -0,0 +1,147 @@
+"""
+Тесты для проксирования запросов к микросервисам.
+
+Покрывают обработку редиректов сервиса: повтор буферизованного тела,
+потоковую передачу больших тел и перевод Location в путь gateway.
+"""
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from app.routes import proxy
+from app.routes.proxy import ServiceProxy
+
+
+def _make_request(method: str, path: str, body: bytes = b"", content_length: bool = True) -> Request:
+    """Собирает входящий запрос gateway с телом, читаемым через receive."""
+    headers = [(b"content-type", b"application/json")]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": headers,
+        "state": {},
+    }
+    
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    return Request(scope, receive)
+
+
+class FakeService:
+    """Обработчик сервиса: редиректит пути без завершающего слеша (как FastAPI)."""
+    
+    def __init__(self):
+        self.requests = []
+        self.external_redirects = set()
+    
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path, request.read()))
+        if request.url.path in self.external_redirects:
+            return httpx.Response(302, headers={"location": "https://cdn.example.com/file"})
+        if not request.url.path.endswith("/"):
+            return httpx.Response(307, headers={"location": str(request.url.copy_with(path=request.url.path + "/"))})
+        return httpx.Response(200, json={"path": request.url.path}, headers={"server": "uvicorn"})
+
+
+@pytest.fixture
+def service(monkeypatch) -> FakeService:
+    """Подменяет общий клиент прокси клиентом с тестовым транспортом."""
+    fake = FakeService()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake), follow_redirects=True)
+    monkeypatch.setattr(proxy, "get_proxy_client", lambda: client)
+    return fake
+
+
+class TestProxyRedirects:
+    """Тесты редиректов в ServiceProxy.proxy_request."""
+    
+    @pytest.mark.asyncio
+    async def test_get_follows_redirect(self, service):
+        """Запрос без тела проходит по редиректу сервиса."""
+        response = await ServiceProxy().proxy_request(
+            "album", "/albums", _make_request("GET", "/album/albums"), method="GET"
+        )
+        await response.background()
+        
+        assert response.status_code == 200
+        assert [path for _, path, _ in service.requests] == ["/albums", "/albums/"]
+    
+    @pytest.mark.asyncio
+    async def test_buffered_body_follows_redirect(self, service):
+        """Небольшое тело с Content-Length повторяется при редиректе 307."""
+        response = await ServiceProxy().proxy_request(
+            "album", "/albums", _make_request("POST", "/api/v1/album/albums", b'{"title": "A"}'), method="POST"
+        )
+        await response.background()
+        
+        assert response.status_code == 200
+        assert service.requests == [
+            ("POST", "/albums", b'{"title": "A"}'),
+            ("POST", "/albums/", b'{"title": "A"}'),
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_large_body_redirect_location_rewritten(self, service):
+        """Редирект на потоковое тело передается клиенту с Location пути gateway."""
+        proxy_instance = ServiceProxy()
+        proxy_instance.buffer_body_max_bytes = 4
+        
+        response = await proxy_instance.proxy_request(
+            "album", "/albums", _make_request("POST", "/api/v1/album/albums", b'{"title": "A"}'), method="POST"
+        )
+        await response.background()
+        
+        assert response.status_code == 307
+        assert dict(response.raw_headers)[b"location"] == b"/api/v1/album/albums/"
+        assert service.requests == [("POST", "/albums", b'{"title": "A"}')]
+    
+    @pytest.mark.asyncio
+    async def test_body_without_content_length_is_streamed(self, service):
+        """Тело без Content-Length не буферизуется; Location псевдонима переписывается."""
+        response = await ServiceProxy().proxy_request(
+            "albums",
+            "/1",
+            _make_request("PUT", "/api/v1/albums/1", b'{"title": "B"}', content_length=False),
+            method="PUT",
+        )
+        await response.background()
+        
+        assert response.status_code == 307
+        assert dict(response.raw_headers)[b"location"] == b"/api/v1/albums/1/"
+    
+    @pytest.mark.asyncio
+    async def test_external_location_not_rewritten(self, service):
+        """Location на внешний адрес передается без изменений."""
+        service.external_redirects.add("/files/1")
+        proxy_instance = ServiceProxy()
+        proxy_instance.buffer_body_max_bytes = 0
+        
+        response = await proxy_instance.proxy_request(
+            "media", "/files/1", _make_request("POST", "/api/v1/media/files/1", b"data"), method="POST"
+        )
+        await response.background()
+        
+        assert response.status_code == 302
+        assert dict(response.raw_headers)[b"location"] == b"https://cdn.example.com/file"
+
+
+class TestProxyResponseHeaders:
+    """Тесты фильтрации заголовков ответа."""
+    
+    @pytest.mark.asyncio
+    async def test_server_header_not_forwarded(self, service):
+        """Server внутреннего сервиса не передается клиенту."""
+        response = await ServiceProxy().proxy_request(
+            "album", "/albums/", _make_request("GET", "/api/v1/album/albums/"), method="GET"
+        )
+        await response.background()
+        
+        headers = dict(response.raw_headers)
+        assert b"server" not in headers
+        assert headers[b"content-type"] == b"application/json"
@@ -0,0 +1,352 @@
+"""
+Тесты для rate limiting.
+
+Покрывают token bucket в памяти процесса: пополнение, шардирование
+с ограничением размера шарда (LRU) и очистку неактивных клиентов,
+а также фиксированные окна в Redis (Lua скрипт).
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from redis.exceptions import RedisError
+
+from app.middleware import rate_limit_middleware
+from app.middleware.rate_limit_middleware import (
+    RateLimiter,
+    RedisRateLimiter,
+    TokenBucketLimiter,
+    close_rate_limiters,
+    load_rate_limit_script,
+)
+
+
+class FakeClock:
+    """Управляемые часы вместо time.monotonic_ns."""
+    
+    def __init__(self):
+        self.now_ns = 1_000_000_000_000
+    
+    def __call__(self) -> int:
+        return self.now_ns
+    
+    def advance(self, seconds: float) -> None:
+        self.now_ns += int(seconds * 1_000_000_000)
+
+
+class UnavailableRedisLimiter:
+    """RedisRateLimiter при недоступном Redis (available=True - Redis восстановлен)."""
+    
+    def __init__(self):
+        self.available = False
+    
+    async def try_acquire(self, *args):
+        if not self.available:
+            raise RedisError("connection refused")
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """Подменяет монотонные часы модуля rate limiting."""
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit_middleware.time, "monotonic_ns", fake)
+    return fake
+
+
+def _same_shard_ids(count: int) -> list:
+    """Подбирает идентификаторы клиентов, попадающие в один шард."""
+    shard_mask = rate_limit_middleware._BUCKET_SHARDS - 1
+    target = hash("ip:0") & shard_mask
+    ids = []
+    candidate = 0
+    while len(ids) < count:
+        client_id = f"ip:{candidate}"
+        if hash(client_id) & shard_mask == target:
+            ids.append(client_id)
+        candidate += 1
+    return ids
+
+
+class TestTokenBucketLimiter:
+    """Тесты TokenBucketLimiter."""
+    
+    def test_minute_limit(self, clock):
+        """Не больше requests_per_minute запросов подряд."""
+        limiter = TokenBucketLimiter()
+        
+        assert all(limiter.try_acquire("ip:1", 5, 100) for _ in range(5))
+        assert not limiter.try_acquire("ip:1", 5, 100)
+    
+    def test_minute_tokens_refill(self, clock):
+        """Токены пополняются непрерывно: 5 в минуту - один за 12 секунд."""
+        limiter = TokenBucketLimiter()
+        for _ in range(5):
+            limiter.try_acquire("ip:1", 5, 100)
+        
+        clock.advance(11.9)
+        assert not limiter.try_acquire("ip:1", 5, 100)
+        clock.advance(0.2)
+        assert limiter.try_acquire("ip:1", 5, 100)
+        assert not limiter.try_acquire("ip:1", 5, 100)
+    
+    def test_refill_is_capped_at_limit(self, clock):
+        """После долгого простоя доступно не больше лимита."""
+        limiter = TokenBucketLimiter()
+        limiter.try_acquire("ip:1", 3, 100)
+        
+        clock.advance(3600)
+        
+        assert sum(limiter.try_acquire("ip:1", 3, 100) for _ in range(10)) == 3
+    
+    def test_hour_limit(self, clock):
+        """Часовой лимит действует независимо от минутного."""
+        limiter = TokenBucketLimiter()
+        allowed = 0
+        for _ in range(20):
+            allowed += limiter.try_acquire("ip:1", 10, 12)
+            clock.advance(6)
+        
+        assert allowed == 12
+    
+    def test_rejected_request_does_not_consume(self, clock):
+        """Отклоненный запрос не списывает токены."""
+        limiter = TokenBucketLimiter()
+        limiter.try_acquire("ip:1", 1, 100)
+        for _ in range(5):
+            assert not limiter.try_acquire("ip:1", 1, 100)
+        
+        clock.advance(60)
+        assert limiter.try_acquire("ip:1", 1, 100)
+    
+    def test_clients_are_independent(self, clock):
+        """Лимиты считаются отдельно для каждого клиента."""
+        limiter = TokenBucketLimiter()
+        limiter.try_acquire("ip:1", 1, 100)
+        
+        assert not limiter.try_acquire("ip:1", 1, 100)
+        assert limiter.try_acquire("ip:2", 1, 100)
+    
+    def test_shard_is_bounded_lru(self, clock, monkeypatch):
+        """При переполнении шарда вытесняется давно не обращавшийся клиент."""
+        monkeypatch.setattr(rate_limit_middleware, "_MAX_BUCKETS_PER_SHARD", 2)
+        limiter = TokenBucketLimiter()
+        first, second, third = _same_shard_ids(3)
+        shard = limiter.shards[hash(first) & (rate_limit_middleware._BUCKET_SHARDS - 1)]
+        
+        limiter.try_acquire(first, 1, 100)
+        limiter.try_acquire(second, 1, 100)
+        # Обращение к first делает самым старым second
+        limiter.try_acquire(first, 1, 100)
+        limiter.try_acquire(third, 1, 100)
+        
+        assert list(shard) == [first, third]
+        # Вытесненный клиент начинает с полным bucket
+        assert limiter.try_acquire(second, 1, 100)
+    
+    def test_total_size_is_bounded(self, clock, monkeypatch):
+        """Общее количество buckets не превышает шарды * размер шарда."""
+        monkeypatch.setattr(rate_limit_middleware, "_MAX_BUCKETS_PER_SHARD", 4)
+        limiter = TokenBucketLimiter()
+        for client in range(10_000):
+            limiter.try_acquire(f"ip:{client}", 10, 100)
+        
+        assert all(len(shard) <= 4 for shard in limiter.shards)
+        assert sum(len(shard) for shard in limiter.shards) <= rate_limit_middleware._BUCKET_SHARDS * 4
+
+
+class TestIdleEviction:
+    """Тесты фоновой очистки неактивных клиентов."""
+    
+    def test_evict_idle_removes_only_idle_clients(self, clock):
+        """Удаляются только клиенты, не обращавшиеся дольше _BUCKET_IDLE_MS."""
+        limiter = TokenBucketLimiter()
+        limiter.try_acquire("ip:idle", 10, 100)
+        clock.advance(1800)
+        limiter.try_acquire("ip:active", 10, 100)
+        clock.advance(1801)
+        
+        assert limiter.evict_idle() == 1
+        remaining = [client_id for shard in limiter.shards for client_id in shard]
+        assert remaining == ["ip:active"]
+    
+    def test_evict_idle_uses_last_access(self, clock):
+        """Обращение продлевает жизнь bucket, даже если запрос отклонен."""
+        limiter = TokenBucketLimiter()
+        limiter.try_acquire("ip:1", 1, 100)
+        clock.advance(3000)
+        limiter.try_acquire("ip:1", 1, 100)
+        clock.advance(3000)
+        
+        assert limiter.evict_idle() == 0
+    
+    def test_eviction_does_not_change_limits(self, clock):
+        """После часа простоя удаленный клиент получает те же лимиты, что и оставшийся."""
+        limiter = TokenBucketLimiter()
+        for _ in range(3):
+            limiter.try_acquire("ip:1", 3, 5)
+        clock.advance(3601)
+        limiter.evict_idle()
+        
+        assert sum(limiter.try_acquire("ip:1", 3, 5) for _ in range(5)) == 3
+    
+    @pytest.mark.asyncio
+    async def test_rate_limiter_starts_cleanup_task(self, monkeypatch):
+        """RateLimiter запускает фоновую очистку при первом запросе и не дублирует ее."""
+        monkeypatch.setattr(rate_limit_middleware.settings, "rate_limit_use_redis", False)
+        limiter = RateLimiter()
+        
+        assert await limiter.try_acquire("ip:1", 10, 100)
+        task = limiter._cleanup_task
+        assert task is not None and not task.done()
+        
+        await limiter.try_acquire("ip:1", 10, 100)
+        assert limiter._cleanup_task is task
+        
+        await limiter.close()
+        assert task.cancelled()
+        assert limiter._cleanup_task is None
+    
+    @pytest.mark.asyncio
+    async def test_close_rate_limiters_stops_all_tasks(self, monkeypatch):
+        """close_rate_limiters останавливает очистку всех limiter процесса."""
+        monkeypatch.setattr(rate_limit_middleware.settings, "rate_limit_use_redis", False)
+        limiters = [RateLimiter(), RateLimiter()]
+        for limiter in limiters:
+            await limiter.try_acquire("ip:1", 10, 100)
+        tasks = [limiter._cleanup_task for limiter in limiters]
+        
+        await close_rate_limiters()
+        
+        assert all(task.cancelled() for task in tasks)
+    
+    @pytest.mark.asyncio
+    async def test_no_cleanup_task_while_redis_is_healthy(self, redis_client):
+        """При работающем Redis учет в памяти не используется и очистка не запускается."""
+        limiter = RateLimiter()
+        limiter.redis_limiter = RedisRateLimiter(redis_client)
+        
+        assert await limiter.try_acquire("ip:1", 10, 100)
+        
+        assert limiter._cleanup_task is None
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_stops_after_redis_recovers(self, clock, monkeypatch):
+        """После возврата к Redis очистка завершается, когда buckets в памяти удалены."""
+        monkeypatch.setattr(rate_limit_middleware, "_CLEANUP_INTERVAL_SECONDS", 0)
+        limiter = RateLimiter()
+        limiter.redis_limiter = UnavailableRedisLimiter()
+        await limiter.try_acquire("ip:1", 10, 100)
+        task = limiter._cleanup_task
+        
+        clock.advance(3601)
+        await asyncio.wait_for(task, timeout=1)
+        
+        assert not any(limiter.local_limiter.shards)
+
+
+@pytest_asyncio.fixture
+async def redis_client():
+    """Redis в памяти процесса (fakeredis выполняет Lua через lupa)."""
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+class TestRedisRateLimiter:
+    """Тесты RedisRateLimiter и Lua скрипта фиксированных окон."""
+    
+    @pytest.mark.asyncio
+    async def test_minute_limit(self, redis_client):
+        """Не больше requests_per_minute запросов в минутном окне."""
+        limiter = RedisRateLimiter(redis_client)
+        
+        results = [await limiter.try_acquire("ip:1", 3, 100) for _ in range(5)]
+        
+        assert results == [True, True, True, False, False]
+    
+    @pytest.mark.asyncio
+    async def test_hour_limit(self, redis_client, monkeypatch):
+        """Часовой счетчик сохраняется между минутными окнами."""
+        now_ns = [1_700_000_000 * 1_000_000_000 // 3600 * 3600]
+        monkeypatch.setattr(rate_limit_middleware.time, "time_ns", lambda: now_ns[0])
+        limiter = RedisRateLimiter(redis_client)
+        
+        allowed = 0
+        for _ in range(4):
+            allowed += sum([await limiter.try_acquire("ip:1", 2, 5) for _ in range(3)])
+            now_ns[0] += 60 * 1_000_000_000
+        
+        assert allowed == 5
+    
+    @pytest.mark.asyncio
+    async def test_rejected_request_is_not_counted(self, redis_client):
+        """Отклоненный запрос не увеличивает счетчики."""
+        limiter = RedisRateLimiter(redis_client)
+        for _ in range(4):
+            await limiter.try_acquire("ip:1", 2, 100)
+        
+        keys = sorted(await redis_client.keys("rl:*"))
+        values = [int(await redis_client.get(key)) for key in keys]
+        
+        assert values == [2, 2]
+    
+    @pytest.mark.asyncio
+    async def test_counters_have_window_ttl(self, redis_client):
+        """Счетчики создаются с TTL своего окна и общим hash tag клиента."""
+        limiter = RedisRateLimiter(redis_client)
+        await limiter.try_acquire("ip:1", 10, 100)
+        
+        keys = {key.decode(): await redis_client.ttl(key) for key in await redis_client.keys("rl:*")}
+        minute_key = next(key for key in keys if ":m:" in key)
+        hour_key = next(key for key in keys if ":h:" in key)
+        
+        assert minute_key.startswith("rl:{ip:1}:") and hour_key.startswith("rl:{ip:1}:")
+        assert 0 < keys[minute_key] <= 60
+        assert 60 < keys[hour_key] <= 3600
+    
+    @pytest.mark.asyncio
+    async def test_load_rate_limit_script(self, redis_client, monkeypatch):
+        """Скрипт загружается в Redis при старте, если Redis включен."""
+        monkeypatch.setattr(rate_limit_middleware.settings, "rate_limit_use_redis", True)
+        monkeypatch.setattr(rate_limit_middleware, "get_redis", lambda: redis_client)
+        
+        await load_rate_limit_script()
+        
+        sha = RedisRateLimiter(redis_client)._script.sha
+        assert await redis_client.script_exists(sha) == [True]
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_limiter(self, monkeypatch):
+        """При ошибке Redis используется учет в памяти процесса."""
+        monkeypatch.setattr(rate_limit_middleware.settings, "rate_limit_use_redis", False)
+        limiter = RateLimiter()
+        limiter.redis_limiter = UnavailableRedisLimiter()
+        
+        assert await limiter.try_acquire("ip:1", 1, 100)
+        assert not await limiter.try_acquire("ip:1", 1, 100)
+        await limiter.close()
+    
+    @pytest.mark.asyncio
+    async def test_fallback_logged_once_until_recovery(self, monkeypatch):
+        """Переход на учет в памяти и восстановление Redis логируются по одному разу."""
+        messages = []
+        monkeypatch.setattr(rate_limit_middleware.logger, "warning", messages.append)
+        monkeypatch.setattr(rate_limit_middleware.logger, "info", messages.append)
+        limiter = RateLimiter()
+        redis_limiter = limiter.redis_limiter = UnavailableRedisLimiter()
+        
+        for _ in range(3):
+            await limiter.try_acquire("ip:1", 10, 100)
+        redis_limiter.available = True
+        for _ in range(3):
+            await limiter.try_acquire("ip:1", 10, 100)
+        redis_limiter.available = False
+        await limiter.try_acquire("ip:1", 10, 100)
+        
+        assert len(messages) == 3
+        assert "unavailable" in messages[0] and "recovered" in messages[1] and "unavailable" in messages[2]
+        await limiter.close()
+
@@ -0,0 +1,98 @@
+"""Store HMAC hashes of verification and reset tokens
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import Settings
+from app.utils.tokens import hash_token
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _user_columns() -> set:
+    """Return the names of the existing columns of the users table."""
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns('users')}
+
+
+def _backfill_token_hashes() -> None:
+    """Store HMAC hashes for verification and reset tokens that are still pending."""
+    settings = Settings()
+    key = settings.token_hash_key or settings.jwt_secret
+    users = sa.table(
+        'users',
+        sa.column('id', sa.Integer),
+        sa.column('verification_token', sa.String),
+        sa.column('reset_token', sa.String),
+        sa.column('verification_token_hash', sa.LargeBinary),
+        sa.column('reset_token_hash', sa.LargeBinary),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(users.c.id, users.c.verification_token, users.c.reset_token).where(
+            sa.or_(users.c.verification_token.isnot(None), users.c.reset_token.isnot(None))
+        )
+    ).all()
+    for user_id, verification_token, reset_token in rows:
+        bind.execute(
+            users.update()
+            .where(users.c.id == user_id)
+            .values(
+                verification_token_hash=hash_token(verification_token, key) if verification_token else None,
+                reset_token_hash=hash_token(reset_token, key) if reset_token else None,
+            )
+        )
+
+
+def upgrade() -> None:
+    """Replace raw token columns with indexed HMAC hashes, backfilling pending tokens."""
+
+    # Every step is guarded: the schema may already have been created by create_all
+    # with the new columns, and later revisions of the chain still have to run
+    columns = _user_columns()
+    for name in ('verification_token_hash', 'reset_token_hash'):
+        if name not in columns:
+            op.add_column('users', sa.Column(name, sa.LargeBinary(32), nullable=True))
+
+    if 'verification_token' in columns and 'reset_token' in columns:
+        _backfill_token_hashes()
+
+    # Drop raw token columns and their indexes
+    op.execute('DROP INDEX IF EXISTS ix_users_verification_token')
+    op.execute('DROP INDEX IF EXISTS ix_users_reset_token')
+    for name in ('verification_token', 'reset_token'):
+        if name in columns:
+            op.drop_column('users', name)
+
+    # Partial indexes: only a small share of users has a pending token
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_users_verification_token_hash ON users (verification_token_hash) '
+        'WHERE verification_token_hash IS NOT NULL'
+    )
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_users_reset_token_hash ON users (reset_token_hash) '
+        'WHERE reset_token_hash IS NOT NULL'
+    )
+
+
+def downgrade() -> None:
+    """Restore raw token columns; pending tokens cannot be recovered from hashes."""
+
+    op.drop_index('ix_users_reset_token_hash', table_name='users')
+    op.drop_index('ix_users_verification_token_hash', table_name='users')
+
+    op.add_column('users', sa.Column('verification_token', sa.String(255), nullable=True))
+    op.add_column('users', sa.Column('reset_token', sa.String(255), nullable=True))
+
+    op.drop_column('users', 'reset_token_hash')
+    op.drop_column('users', 'verification_token_hash')
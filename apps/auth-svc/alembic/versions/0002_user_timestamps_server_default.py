@@ -0,0 +1,51 @@
+"""Let the database stamp user timestamps
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+
+
+def upgrade() -> None:
+    """Convert created_at/updated_at to timestamptz with a now() server default."""
+
+    # The ORM no longer sends these columns on INSERT, so the default is required
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name']: column for column in inspector.get_columns('users')}
+    for name in TIMESTAMP_COLUMNS:
+        # Existing naive values were written with datetime.utcnow()
+        converted = getattr(columns[name]['type'], 'timezone', False)
+        op.alter_column(
+            'users',
+            name,
+            type_=sa.DateTime(timezone=True),
+            existing_nullable=False,
+            server_default=sa.func.now(),
+            postgresql_using=None if converted else f"{name} AT TIME ZONE 'UTC'",
+        )
+
+
+def downgrade() -> None:
+    """Restore naive UTC timestamps without a server default."""
+
+    for name in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            'users',
+            name,
+            type_=sa.DateTime(),
+            existing_nullable=False,
+            server_default=None,
+            postgresql_using=f"{name} AT TIME ZONE 'UTC'",
+        )
@@ -0,0 +1,57 @@
+"""Add unique index on lower(email)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Build ix_users_email_lower concurrently after checking for case-variant duplicates."""
+
+    bind = op.get_bind()
+
+    # The old unique index was case-sensitive, so Foo@x and foo@x may both exist
+    duplicates = bind.execute(sa.text("""
+        SELECT lower(email) AS email_lower, array_agg(id ORDER BY id) AS user_ids
+        FROM users
+        GROUP BY lower(email)
+        HAVING count(*) > 1
+    """)).all()
+    if duplicates:
+        details = "; ".join(f"{row.email_lower}: users {list(row.user_ids)}" for row in duplicates)
+        raise RuntimeError(
+            "Cannot create ix_users_email_lower: emails differ only by case "
+            f"({details}). Merge or rename these accounts and rerun the migration."
+        )
+
+    # Existing emails are stored as entered; new ones are lowercased by create_user
+    with op.get_context().autocommit_block():
+        # A failed concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+        invalid = bind.execute(sa.text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'ix_users_email_lower' AND NOT i.indisvalid
+        """)).first()
+        if invalid:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_lower')
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_lower '
+            'ON users (lower(email))'
+        )
+
+
+def downgrade() -> None:
+    """Drop the lower(email) unique index."""
+
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_lower')
@@ -5,12 +5,102 @@
 а также другие утилиты безопасности.
 """
 
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+import binascii
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidSignatureError
+from jwt import InvalidTokenError as JWTError
+from jwt.utils import base64url_decode
 from loguru import logger
 
+try:
+    import _hashlib
+except ImportError:  # Python собран без OpenSSL
+    _hashlib = None
+
+# HMAC-SHA256 должен считаться через OpenSSL: он использует аппаратные
+# инструкции SHA (SHA-NI, ARMv8 SHA2), если их поддерживает процессор
+if _hashlib is None or hashlib.sha256 is not getattr(_hashlib, "openssl_sha256", None):
+    logger.warning("hashlib.sha256 is not backed by OpenSSL, JWT verification will be slower")
+
+# Максимальное количество закэшированных результатов decode_token
+DECODE_CACHE_MAX_SIZE = 10_000
+
+# LRU кэш проверенных токенов: (token, отпечаток секрета, алгоритм) -> (exp, payload)
+_decode_cache: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+@lru_cache(maxsize=4)
+def _secret_fingerprint(secret: str) -> str:
+    """
+    Вычисляет отпечаток секрета для ключа кэша.
+
+    При смене секрета ключи меняются, и старые записи перестают использоваться.
+
+    Args:
+        secret: Секретный ключ
+
+    Returns:
+        Короткий хэш секрета
+    """
+    return hashlib.blake2b(secret.encode(), digest_size=8).hexdigest()
+
+
+# Опции jwt.decode для проверки claims (exp, nbf, iat) без повторной проверки подписи
+_CLAIMS_ONLY_OPTIONS = {
+    "verify_signature": False,
+    "verify_exp": True,
+    "verify_nbf": True,
+    "verify_iat": True,
+}
+
+
+@lru_cache(maxsize=4)
+def _hmac_template(secret: str) -> "hmac.HMAC":
+    """
+    Создает HMAC-SHA256 с уже подготовленным ключом.
+
+    Подготовка ключа (ipad/opad) выполняется один раз на секрет,
+    для каждого токена используется копия шаблона.
+
+    Args:
+        secret: Секретный ключ
+
+    Returns:
+        Шаблон HMAC для копирования
+    """
+    return hmac.new(secret.encode(), None, hashlib.sha256)
+
+
+def _verify_hs256_signature(token: str, secret: str) -> bool:
+    """
+    Проверяет подпись HS256 токена.
+
+    Args:
+        token: JWT токен
+        secret: Секретный ключ
+
+    Returns:
+        True если подпись верна
+    """
+    signing_input, _, signature = token.rpartition(".")
+    if not signing_input:
+        return False
+    
+    try:
+        expected = base64url_decode(signature.encode("ascii"))
+        mac = _hmac_template(secret).copy()
+        mac.update(signing_input.encode("ascii"))
+    except (binascii.Error, UnicodeEncodeError):
+        return False
+    return hmac.compare_digest(mac.digest(), expected)
+
 
 def create_access_token(
     subject: str,
@@ -40,12 +130,12 @@ def create_access_token(
     if not secret:
         raise ValueError("Secret cannot be empty")
 
-    expire = datetime.utcnow() + timedelta(minutes=minutes)
+    now = int(time.time())
     
     to_encode = {
         "sub": subject,
-        "exp": expire,
-        "iat": datetime.utcnow(),
+        "exp": now + minutes * 60,
+        "iat": now,
     }
     
     if additional_claims:
@@ -85,9 +175,36 @@ def decode_token(
     if not secret:
         raise ValueError("Secret cannot be empty")
 
+    # Повторно предъявленный токен не проверяется заново до истечения exp
+    cache_key = (token, _secret_fingerprint(secret), algorithm)
+    cached = _decode_cache.get(cache_key)
+    if cached is not None:
+        expires_at, cached_payload = cached
+        if expires_at > time.time():
+            _decode_cache.move_to_end(cache_key)
+            return dict(cached_payload)
+        _decode_cache.pop(cache_key, None)
+
     try:
-        payload = jwt.decode(token, secret, algorithms=[algorithm])
+        if algorithm == "HS256":
+            # Подпись проверяется с заранее подготовленным ключом HMAC,
+            # PyJWT только разбирает токен и проверяет claims
+            if not _verify_hs256_signature(token, secret):
+                raise InvalidSignatureError("Signature verification failed")
+            decoded = jwt.decode_complete(token, options=_CLAIMS_ONLY_OPTIONS)
+            if decoded["header"].get("alg") != algorithm:
+                raise InvalidSignatureError("The specified alg value is not allowed")
+            payload = decoded["payload"]
+        else:
+            payload = jwt.decode(token, secret, algorithms=[algorithm])
         logger.debug(f"Successfully decoded token for subject: {payload.get('sub')}")
+        
+        # Кэшируем только токены с exp, чтобы запись не пережила сам токен
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            _decode_cache[cache_key] = (exp, dict(payload))
+            if len(_decode_cache) > DECODE_CACHE_MAX_SIZE:
+                _decode_cache.popitem(last=False)
         return payload
     except JWTError as e:
         logger.warning(f"Failed to decode token: {e}")
@@ -112,8 +229,7 @@ def verify_token_expiry(payload: Dict[str, Any]) -> bool:
         return False
     
     try:
-        exp_datetime = datetime.fromtimestamp(exp)
-        return exp_datetime > datetime.utcnow()
+        return exp > time.time()
     except (ValueError, TypeError) as e:
         logger.error(f"Invalid exp claim in token: {e}")
         return False
@@ -147,12 +263,12 @@ def create_refresh_token(
     if not secret:
         raise ValueError("Secret cannot be empty")
 
-    expire = datetime.utcnow() + timedelta(minutes=minutes)
+    now = int(time.time())
     
     to_encode = {
         "sub": subject,
-        "exp": expire,
-        "iat": datetime.utcnow(),
+        "exp": now + minutes * 60,
+        "iat": now,
         "type": "refresh",  # Указываем тип токена
     }
     
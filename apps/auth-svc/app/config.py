@@ -4,6 +4,8 @@
 Содержит настройки для Auth сервиса, включая подключение к базе данных.
 """
 
+from typing import Optional
+
 from pydantic import Field
 from app.commons.settings import DatabaseSettings
 
@@ -18,4 +20,32 @@ class Settings(DatabaseSettings):
     model_config = {"env_prefix": ""}  # Без префикса для переменных окружения
     
     # Database name for Auth service
-    db_name: str = Field(default="authdb", description="Имя базы данных для Auth сервиса")
\ No newline at end of file
+    db_name: str = Field(default="authdb", description="Имя базы данных для Auth сервиса")
+    
+    # Пул соединений и кэш скомпилированных запросов SQLAlchemy
+    db_pool_size: int = Field(default=20, description="Количество постоянных соединений в пуле")
+    db_max_overflow: int = Field(default=20, description="Дополнительные соединения сверх пула")
+    db_pool_timeout: int = Field(default=30, description="Ожидание свободного соединения из пула (секунды)")
+    db_pool_recycle: int = Field(default=1800, description="Время жизни соединения до переоткрытия (секунды)")
+    db_query_cache_size: int = Field(default=1200, description="Размер кэша скомпилированных SQL запросов")
+    
+    # Период фоновой очистки истекших токенов верификации и восстановления пароля
+    expired_tokens_cleanup_interval_seconds: int = Field(
+        default=300,
+        description="Интервал очистки истекших одноразовых токенов (секунды)"
+    )
+    
+    # Стоимость хеширования паролей bcrypt (log2 числа раундов)
+    bcrypt_rounds: int = Field(default=12, description="Стоимость bcrypt для хеширования паролей")
+    
+    # Кэш результатов проверки токенов в Redis
+    verify_token_cache_ttl_seconds: int = Field(
+        default=300,
+        description="Максимальное время жизни результата проверки токена в кэше (секунды)"
+    )
+    
+    # Ключ HMAC для хэшей токенов верификации и восстановления пароля
+    token_hash_key: Optional[str] = Field(
+        default=None,
+        description="Ключ HMAC для хэшей одноразовых токенов (по умолчанию jwt_secret)"
+    )
@@ -5,7 +5,6 @@
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import NullPool
 
 from app.config import Settings
 from app.models.user import Base
@@ -16,7 +15,14 @@ settings = Settings()
 engine = create_async_engine(
     settings.get_database_url(),
     echo=False,  # Установить True для отладки SQL запросов
-    poolclass=NullPool,  # Отключаем пул соединений для разработки
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    # Соединения переоткрываются раньше, чем их закроет сервер БД или балансировщик
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True,
+    # Кэш скомпилированных запросов с запасом вмещает все запросы сервиса
+    query_cache_size=settings.db_query_cache_size,
     future=True
 )
 
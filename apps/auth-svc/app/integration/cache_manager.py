@@ -4,15 +4,63 @@
 Содержит настройки и утилиты для работы с Redis кэшем.
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple
 
 from packages.py_commons.integration import (
-    RedisClient, CacheConfig, CacheManager, SessionManager
+    RedisClient, CacheConfig, CacheManager, SessionManager, AsyncPipelineWriter
 )
 
 logger = logging.getLogger(__name__)
 
+# Префиксы ключей Redis (ключ - префикс + ID); ключи собираются f-строками,
+# это быстрее, чем заранее привязанный str.format
+USER_KEY_PREFIX = "user:"
+USER_PERMISSIONS_KEY_PREFIX = "user_permissions:"
+USER_ROLES_KEY_PREFIX = "user_roles:"
+LOGIN_ATTEMPTS_KEY_PREFIX = "login_attempts:"
+PASSWORD_RESET_KEY_PREFIX = "password_reset:"
+
+# Количество пользователей в одном pipeline при массовой инвалидации кэша
+BATCH_INVALIDATE_CHUNK_SIZE = 1000
+
+# Время жизни счетчика попыток входа (секунды) и допустимое число попыток
+LOGIN_ATTEMPTS_TTL = 3600
+MAX_LOGIN_ATTEMPTS = 5
+
+# Атомарный учет попытки входа: INCR, TTL для нового счетчика и проверка лимита
+# за один вызов на стороне Redis. Возвращает {1 - разрешено / 0 - превышен лимит, попытки}
+LOGIN_ATTEMPT_SCRIPT = """
+local attempts = redis.call('INCR', KEYS[1])
+if attempts == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+if attempts > tonumber(ARGV[2]) then
+    return {0, attempts}
+end
+return {1, attempts}
+"""
+
+# Черный список токенов - одно сортированное множество: элемент - хэш токена,
+# вес - unix-время истечения. Истекшие записи удаляются фоновой задачей
+TOKEN_BLACKLIST_KEY = "token_blacklist"
+BLACKLIST_CLEANUP_INTERVAL = 60
+
+# Проверка токена в черном списке: истекшая запись удаляется и не учитывается
+BLACKLIST_CHECK_SCRIPT = """
+local expires_at = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not expires_at then
+    return 0
+end
+if tonumber(expires_at) < tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 0
+end
+return 1
+"""
+
 
 class AuthCacheManager:
     """Менеджер кэширования для auth-svc."""
@@ -27,17 +75,51 @@ class AuthCacheManager:
         self.redis_client = RedisClient(redis_config)
         self.cache_manager = CacheManager(self.redis_client, default_ttl=3600)
         self.session_manager = SessionManager(self.redis_client, session_ttl=86400)
+        # Некритичные записи уходят в Redis в фоне, не задерживая ответ
+        self.writer = AsyncPipelineWriter(self.redis_client)
         
         self._is_connected = False
+        self._login_attempt_script = None
+        self._blacklist_check_script = None
+        self._blacklist_cleanup_task: Optional[asyncio.Task] = None
+        
+        # Счетчики операций кэша ведутся в процессе, без запросов к Redis
+        self._hits = 0
+        self._misses = 0
+        self._sets = 0
+        self._server_stats: Dict[str, Any] = {}
     
     async def connect(self) -> None:
         """Подключение к Redis."""
         await self.redis_client.connect()
+        
+        # Загружаем Lua скрипты заранее, чтобы первый вызов сразу шел через EVALSHA
+        self._login_attempt_script = self.redis_client.redis.register_script(LOGIN_ATTEMPT_SCRIPT)
+        self._blacklist_check_script = self.redis_client.redis.register_script(BLACKLIST_CHECK_SCRIPT)
+        for script in (LOGIN_ATTEMPT_SCRIPT, BLACKLIST_CHECK_SCRIPT):
+            try:
+                await self.redis_client.redis.script_load(script)
+            except Exception as e:
+                # Скрипт будет загружен при первом вызове (EVALSHA -> NOSCRIPT -> EVAL)
+                logger.warning(f"Failed to preload Lua script: {e}")
+        
+        self.writer.start()
+        if self._blacklist_cleanup_task is None or self._blacklist_cleanup_task.done():
+            self._blacklist_cleanup_task = asyncio.create_task(self._cleanup_token_blacklist())
         self._is_connected = True
         logger.info("Auth cache manager connected to Redis")
     
     async def disconnect(self) -> None:
         """Отключение от Redis."""
+        if self._blacklist_cleanup_task is not None:
+            self._blacklist_cleanup_task.cancel()
+            try:
+                await self._blacklist_cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._blacklist_cleanup_task = None
+        
+        await self.writer.stop()
         await self.redis_client.disconnect()
         self._is_connected = False
         logger.info("Auth cache manager disconnected from Redis")
@@ -59,6 +141,7 @@ class AuthCacheManager:
         Returns:
             bool: True если успешно
         """
+        self._sets += 1
         return await self.cache_manager.cache_user_data(user_id, auth_data, ttl)
     
     async def get_user_auth_data(self, user_id: int) -> Optional[Dict[str, Any]]:
@@ -71,7 +154,7 @@ class AuthCacheManager:
         Returns:
             Optional[Dict[str, Any]]: Данные аутентификации или None
         """
-        return await self.cache_manager.get_user_data(user_id)
+        return self._record_lookup(await self.cache_manager.get_user_data(user_id))
     
     async def cache_user_permissions(
         self,
@@ -90,8 +173,9 @@ class AuthCacheManager:
         Returns:
             bool: True если успешно
         """
+        self._sets += 1
         return await self.redis_client.set(
-            f"user_permissions:{user_id}",
+            f"{USER_PERMISSIONS_KEY_PREFIX}{user_id}",
             permissions,
             expire=ttl or 1800  # 30 минут по умолчанию
         )
@@ -106,7 +190,7 @@ class AuthCacheManager:
         Returns:
             Optional[Dict[str, Any]]: Разрешения пользователя или None
         """
-        return await self.redis_client.get(f"user_permissions:{user_id}")
+        return self._record_lookup(await self.redis_client.get(f"{USER_PERMISSIONS_KEY_PREFIX}{user_id}"))
     
     async def cache_user_roles(
         self,
@@ -117,6 +201,9 @@ class AuthCacheManager:
         """
         Кэширование ролей пользователя.
         
+        Роли хранятся во множестве Redis, чтобы проверять отдельную роль
+        через SISMEMBER без загрузки и разбора всего списка.
+        
         Args:
             user_id: ID пользователя
             roles: Роли пользователя
@@ -125,11 +212,23 @@ class AuthCacheManager:
         Returns:
             bool: True если успешно
         """
-        return await self.redis_client.set(
-            f"user_roles:{user_id}",
-            roles,
-            expire=ttl or 1800  # 30 минут по умолчанию
-        )
+        key = f"{USER_ROLES_KEY_PREFIX}{user_id}"
+        self._sets += 1
+        await self.redis_client.ensure_connected()
+        
+        try:
+            # Заменяем множество целиком в одной транзакции
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if roles:
+                    pipe.sadd(key, *roles)
+                    pipe.expire(key, ttl or 1800)  # 30 минут по умолчанию
+                await pipe.execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to cache roles for user {user_id}: {e}")
+            return False
     
     async def get_user_roles(self, user_id: int) -> Optional[list]:
         """
@@ -139,9 +238,46 @@ class AuthCacheManager:
             user_id: ID пользователя
             
         Returns:
-            Optional[list]: Роли пользователя или None
+            Optional[list]: Роли пользователя или None (пустой набор ролей не кэшируется)
+        """
+        roles = await self.redis_client.smembers(f"{USER_ROLES_KEY_PREFIX}{user_id}")
+        return self._record_lookup(list(roles) if roles else None)
+    
+    async def has_user_role(self, user_id: int, role: str) -> bool:
+        """
+        Проверка наличия роли у пользователя в кэше.
+        
+        Args:
+            user_id: ID пользователя
+            role: Роль
+            
+        Returns:
+            bool: True если роль есть в кэше
         """
-        return await self.redis_client.get(f"user_roles:{user_id}")
+        return await self.redis_client.sismember(f"{USER_ROLES_KEY_PREFIX}{user_id}", role)
+    
+    async def get_user_bundle(
+        self,
+        user_id: int
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[list]]:
+        """
+        Получение данных аутентификации, разрешений и ролей пользователя.
+        
+        Данные и разрешения читаются одним MGET, роли - параллельно SMEMBERS.
+        
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            Tuple: Данные аутентификации, разрешения и роли (None для отсутствующих)
+        """
+        (auth_data, permissions), roles = await asyncio.gather(
+            self.redis_client.mget([f"{USER_KEY_PREFIX}{user_id}", f"{USER_PERMISSIONS_KEY_PREFIX}{user_id}"]),
+            self.get_user_roles(user_id)
+        )
+        self._record_lookup(auth_data)
+        self._record_lookup(permissions)
+        return auth_data, permissions, roles
     
     async def cache_token_blacklist(
         self,
@@ -153,16 +289,21 @@ class AuthCacheManager:
         
         Args:
             token_hash: Хэш токена
-            expire_time: Время истечения токена
+            expire_time: Время до истечения токена в секундах
             
         Returns:
             bool: True если успешно
         """
-        return await self.redis_client.set(
-            f"blacklist:{token_hash}",
-            True,
-            expire=expire_time
-        )
+        await self.redis_client.ensure_connected()
+        
+        try:
+            await self.redis_client.redis.zadd(
+                TOKEN_BLACKLIST_KEY, {token_hash: int(time.time()) + expire_time}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to blacklist token: {e}")
+            return False
     
     async def is_token_blacklisted(self, token_hash: str) -> bool:
         """
@@ -172,9 +313,32 @@ class AuthCacheManager:
             token_hash: Хэш токена
             
         Returns:
-            bool: True если токен в черном списке
+            bool: True если токен в черном списке и срок записи не истек
         """
-        return await self.redis_client.exists(f"blacklist:{token_hash}")
+        await self.redis_client.ensure_connected()
+        
+        try:
+            if self._blacklist_check_script is None:
+                self._blacklist_check_script = self.redis_client.redis.register_script(BLACKLIST_CHECK_SCRIPT)
+            
+            return bool(await self._blacklist_check_script(
+                keys=[TOKEN_BLACKLIST_KEY],
+                args=[token_hash, int(time.time())],
+                client=self.redis_client.redis
+            ))
+        except Exception as e:
+            logger.error(f"Failed to check token blacklist: {e}")
+            return False
+    
+    async def _cleanup_token_blacklist(self) -> None:
+        """Периодическое удаление истекших записей черного списка токенов."""
+        while True:
+            await asyncio.sleep(BLACKLIST_CLEANUP_INTERVAL)
+            removed = await self.redis_client.zremrangebyscore(
+                TOKEN_BLACKLIST_KEY, "-inf", int(time.time())
+            )
+            if removed:
+                logger.debug(f"Removed {removed} expired tokens from blacklist")
     
     async def cache_login_attempts(
         self,
@@ -185,16 +349,18 @@ class AuthCacheManager:
         """
         Кэширование попыток входа пользователя.
         
+        Запись выполняется в фоне, без ожидания ответа Redis.
+        
         Args:
             user_id: ID пользователя
             attempts: Количество попыток
             ttl: Время жизни в секундах
             
         Returns:
-            bool: True если успешно
+            bool: True если запись поставлена в очередь
         """
-        return await self.redis_client.set(
-            f"login_attempts:{user_id}",
+        return self.writer.set(
+            f"{LOGIN_ATTEMPTS_KEY_PREFIX}{user_id}",
             attempts,
             expire=ttl or 3600  # 1 час по умолчанию
         )
@@ -209,9 +375,44 @@ class AuthCacheManager:
         Returns:
             int: Количество попыток входа
         """
-        attempts = await self.redis_client.get(f"login_attempts:{user_id}")
+        attempts = await self.redis_client.get(f"{LOGIN_ATTEMPTS_KEY_PREFIX}{user_id}")
         return attempts if attempts is not None else 0
     
+    async def check_login_attempt(
+        self,
+        user_id: int,
+        max_attempts: int = MAX_LOGIN_ATTEMPTS
+    ) -> Tuple[bool, int]:
+        """
+        Учет попытки входа пользователя с проверкой лимита.
+        
+        Счетчик увеличивается, получает TTL и сравнивается с лимитом
+        атомарно одним вызовом Lua скрипта (EVALSHA).
+        
+        Args:
+            user_id: ID пользователя
+            max_attempts: Допустимое количество попыток
+            
+        Returns:
+            Tuple[bool, int]: Разрешена ли попытка и новое количество попыток
+        """
+        await self.redis_client.ensure_connected()
+        
+        try:
+            if self._login_attempt_script is None:
+                self._login_attempt_script = self.redis_client.redis.register_script(LOGIN_ATTEMPT_SCRIPT)
+            
+            allowed, attempts = await self._login_attempt_script(
+                keys=[f"{LOGIN_ATTEMPTS_KEY_PREFIX}{user_id}"],
+                args=[LOGIN_ATTEMPTS_TTL, max_attempts],
+                client=self.redis_client.redis
+            )
+            return bool(allowed), attempts
+            
+        except Exception as e:
+            logger.error(f"Failed to register login attempt for user {user_id}: {e}")
+            return True, 0
+    
     async def increment_login_attempts(self, user_id: int) -> int:
         """
         Увеличение количества попыток входа пользователя.
@@ -222,23 +423,22 @@ class AuthCacheManager:
         Returns:
             int: Новое количество попыток
         """
-        current_attempts = await self.get_login_attempts(user_id)
-        new_attempts = current_attempts + 1
-        
-        await self.cache_login_attempts(user_id, new_attempts)
-        return new_attempts
+        _, attempts = await self.check_login_attempt(user_id)
+        return attempts
     
     async def reset_login_attempts(self, user_id: int) -> bool:
         """
         Сброс количества попыток входа пользователя.
         
+        Удаление выполняется в фоне, без ожидания ответа Redis.
+        
         Args:
             user_id: ID пользователя
             
         Returns:
-            bool: True если успешно
+            bool: True если удаление поставлено в очередь
         """
-        return await self.redis_client.delete(f"login_attempts:{user_id}")
+        return self.writer.unlink(f"{LOGIN_ATTEMPTS_KEY_PREFIX}{user_id}")
     
     async def cache_password_reset_token(
         self,
@@ -249,16 +449,18 @@ class AuthCacheManager:
         """
         Кэширование токена сброса пароля.
         
+        Запись выполняется в фоне, без ожидания ответа Redis.
+        
         Args:
             token: Токен сброса пароля
             user_id: ID пользователя
             ttl: Время жизни в секундах
             
         Returns:
-            bool: True если успешно
+            bool: True если запись поставлена в очередь
         """
-        return await self.redis_client.set(
-            f"password_reset:{token}",
+        return self.writer.set(
+            f"{PASSWORD_RESET_KEY_PREFIX}{token}",
             user_id,
             expire=ttl or 3600  # 1 час по умолчанию
         )
@@ -273,7 +475,7 @@ class AuthCacheManager:
         Returns:
             Optional[int]: ID пользователя или None
         """
-        return await self.redis_client.get(f"password_reset:{token}")
+        return await self.redis_client.get(f"{PASSWORD_RESET_KEY_PREFIX}{token}")
     
     async def delete_password_reset_token(self, token: str) -> bool:
         """
@@ -285,7 +487,7 @@ class AuthCacheManager:
         Returns:
             bool: True если успешно
         """
-        return await self.redis_client.delete(f"password_reset:{token}")
+        return await self.redis_client.delete(f"{PASSWORD_RESET_KEY_PREFIX}{token}")
     
     async def invalidate_user_cache(self, user_id: int) -> int:
         """
@@ -297,24 +499,126 @@ class AuthCacheManager:
         Returns:
             int: Количество удаленных ключей
         """
-        # Удаляем все ключи, связанные с пользователем
-        keys_to_delete = [
-            f"user:{user_id}",
-            f"user_permissions:{user_id}",
-            f"user_roles:{user_id}",
-            f"login_attempts:{user_id}"
-        ]
+        await self.redis_client.ensure_connected()
         
-        deleted_count = await self.redis_client.delete(*keys_to_delete)
+        try:
+            # Удаляем все ключи пользователя и кэш cache_manager за один round-trip
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                await self._queue_user_invalidation(pipe, user_id)
+                results = await pipe.execute()
+            
+            return sum(results)
+            
+        except Exception as e:
+            logger.error(f"Failed to invalidate cache for user {user_id}: {e}")
+            return 0
+    
+    async def batch_invalidate_users(self, user_ids: Iterable[int]) -> int:
+        """
+        Инвалидация кэша многих пользователей (смена ролей, инцидент безопасности).
         
-        # Также инвалидируем через cache_manager
-        cache_deleted = await self.cache_manager.invalidate_user_cache(user_id)
+        Удаления отправляются pipeline по BATCH_INVALIDATE_CHUNK_SIZE пользователей,
+        то есть один round-trip на пачку вместо нескольких на каждого пользователя.
         
-        return deleted_count + cache_deleted
+        Args:
+            user_ids: ID пользователей
+            
+        Returns:
+            int: Количество удаленных ключей
+        """
+        await self.redis_client.ensure_connected()
+        
+        user_ids = list(user_ids)
+        deleted = 0
+        for start in range(0, len(user_ids), BATCH_INVALIDATE_CHUNK_SIZE):
+            chunk = user_ids[start:start + BATCH_INVALIDATE_CHUNK_SIZE]
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for user_id in chunk:
+                        await self._queue_user_invalidation(pipe, user_id)
+                    deleted += sum(await pipe.execute())
+            except Exception as e:
+                logger.error(f"Failed to invalidate cache for {len(chunk)} users: {e}")
+        
+        return deleted
+    
+    async def _queue_user_invalidation(self, pipe, user_id: int) -> None:
+        """
+        Добавляет в pipeline удаление всех ключей пользователя.
+        
+        UNLINK освобождает память в фоне и не блокирует Redis на больших значениях.
+        
+        Args:
+            pipe: Pipeline Redis
+            user_id: ID пользователя
+        """
+        pipe.unlink(
+            f"{USER_KEY_PREFIX}{user_id}",
+            f"{USER_PERMISSIONS_KEY_PREFIX}{user_id}",
+            f"{USER_ROLES_KEY_PREFIX}{user_id}",
+            f"{LOGIN_ATTEMPTS_KEY_PREFIX}{user_id}"
+        )
+        await self.cache_manager.invalidate_user_cache(user_id, pipe=pipe)
+    
+    def _record_lookup(self, value: Any) -> Any:
+        """
+        Учитывает результат чтения из кэша в счетчиках попаданий и промахов.
+        
+        Args:
+            value: Значение из кэша (None - промах)
+            
+        Returns:
+            Any: То же значение
+        """
+        if value is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return value
+    
+    async def refresh_server_stats(self) -> Dict[str, Any]:
+        """
+        Обновление статистики сервера Redis (INFO memory и DBSIZE одним pipeline).
+        
+        Returns:
+            Dict[str, Any]: Статистика сервера
+        """
+        await self.redis_client.ensure_connected()
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.info("memory")
+                pipe.dbsize()
+                memory, dbsize = await pipe.execute()
+            
+            self._server_stats = {
+                "used_memory": memory.get("used_memory"),
+                "used_memory_peak": memory.get("used_memory_peak"),
+                "keys": dbsize,
+            }
+        except Exception as e:
+            logger.error(f"Failed to refresh Redis server stats: {e}")
+        
+        return self._server_stats
     
     def get_stats(self) -> Dict[str, Any]:
-        """Получение статистики кэша."""
+        """
+        Получение статистики кэша.
+        
+        Не обращается к Redis: возвращает счетчики процесса и последнюю
+        статистику сервера из refresh_server_stats.
+        """
+        total_requests = self._hits + self._misses
         return {
             "cache_stats": self.cache_manager.get_stats(),
+            "auth_cache_stats": {
+                "hits": self._hits,
+                "misses": self._misses,
+                "sets": self._sets,
+                "hit_rate": self._hits / max(total_requests, 1),
+                "total_requests": total_requests
+            },
+            "server_stats": self._server_stats,
+            "dropped_writes": self.writer.dropped,
             "redis_connected": self._is_connected
         }
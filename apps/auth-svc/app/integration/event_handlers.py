@@ -4,26 +4,70 @@
 Содержит логику обработки событий от других сервисов.
 """
 
+import functools
 import logging
-from typing import Dict, Any
+import random
+from typing import Awaitable, Callable, Dict, Any
 
 from packages.py_commons.integration import Event, EventTypes
 
 logger = logging.getLogger(__name__)
 
+# Доля событий входа, попадающих в INFO лог (входы - самое частое событие)
+LOGIN_LOG_SAMPLE_RATE = 0.01
+
+
+def safe_handler(handler: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+    """
+    Декоратор обработчика события: ошибка логируется и не передается потребителю.
+    
+    Args:
+        handler: Обработчик события
+        
+    Returns:
+        Callable[..., Awaitable[None]]: Обработчик с перехватом ошибок
+    """
+    @functools.wraps(handler)
+    async def wrapper(self, event: Event) -> None:
+        try:
+            await handler(self, event)
+        except Exception:
+            logger.exception("Error handling %s event", event.event_type)
+    
+    return wrapper
+
 
 class EventHandlers:
     """Обработчики событий для auth-svc."""
     
     def __init__(self):
         """Инициализация обработчиков событий."""
+        # На каждый тип события ровно один обработчик, список не нужен
+        self._dispatch: Dict[str, Callable[[Event], Awaitable[None]]] = {
+            EventTypes.USER_REGISTERED: self._handle_user_registered,
+            EventTypes.USER_LOGIN: self._handle_user_login,
+            EventTypes.USER_LOGOUT: self._handle_user_logout,
+            EventTypes.USER_PROFILE_UPDATED: self._handle_user_profile_updated,
+        }
+        # Формат EventConsumer.register_handler собирается один раз
         self.handlers = {
-            EventTypes.USER_REGISTERED: [self._handle_user_registered],
-            EventTypes.USER_LOGIN: [self._handle_user_login],
-            EventTypes.USER_LOGOUT: [self._handle_user_logout],
-            EventTypes.USER_PROFILE_UPDATED: [self._handle_user_profile_updated],
+            event_type: [handler] for event_type, handler in self._dispatch.items()
         }
     
+    async def dispatch(self, event: Event) -> None:
+        """
+        Передача события его обработчику.
+        
+        События без обработчика игнорируются.
+        
+        Args:
+            event: Событие
+        """
+        handler = self._dispatch.get(event.event_type)
+        if handler is not None:
+            await handler(event)
+    
+    @safe_handler
     async def _handle_user_registered(self, event: Event) -> None:
         """
         Обработка события регистрации пользователя.
@@ -31,21 +75,18 @@ class EventHandlers:
         Args:
             event: Событие регистрации
         """
-        try:
-            user_id = event.data.get("user_id")
-            user_data = event.data.get("user_data", {})
-            
-            logger.info(f"User {user_id} registered: {user_data}")
-            
-            # Здесь можно добавить логику:
-            # - Отправка приветственного письма
-            # - Создание профиля пользователя
-            # - Настройка уведомлений
-            # - Инициализация аналитики
-            
-        except Exception as e:
-            logger.error(f"Error handling user registration event: {e}")
+        user_id = event.data.get("user_id")
+        user_data = event.data.get("user_data", {})
+        
+        logger.info("User %s registered", user_id, extra={"data": user_data})
+        
+        # Здесь можно добавить логику:
+        # - Отправка приветственного письма
+        # - Создание профиля пользователя
+        # - Настройка уведомлений
+        # - Инициализация аналитики
     
+    @safe_handler
     async def _handle_user_login(self, event: Event) -> None:
         """
         Обработка события входа пользователя.
@@ -53,20 +94,18 @@ class EventHandlers:
         Args:
             event: Событие входа
         """
-        try:
-            user_id = event.data.get("user_id")
-            login_data = event.data.get("login_data", {})
-            
-            logger.info(f"User {user_id} logged in: {login_data}")
-            
-            # Здесь можно добавить логику:
-            # - Обновление статистики входов
-            # - Проверка подозрительной активности
-            # - Отправка уведомления о входе
-            
-        except Exception as e:
-            logger.error(f"Error handling user login event: {e}")
+        user_id = event.data.get("user_id")
+        login_data = event.data.get("login_data", {})
+        
+        if random.random() < LOGIN_LOG_SAMPLE_RATE:
+            logger.info("User %s logged in", user_id, extra={"data": login_data})
+        
+        # Здесь можно добавить логику:
+        # - Обновление статистики входов
+        # - Проверка подозрительной активности
+        # - Отправка уведомления о входе
     
+    @safe_handler
     async def _handle_user_logout(self, event: Event) -> None:
         """
         Обработка события выхода пользователя.
@@ -74,20 +113,17 @@ class EventHandlers:
         Args:
             event: Событие выхода
         """
-        try:
-            user_id = event.data.get("user_id")
-            logout_data = event.data.get("logout_data", {})
-            
-            logger.info(f"User {user_id} logged out: {logout_data}")
-            
-            # Здесь можно добавить логику:
-            # - Инвалидация сессий
-            # - Обновление статистики
-            # - Очистка временных данных
-            
-        except Exception as e:
-            logger.error(f"Error handling user logout event: {e}")
+        user_id = event.data.get("user_id")
+        logout_data = event.data.get("logout_data", {})
+        
+        logger.info("User %s logged out", user_id, extra={"data": logout_data})
+        
+        # Здесь можно добавить логику:
+        # - Инвалидация сессий
+        # - Обновление статистики
+        # - Очистка временных данных
     
+    @safe_handler
     async def _handle_user_profile_updated(self, event: Event) -> None:
         """
         Обработка события обновления профиля пользователя.
@@ -95,19 +131,15 @@ class EventHandlers:
         Args:
             event: Событие обновления профиля
         """
-        try:
-            user_id = event.data.get("user_id")
-            profile_data = event.data.get("profile_data", {})
-            
-            logger.info(f"User {user_id} profile updated: {profile_data}")
-            
-            # Здесь можно добавить логику:
-            # - Обновление кэша пользователя
-            # - Проверка изменений безопасности
-            # - Уведомление о критических изменениях
-            
-        except Exception as e:
-            logger.error(f"Error handling user profile update event: {e}")
+        user_id = event.data.get("user_id")
+        profile_data = event.data.get("profile_data", {})
+        
+        logger.info("User %s profile updated", user_id, extra={"data": profile_data})
+        
+        # Здесь можно добавить логику:
+        # - Обновление кэша пользователя
+        # - Проверка изменений безопасности
+        # - Уведомление о критических изменениях
     
     def get_handlers(self) -> Dict[str, list]:
         """
@@ -4,6 +4,7 @@ HTTP клиенты для взаимодействия с другими сер
 Содержит настройки и утилиты для HTTP запросов к другим сервисам.
 """
 
+import asyncio
 import logging
 from typing import Dict, Any, Optional
 
@@ -22,11 +23,13 @@ class ServiceClients:
         """Инициализация клиентов сервисов."""
         self.client_manager = HTTPClientManager()
         self.token_manager: Optional[TokenManager] = None
+        self._clients: Dict[str, ServiceHTTPClient] = {}
         self._setup_clients()
     
     def _setup_clients(self) -> None:
         """Настройка клиентов сервисов."""
         # Регистрируем все сервисы
+        self.client_manager.register_service(ServiceConfigs.auth_service())
         self.client_manager.register_service(ServiceConfigs.album_service())
         self.client_manager.register_service(ServiceConfigs.media_service())
         self.client_manager.register_service(ServiceConfigs.qr_service())
@@ -37,12 +40,25 @@ class ServiceClients:
         self.client_manager.register_service(ServiceConfigs.moderation_service())
         self.client_manager.register_service(ServiceConfigs.print_service())
         
+        # Клиенты живут все время работы процесса, храним их напрямую
+        self._clients = dict(self.client_manager.clients)
+        
         # Настраиваем менеджер токенов
         auth_client = self.client_manager.get_client("auth-svc")
         self.token_manager = TokenManager(auth_client)
         
         logger.info("Service clients initialized")
     
+    async def warm_up(self) -> None:
+        """
+        Прогрев клиентов всех сервисов.
+        
+        Соединения со всеми сервисами устанавливаются параллельно при запуске,
+        а не при первом запросе пользователя.
+        """
+        results = await asyncio.gather(*(client.warm_up() for client in self._clients.values()))
+        logger.info(f"Service clients warmed up: {sum(results)}/{len(results)} reachable")
+    
     async def close_all(self) -> None:
         """Закрытие всех клиентов."""
         await self.client_manager.close_all()
@@ -58,7 +74,10 @@ class ServiceClients:
         Returns:
             ServiceHTTPClient: HTTP клиент
         """
-        return self.client_manager.get_client(service_name)
+        client = self._clients.get(service_name)
+        if client is None:
+            raise KeyError(f"Service {service_name} not registered")
+        return client
     
     async def validate_user_token(self, token: str) -> Dict[str, Any]:
         """
@@ -135,6 +154,40 @@ class ServiceClients:
         
         return response["data"]
     
+    async def hydrate_user_context(self, token: str) -> Dict[str, Any]:
+        """
+        Сбор контекста пользователя: данные токена, профиль, подписка и лимиты.
+        
+        После валидации токена остальные запросы независимы и выполняются
+        параллельно. Ошибка отдельного сервиса не прерывает сбор контекста:
+        соответствующее поле будет None.
+        
+        Args:
+            token: JWT токен
+            
+        Returns:
+            Dict[str, Any]: Контекст пользователя с ключами user, profile,
+                subscription и limits
+        """
+        user = await self.validate_user_token(token)
+        user_id = user.get("user_id", user.get("id"))
+        
+        results = await asyncio.gather(
+            self.get_user_profile(user_id, token),
+            self.get_user_subscription(user_id, token),
+            self.check_user_limits(user_id, token),
+            return_exceptions=True
+        )
+        
+        context: Dict[str, Any] = {"user": user}
+        for key, result in zip(("profile", "subscription", "limits"), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to load {key} for user {user_id}: {result}")
+                result = None
+            context[key] = result
+        
+        return context
+    
     async def send_notification(
         self,
         user_id: int,
@@ -4,11 +4,31 @@
 Содержит FastAPI приложение и настройку маршрутов для Auth сервиса.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from loguru import logger
 
 from app.routes import health, auth
-from app.database import init_db, close_db
+from app.config import Settings
+from app.database import AsyncSessionLocal, init_db, close_db
+from app.redis_client import close_redis
+from app.services.user_service import UserService
+
+settings = Settings()
+
+
+async def cleanup_expired_tokens() -> None:
+    """Периодическая очистка истекших токенов верификации и восстановления пароля."""
+    while True:
+        await asyncio.sleep(settings.expired_tokens_cleanup_interval_seconds)
+        try:
+            async with AsyncSessionLocal() as db:
+                cleared = await UserService(db).clear_expired_tokens()
+            if cleared:
+                logger.debug(f"Cleared {cleared} expired user tokens")
+        except Exception as e:
+            logger.error(f"Expired tokens cleanup failed: {e}")
 
 
 @asynccontextmanager
@@ -20,9 +40,16 @@ async def lifespan(app: FastAPI):
     """
     # Инициализация при запуске
     await init_db()
+    cleanup_task = asyncio.create_task(cleanup_expired_tokens())
     yield
     # Очистка при остановке
+    cleanup_task.cancel()
+    try:
+        await cleanup_task
+    except asyncio.CancelledError:
+        pass
     await close_db()
+    await close_redis()
 
 
 app = FastAPI(
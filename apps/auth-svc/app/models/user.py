@@ -5,9 +5,10 @@
 """
 
 from datetime import datetime
+from functools import cached_property
 from typing import Optional
 
-from sqlalchemy import String, Boolean, DateTime, Text
+from sqlalchemy import String, Boolean, DateTime, Index, LargeBinary, Text, event, func, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -24,6 +25,21 @@ class User(Base):
     """
     
     __tablename__ = "users"
+    __table_args__ = (
+        # Токены есть лишь у небольшой части пользователей, поэтому индексы частичные
+        Index(
+            "ix_users_reset_token_hash",
+            "reset_token_hash",
+            postgresql_where=text("reset_token_hash IS NOT NULL"),
+        ),
+        Index(
+            "ix_users_verification_token_hash",
+            "verification_token_hash",
+            postgresql_where=text("verification_token_hash IS NOT NULL"),
+        ),
+    )
+    # Временные метки проставляет БД; после INSERT/UPDATE они читаются через RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
     # Основные поля
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
@@ -40,25 +56,32 @@ class User(Base):
     is_superuser: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     
     # Временные метки
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
     last_login: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
-    # Восстановление пароля
-    reset_token: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # Восстановление пароля (хранится только HMAC токена, см. app.utils.tokens.hash_token)
+    reset_token_hash: Mapped[Optional[bytes]] = mapped_column(LargeBinary(32), nullable=True)
     reset_token_expires: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
-    # Email верификация
-    verification_token: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # Email верификация (хранится только HMAC токена)
+    verification_token_hash: Mapped[Optional[bytes]] = mapped_column(LargeBinary(32), nullable=True)
     verification_token_expires: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     def __repr__(self) -> str:
         """Строковое представление пользователя."""
         return f"<User(id={self.id}, email='{self.email}', is_active={self.is_active})>"
     
-    @property
+    @cached_property
     def full_name(self) -> str:
-        """Полное имя пользователя."""
+        """
+        Полное имя пользователя.
+        
+        Значение кэшируется в экземпляре и сбрасывается при изменении
+        имени, фамилии или email, а также при refresh/expire объекта.
+        """
         if self.first_name and self.last_name:
             return f"{self.first_name} {self.last_name}"
         elif self.first_name:
@@ -70,6 +93,7 @@ class User(Base):
     
     def to_dict(self) -> dict:
         """Преобразование в словарь для API."""
+        created_at, updated_at, last_login = self.created_at, self.updated_at, self.last_login
         return {
             "id": self.id,
             "email": self.email,
@@ -79,7 +103,23 @@ class User(Base):
             "is_active": self.is_active,
             "is_verified": self.is_verified,
             "is_superuser": self.is_superuser,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "last_login": self.last_login.isoformat() if self.last_login else None,
+            "created_at": created_at.isoformat() if created_at else None,
+            "updated_at": updated_at.isoformat() if updated_at else None,
+            "last_login": last_login.isoformat() if last_login else None,
         }
+
+
+# Уникальность email без учета регистра; по этому индексу ищется пользователь при входе
+Index("ix_users_email_lower", func.lower(User.email), unique=True)
+
+
+def _reset_full_name(target: User, *args) -> None:
+    """Сбрасывает закэшированное полное имя пользователя."""
+    target.__dict__.pop("full_name", None)
+
+
+# Полное имя зависит от этих полей
+for _attribute in (User.first_name, User.last_name, User.email):
+    event.listen(_attribute, "set", _reset_full_name)
+event.listen(User, "refresh", _reset_full_name)
+event.listen(User, "expire", _reset_full_name)
@@ -16,6 +16,19 @@ from app.utils.password import validate_password_strength
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+async def get_auth_service(db: AsyncSession = Depends(get_db)) -> AuthService:
+    """
+    Зависимость FastAPI: сервис аутентификации для текущего запроса.
+    
+    Args:
+        db: Сессия базы данных
+        
+    Returns:
+        AuthService: Сервис аутентификации
+    """
+    return AuthService(db)
+
+
 class LoginRequest(BaseModel):
     """Модель запроса для входа."""
     email: EmailStr
@@ -56,14 +69,14 @@ class UpdateProfileRequest(BaseModel):
 @router.post("/register")
 async def register(
     request: RegisterRequest,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Регистрация нового пользователя.
     
     Args:
         request: Данные для регистрации
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Результат регистрации
@@ -79,8 +92,6 @@ async def register(
             detail={"password_errors": errors}
         )
     
-    auth_service = AuthService(db)
-    
     try:
         result = await auth_service.register(
             email=request.email,
@@ -99,14 +110,14 @@ async def register(
 @router.post("/login")
 async def login(
     request: LoginRequest,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Вход пользователя в систему.
     
     Args:
         request: Данные для входа
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Токены аутентификации
@@ -114,8 +125,6 @@ async def login(
     Raises:
         HTTPException: При ошибке аутентификации
     """
-    auth_service = AuthService(db)
-    
     result = await auth_service.login(request.email, request.password)
     if not result:
         raise HTTPException(
@@ -129,14 +138,14 @@ async def login(
 @router.post("/verify-email/{verification_token}")
 async def verify_email(
     verification_token: str,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Верификация email пользователя.
     
     Args:
         verification_token: Токен верификации
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Результат верификации
@@ -144,8 +153,6 @@ async def verify_email(
     Raises:
         HTTPException: При ошибке верификации
     """
-    auth_service = AuthService(db)
-    
     success = await auth_service.verify_email(verification_token)
     if not success:
         raise HTTPException(
@@ -159,20 +166,18 @@ async def verify_email(
 @router.post("/password-reset")
 async def initiate_password_reset(
     request: PasswordResetRequest,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Инициация восстановления пароля.
     
     Args:
         request: Email для восстановления пароля
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Результат инициации восстановления
     """
-    auth_service = AuthService(db)
-    
     success = await auth_service.initiate_password_reset(request.email)
     
     # Всегда возвращаем успех для безопасности
@@ -182,14 +187,14 @@ async def initiate_password_reset(
 @router.post("/password-reset/confirm")
 async def confirm_password_reset(
     request: PasswordResetConfirmRequest,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Подтверждение сброса пароля.
     
     Args:
         request: Данные для сброса пароля
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Результат сброса пароля
@@ -205,8 +210,6 @@ async def confirm_password_reset(
             detail={"password_errors": errors}
         )
     
-    auth_service = AuthService(db)
-    
     success = await auth_service.reset_password(request.reset_token, request.new_password)
     if not success:
         raise HTTPException(
@@ -221,7 +224,7 @@ async def confirm_password_reset(
 async def change_password(
     request: ChangePasswordRequest,
     user_id: int,  # TODO: Получать из JWT токена
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Изменение пароля пользователя.
@@ -229,7 +232,7 @@ async def change_password(
     Args:
         request: Данные для изменения пароля
         user_id: ID пользователя
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Результат изменения пароля
@@ -245,8 +248,6 @@ async def change_password(
             detail={"password_errors": errors}
         )
     
-    auth_service = AuthService(db)
-    
     success = await auth_service.change_password(
         user_id=user_id,
         old_password=request.old_password,
@@ -265,14 +266,14 @@ async def change_password(
 @router.get("/me")
 async def get_current_user(
     user_id: int,  # TODO: Получать из JWT токена
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Получение текущего пользователя.
     
     Args:
         user_id: ID пользователя
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Данные пользователя
@@ -280,8 +281,6 @@ async def get_current_user(
     Raises:
         HTTPException: Если пользователь не найден
     """
-    auth_service = AuthService(db)
-    
     user_data = await auth_service.get_current_user(user_id)
     if not user_data:
         raise HTTPException(
@@ -296,7 +295,7 @@ async def get_current_user(
 async def update_profile(
     request: UpdateProfileRequest,
     user_id: int,  # TODO: Получать из JWT токена
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Обновление профиля пользователя.
@@ -304,7 +303,7 @@ async def update_profile(
     Args:
         request: Данные для обновления профиля
         user_id: ID пользователя
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         dict: Обновленные данные пользователя
@@ -312,8 +311,6 @@ async def update_profile(
     Raises:
         HTTPException: Если пользователь не найден
     """
-    auth_service = AuthService(db)
-    
     user_data = await auth_service.update_profile(
         user_id=user_id,
         first_name=request.first_name,
@@ -332,14 +329,14 @@ async def update_profile(
 @router.get("/verify")
 async def verify_token(
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Проверяет JWT токен и возвращает информацию о пользователе.
     
     Args:
         request: HTTP запрос
-        db: Сессия базы данных
+        auth_service: Сервис аутентификации
         
     Returns:
         Dict[str, Any]: Информация о пользователе
@@ -358,9 +355,6 @@ async def verify_token(
     token = auth_header.split(" ")[1]
     
     try:
-        # Создаем сервис аутентификации
-        auth_service = AuthService(db)
-        
         # Проверяем токен
         user_info = await auth_service.verify_token(token)
         if not user_info:
@@ -4,15 +4,26 @@
 Содержит бизнес-логику для аутентификации и авторизации пользователей.
 """
 
+import json
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 
+import redis.asyncio as redis
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.user import User
 from app.services.user_service import UserService
 from app.commons.security import create_access_token, create_refresh_token
 from app.config import Settings
+from app.redis_client import get_redis
+from app.services.token_cache import (
+    cache_token_result,
+    get_user_tokens_version,
+    invalidate_user_tokens,
+    token_cache_key,
+)
 
 settings = Settings()
 
@@ -20,15 +31,17 @@ settings = Settings()
 class AuthService:
     """Сервис аутентификации."""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis_client: Optional[redis.Redis] = None):
         """
         Инициализация сервиса.
         
         Args:
             db: Сессия базы данных
+            redis_client: Клиент Redis для кэша проверки токенов (по умолчанию общий)
         """
         self.db = db
-        self.user_service = UserService(db)
+        self.redis = redis_client if redis_client is not None else get_redis()
+        self.user_service = UserService(db, self.redis)
     
     async def login(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         """
@@ -88,7 +101,7 @@ class AuthService:
         Raises:
             ValueError: Если пользователь с таким email уже существует
         """
-        user = await self.user_service.create_user(
+        user, verification_token = await self.user_service.create_user(
             email=email,
             password=password,
             first_name=first_name,
@@ -97,7 +110,7 @@ class AuthService:
         
         return {
             "user": user.to_dict(),
-            "verification_token": user.verification_token,
+            "verification_token": verification_token,
             "message": "Пользователь успешно зарегистрирован. Проверьте email для верификации."
         }
     
@@ -219,12 +232,24 @@ class AuthService:
         """
         Проверяет JWT токен и возвращает информацию о пользователе.
         
+        Результат кэшируется в Redis по хэшу токена не дольше срока жизни
+        токена и verify_token_cache_ttl_seconds. При недоступности Redis
+        проверка выполняется через БД.
+        
         Args:
             token: JWT токен
             
         Returns:
             Optional[Dict[str, Any]]: Информация о пользователе или None
         """
+        cache_key = token_cache_key(token)
+        try:
+            cached = await self.redis.get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Token cache lookup failed: {e}")
+        
         try:
             from app.commons.security import decode_token
             
@@ -238,19 +263,67 @@ class AuthService:
             if not user_id:
                 return None
             
+            # Версия кэша читается до строки пользователя: если строку изменят
+            # до записи в кэш, устаревший результат туда не попадет
+            cache_version = await get_user_tokens_version(self.redis, int(user_id))
+            
             # Получаем информацию о пользователе
             user = await self.user_service.get_user_by_id(int(user_id))
             if not user:
                 return None
             
-            return {
+            user_info = {
                 "user_id": user.id,
                 "email": user.email,
                 "first_name": user.first_name,
                 "last_name": user.last_name,
                 "is_active": user.is_active,
                 "is_verified": user.is_verified,
+                # Потребители кэшируют ответ не дольше срока жизни токена
+                "exp": payload.get("exp"),
             }
             
         except Exception:
             return None
+        
+        if cache_version is not None:
+            await self._cache_token_result(cache_key, user_info, payload.get("exp"), cache_version)
+        return user_info
+    
+    async def invalidate_user_tokens(self, user_id: int) -> None:
+        """
+        Удаляет из кэша результаты проверки всех токенов пользователя.
+        
+        Args:
+            user_id: ID пользователя
+        """
+        await invalidate_user_tokens(self.redis, user_id)
+    
+    async def _cache_token_result(
+        self,
+        cache_key: str,
+        user_info: Dict[str, Any],
+        exp: Optional[int],
+        version: int
+    ) -> None:
+        """
+        Сохраняет результат проверки токена в кэш.
+        
+        Результат не записывается, если после чтения версии кэш
+        пользователя был сброшен.
+        
+        Args:
+            cache_key: Ключ кэша токена
+            user_info: Информация о пользователе
+            exp: Время истечения токена (unix-время) из payload
+            version: Версия кэша пользователя, прочитанная до чтения из БД
+        """
+        ttl = settings.verify_token_cache_ttl_seconds
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, int(exp - time.time()))
+        if ttl <= 0:
+            return
+        
+        await cache_token_result(
+            self.redis, cache_key, user_info["user_id"], json.dumps(user_info), ttl, version
+        )
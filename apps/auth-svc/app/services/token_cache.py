@@ -0,0 +1,167 @@
+"""
+Кэш результатов проверки токенов.
+
+Содержит ключи Redis для результатов /auth/verify, их запись и инвалидацию.
+Кэш сбрасывается при каждом изменении закэшированных полей пользователя.
+
+Инвалидация увеличивает версию кэша пользователя; результат, прочитанный
+из БД до инвалидации, записывается только если версия не изменилась.
+"""
+
+import hashlib
+from typing import Optional
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.config import Settings
+
+settings = Settings()
+
+# Префиксы ключей кэша проверки токенов: результат по хэшу токена,
+# множество ключей токенов пользователя (для инвалидации) и версия кэша пользователя
+TOKEN_CACHE_KEY_PREFIX = "tok:"
+USER_TOKENS_KEY_PREFIX = "tok_user:"
+USER_TOKENS_VERSION_KEY_PREFIX = "tok_ver:"
+
+# Атомарная инвалидация: удаление результатов из множества, самого множества
+# и увеличение версии за один вызов. Возвращает количество удаленных результатов
+INVALIDATE_USER_TOKENS_SCRIPT = """
+local members = redis.call('SMEMBERS', KEYS[1])
+for i = 1, #members, 1000 do
+    redis.call('UNLINK', unpack(members, i, math.min(i + 999, #members)))
+end
+redis.call('DEL', KEYS[1])
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return #members
+"""
+
+# Запись результата проверки, если версия кэша пользователя не изменилась
+# с момента чтения из БД. Возвращает 1 - записано / 0 - версия изменилась
+CACHE_TOKEN_RESULT_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[3]) or '0') ~= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('SADD', KEYS[2], KEYS[1])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+def token_cache_key(token: str) -> str:
+    """
+    Вычисляет ключ кэша для токена (сам токен в Redis не хранится).
+    
+    Args:
+        token: JWT токен
+    
+    Returns:
+        str: Ключ кэша
+    """
+    return TOKEN_CACHE_KEY_PREFIX + hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def user_tokens_key(user_id: int) -> str:
+    """
+    Вычисляет ключ множества закэшированных токенов пользователя.
+    
+    Args:
+        user_id: ID пользователя
+    
+    Returns:
+        str: Ключ множества
+    """
+    return f"{USER_TOKENS_KEY_PREFIX}{user_id}"
+
+
+def user_tokens_version_key(user_id: int) -> str:
+    """
+    Вычисляет ключ версии кэша токенов пользователя.
+    
+    Args:
+        user_id: ID пользователя
+    
+    Returns:
+        str: Ключ версии
+    """
+    return f"{USER_TOKENS_VERSION_KEY_PREFIX}{user_id}"
+
+
+async def get_user_tokens_version(redis_client: redis.Redis, user_id: int) -> Optional[int]:
+    """
+    Читает версию кэша токенов пользователя.
+    
+    Версию нужно прочитать до чтения пользователя из БД и передать
+    в cache_token_result.
+    
+    Args:
+        redis_client: Клиент Redis
+        user_id: ID пользователя
+    
+    Returns:
+        Optional[int]: Версия или None, если Redis недоступен
+    """
+    try:
+        version = await redis_client.get(user_tokens_version_key(user_id))
+    except Exception as e:
+        logger.warning(f"Failed to read token cache version for user {user_id}: {e}")
+        return None
+    return int(version) if version is not None else 0
+
+
+async def cache_token_result(
+    redis_client: redis.Redis,
+    cache_key: str,
+    user_id: int,
+    value: str,
+    ttl: int,
+    version: int
+) -> bool:
+    """
+    Сохраняет результат проверки токена, если кэш пользователя не сбрасывался.
+    
+    Args:
+        redis_client: Клиент Redis
+        cache_key: Ключ кэша токена
+        user_id: ID пользователя
+        value: Сериализованный результат проверки
+        ttl: Время жизни результата в секундах
+        version: Версия кэша пользователя на момент чтения из БД
+    
+    Returns:
+        bool: True если результат записан
+    """
+    script = redis_client.register_script(CACHE_TOKEN_RESULT_SCRIPT)
+    try:
+        written = await script(
+            keys=[cache_key, user_tokens_key(user_id), user_tokens_version_key(user_id)],
+            args=[value, ttl, settings.verify_token_cache_ttl_seconds, version],
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache token verification result: {e}")
+        return False
+    return bool(written)
+
+
+async def invalidate_user_tokens(redis_client: redis.Redis, user_id: int) -> None:
+    """
+    Удаляет из кэша результаты проверки всех токенов пользователя.
+    
+    Ошибки Redis только логируются: запись в БД уже выполнена,
+    а записи кэша в любом случае истекут по TTL.
+    
+    Args:
+        redis_client: Клиент Redis
+        user_id: ID пользователя
+    """
+    script = redis_client.register_script(INVALIDATE_USER_TOKENS_SCRIPT)
+    try:
+        # Версия живет не меньше результатов, записанных до инвалидации
+        await script(
+            keys=[user_tokens_key(user_id), user_tokens_version_key(user_id)],
+            args=[settings.verify_token_cache_ttl_seconds],
+        )
+    except Exception as e:
+        logger.warning(f"Failed to invalidate token cache for user {user_id}: {e}")
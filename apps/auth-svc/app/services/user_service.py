@@ -4,29 +4,83 @@
 Содержит бизнес-логику для CRUD операций с пользователями.
 """
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 
+import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import Select, select, insert, update, delete, func, or_
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError
 
+from app.config import Settings
 from app.models.user import User
-from app.utils.password import get_password_hash, verify_password
-from app.utils.tokens import generate_verification_token, generate_reset_token, get_token_expiry
+from app.redis_client import get_redis
+from app.services.token_cache import invalidate_user_tokens
+from app.utils.password import get_password_hash_async, verify_password_async
+from app.utils.tokens import generate_verification_token, generate_reset_token, get_token_expiry, hash_token
+
+settings = Settings()
+
+# Ключ HMAC для хэшей токенов верификации и восстановления пароля
+TOKEN_HASH_KEY = settings.token_hash_key or settings.jwt_secret
+
+# Признаки нарушения уникальности email в сообщениях PostgreSQL и SQLite
+# (индексы ix_users_email и ix_users_email_lower, столбец users.email)
+EMAIL_CONFLICT_MARKERS = ("ix_users_email", "users.email")
+
+
+def _is_email_conflict(error: IntegrityError) -> bool:
+    """
+    Проверяет, вызвана ли ошибка нарушением уникальности email.
+    
+    Args:
+        error: Ошибка целостности из БД
+        
+    Returns:
+        bool: True если конфликт по email, False для прочих ошибок схемы
+    """
+    message = str(error.orig)
+    return any(marker in message for marker in EMAIL_CONFLICT_MARKERS)
+
+
+def _where_email(stmt: Select, email: str) -> Select:
+    """
+    Добавляет к запросу поиск одной строки по email без учета регистра.
+    
+    До миграции 0003 в таблице могут оставаться email, различающиеся только
+    регистром; тогда выбирается точное совпадение, а не ошибка MultipleResultsFound.
+    
+    Args:
+        stmt: Запрос SELECT по таблице пользователей
+        email: Email пользователя
+        
+    Returns:
+        Select: Запрос, возвращающий не более одной строки
+    """
+    return (
+        stmt.where(func.lower(User.email) == email.lower())
+        .order_by((User.email == email).desc(), User.id)
+        .limit(1)
+    )
 
 
 class UserService:
     """Сервис для работы с пользователями."""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis_client: Optional[redis.Redis] = None):
         """
         Инициализация сервиса.
         
+        Изменения полей, входящих в кэш проверки токенов (профиль, статус,
+        пароль), сбрасывают этот кэш для пользователя.
+        
         Args:
             db: Сессия базы данных
+            redis_client: Клиент Redis кэша проверки токенов (по умолчанию общий)
         """
         self.db = db
+        self.redis = redis_client if redis_client is not None else get_redis()
     
     async def create_user(
         self,
@@ -34,10 +88,13 @@ class UserService:
         password: str,
         first_name: Optional[str] = None,
         last_name: Optional[str] = None
-    ) -> User:
+    ) -> Tuple[User, str]:
         """
         Создание нового пользователя.
         
+        В БД сохраняется только хэш токена верификации, поэтому сам токен
+        возвращается вызывающему коду вместе с пользователем.
+        
         Args:
             email: Email пользователя
             password: Пароль пользователя
@@ -45,40 +102,50 @@ class UserService:
             last_name: Фамилия пользователя
             
         Returns:
-            User: Созданный пользователь
+            Tuple[User, str]: Созданный пользователь и токен верификации
             
         Raises:
             ValueError: Если пользователь с таким email уже существует
         """
+        # Email хранится в нижнем регистре
+        email = email.lower()
+        
         # Проверка существования пользователя
         existing_user = await self.get_user_by_email(email)
         if existing_user:
             raise ValueError("Пользователь с таким email уже существует")
         
         # Хеширование пароля
-        hashed_password = get_password_hash(password)
+        hashed_password = await get_password_hash_async(password)
         
         # Генерация токена верификации
         verification_token = generate_verification_token()
         verification_expires = get_token_expiry(minutes=24 * 60)  # 24 часа
         
-        # Создание пользователя
-        user = User(
-            email=email,
-            hashed_password=hashed_password,
-            first_name=first_name,
-            last_name=last_name,
-            verification_token=verification_token,
-            verification_token_expires=verification_expires
+        # Создание пользователя: строка со значениями по умолчанию и id
+        # возвращается тем же запросом через RETURNING
+        stmt = (
+            insert(User)
+            .values(
+                email=email,
+                hashed_password=hashed_password,
+                first_name=first_name,
+                last_name=last_name,
+                verification_token_hash=hash_token(verification_token, TOKEN_HASH_KEY),
+                verification_token_expires=verification_expires
+            )
+            .returning(User)
         )
         
         try:
-            self.db.add(user)
+            user = (await self.db.execute(stmt)).scalar_one()
             await self.db.commit()
-            await self.db.refresh(user)
-            return user
-        except IntegrityError:
+            return user, verification_token
+        except IntegrityError as e:
             await self.db.rollback()
+            # Прочие нарушения (например, NOT NULL) - ошибка схемы, а не дубликат
+            if not _is_email_conflict(e):
+                raise
             raise ValueError("Пользователь с таким email уже существует")
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
@@ -104,8 +171,23 @@ class UserService:
         Returns:
             Optional[User]: Пользователь или None
         """
-        result = await self.db.execute(select(User).where(User.email == email))
-        return result.scalar_one_or_none()
+        result = await self.db.execute(_where_email(select(User), email))
+        return result.scalars().first()
+    
+    async def get_auth_row_by_email(self, email: str) -> Optional[Row]:
+        """
+        Получение только полей, нужных для проверки входа, по email.
+        
+        Args:
+            email: Email пользователя
+            
+        Returns:
+            Optional[Row]: Строка (id, hashed_password, is_active) или None
+        """
+        result = await self.db.execute(
+            _where_email(select(User.id, User.hashed_password, User.is_active), email)
+        )
+        return result.first()
     
     async def authenticate_user(self, email: str, password: str) -> Optional[User]:
         """
@@ -118,19 +200,25 @@ class UserService:
         Returns:
             Optional[User]: Пользователь если аутентификация успешна, None иначе
         """
-        user = await self.get_user_by_email(email)
-        if not user:
-            return None
-        
-        if not verify_password(password, user.hashed_password):
+        auth_row = await self.get_auth_row_by_email(email)
+        if not auth_row:
             return None
         
-        if not user.is_active:
+        # Запись в БД только после успешной проверки пароля: неверные попытки
+        # не берут блокировку строки на время bcrypt и не создают нагрузку на запись
+        if not await verify_password_async(password, auth_row.hashed_password) or not auth_row.is_active:
             return None
         
-        # Обновление времени последнего входа
-        await self.update_last_login(user.id)
-        
+        # Полная строка пользователя возвращается тем же UPDATE (RETURNING)
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == auth_row.id)
+            .values(last_login=datetime.utcnow())
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
+        user = result.scalar_one()
+        await self.db.commit()
         return user
     
     async def update_last_login(self, user_id: int) -> None:
@@ -157,29 +245,30 @@ class UserService:
         Returns:
             bool: True если верификация успешна, False иначе
         """
+        # Проверка токена, срока его действия и обновление статуса - один UPDATE
         result = await self.db.execute(
-            select(User).where(User.verification_token == verification_token)
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            return False
-        
-        if user.verification_token_expires and datetime.utcnow() > user.verification_token_expires:
-            return False
-        
-        # Обновление статуса верификации
-        await self.db.execute(
             update(User)
-            .where(User.id == user.id)
+            .where(
+                User.verification_token_hash == hash_token(verification_token, TOKEN_HASH_KEY),
+                or_(
+                    User.verification_token_expires.is_(None),
+                    User.verification_token_expires >= datetime.utcnow()
+                )
+            )
             .values(
                 is_verified=True,
-                verification_token=None,
+                verification_token_hash=None,
                 verification_token_expires=None
             )
+            .returning(User.id)
         )
+        user_id = result.scalar_one_or_none()
         await self.db.commit()
         
+        if user_id is None:
+            return False
+        
+        await invalidate_user_tokens(self.redis, user_id)
         return True
     
     async def initiate_password_reset(self, email: str) -> bool:
@@ -205,7 +294,7 @@ class UserService:
             update(User)
             .where(User.id == user.id)
             .values(
-                reset_token=reset_token,
+                reset_token_hash=hash_token(reset_token, TOKEN_HASH_KEY),
                 reset_token_expires=reset_expires
             )
         )
@@ -225,7 +314,7 @@ class UserService:
             bool: True если сброс успешен, False иначе
         """
         result = await self.db.execute(
-            select(User).where(User.reset_token == reset_token)
+            select(User).where(User.reset_token_hash == hash_token(reset_token, TOKEN_HASH_KEY))
         )
         user = result.scalar_one_or_none()
         
@@ -236,7 +325,7 @@ class UserService:
             return False
         
         # Хеширование нового пароля
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await get_password_hash_async(new_password)
         
         # Обновление пароля
         await self.db.execute(
@@ -244,12 +333,13 @@ class UserService:
             .where(User.id == user.id)
             .values(
                 hashed_password=hashed_password,
-                reset_token=None,
+                reset_token_hash=None,
                 reset_token_expires=None
             )
         )
         await self.db.commit()
         
+        await invalidate_user_tokens(self.redis, user.id)
         return True
     
     async def update_user_profile(
@@ -279,16 +369,20 @@ class UserService:
         if not update_data:
             return await self.get_user_by_id(user_id)
         
-        update_data["updated_at"] = datetime.utcnow()
-        
-        await self.db.execute(
+        # Обновленная строка возвращается тем же запросом (RETURNING), без повторного SELECT
+        result = await self.db.execute(
             update(User)
             .where(User.id == user_id)
             .values(**update_data)
+            .returning(User)
+            .execution_options(populate_existing=True)
         )
+        user = result.scalar_one_or_none()
         await self.db.commit()
         
-        return await self.get_user_by_id(user_id)
+        if user:
+            await invalidate_user_tokens(self.redis, user_id)
+        return user
     
     async def change_password(self, user_id: int, old_password: str, new_password: str) -> bool:
         """
@@ -306,23 +400,21 @@ class UserService:
         if not user:
             return False
         
-        if not verify_password(old_password, user.hashed_password):
+        if not await verify_password_async(old_password, user.hashed_password):
             return False
         
         # Хеширование нового пароля
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await get_password_hash_async(new_password)
         
         # Обновление пароля
         await self.db.execute(
             update(User)
             .where(User.id == user_id)
-            .values(
-                hashed_password=hashed_password,
-                updated_at=datetime.utcnow()
-            )
+            .values(hashed_password=hashed_password)
         )
         await self.db.commit()
         
+        await invalidate_user_tokens(self.redis, user_id)
         return True
     
     async def deactivate_user(self, user_id: int) -> bool:
@@ -338,8 +430,39 @@ class UserService:
         result = await self.db.execute(
             update(User)
             .where(User.id == user_id)
-            .values(is_active=False, updated_at=datetime.utcnow())
+            .values(is_active=False)
+        )
+        await self.db.commit()
+        
+        if result.rowcount == 0:
+            return False
+        
+        await invalidate_user_tokens(self.redis, user_id)
+        return True
+    
+    async def clear_expired_tokens(self) -> int:
+        """
+        Очистка истекших токенов верификации и восстановления пароля.
+        
+        Выполняется периодически в фоне, чтобы частичные индексы по хэшам
+        токенов содержали только действующие токены.
+        
+        Returns:
+            int: Количество очищенных токенов
+        """
+        now = datetime.utcnow()
+        verification_result = await self.db.execute(
+            update(User)
+            .where(User.verification_token_expires < now)
+            .values(verification_token_hash=None, verification_token_expires=None)
+            .execution_options(synchronize_session=False)
+        )
+        reset_result = await self.db.execute(
+            update(User)
+            .where(User.reset_token_expires < now)
+            .values(reset_token_hash=None, reset_token_expires=None)
+            .execution_options(synchronize_session=False)
         )
         await self.db.commit()
         
-        return result.rowcount > 0
+        return verification_result.rowcount + reset_result.rowcount
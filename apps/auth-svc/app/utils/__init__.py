@@ -4,12 +4,15 @@
 Содержит вспомогательные функции для работы с аутентификацией.
 """
 
-from .password import verify_password, get_password_hash
-from .tokens import generate_verification_token, generate_reset_token
+from .password import verify_password, get_password_hash, verify_password_async, get_password_hash_async
+from .tokens import generate_verification_token, generate_reset_token, hash_token
 
 __all__ = [
     "verify_password",
     "get_password_hash", 
+    "verify_password_async",
+    "get_password_hash_async",
     "generate_verification_token",
-    "generate_reset_token"
+    "generate_reset_token",
+    "hash_token"
 ]
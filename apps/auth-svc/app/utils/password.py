@@ -4,11 +4,37 @@
 Содержит функции для хеширования и проверки паролей.
 """
 
+import asyncio
+import os
+import re
 import secrets
-from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 
-# Контекст для работы с паролями
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import bcrypt
+
+from app.config import Settings
+
+settings = Settings()
+
+# Стоимость bcrypt задается в настройках; хеши с другой стоимостью проверяются по своей
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+
+# bcrypt учитывает только первые 72 байта пароля (passlib обрезал так же)
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# Отдельный пул потоков для bcrypt: хеширование не блокирует event loop и не
+# занимает пул по умолчанию. bcrypt отпускает GIL, поэтому потоки работают параллельно
+_password_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="bcrypt"
+)
+
+# Специальные символы, один из которых должен быть в пароле
+PASSWORD_SPECIAL_CHARS = "!@#$%^&*()_+-=[]{}|;:,.<>?"
+
+# Проверки классов символов выполняются regex-движком, без цикла по символам в Python
+_DIGIT_RE = re.compile(r"\d")
+_SPECIAL_CHAR_RE = re.compile(f"[{re.escape(PASSWORD_SPECIAL_CHARS)}]")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -22,7 +48,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True если пароль верный, False иначе
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(
+            plain_password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES],
+            hashed_password.encode("utf-8")
+        )
+    except ValueError:
+        # Хеш в неизвестном формате
+        return False
 
 
 def get_password_hash(password: str) -> str:
@@ -35,7 +68,39 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: Хешированный пароль
     """
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(
+        password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES],
+        bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    ).decode("ascii")
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Проверка пароля в пуле потоков bcrypt.
+    
+    Args:
+        plain_password: Пароль в открытом виде
+        hashed_password: Хешированный пароль
+        
+    Returns:
+        bool: True если пароль верный, False иначе
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Хеширование пароля в пуле потоков bcrypt.
+    
+    Args:
+        password: Пароль в открытом виде
+        
+    Returns:
+        str: Хешированный пароль
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
 
 
 def generate_random_password(length: int = 12) -> str:
@@ -67,16 +132,17 @@ def validate_password_strength(password: str) -> tuple[bool, list[str]]:
     if len(password) < 8:
         errors.append("Пароль должен содержать минимум 8 символов")
     
-    if not any(c.islower() for c in password):
+    # Строчная буква есть, если строка меняется при переводе в верхний регистр (и наоборот)
+    if password.upper() == password:
         errors.append("Пароль должен содержать минимум одну строчную букву")
     
-    if not any(c.isupper() for c in password):
+    if password.lower() == password:
         errors.append("Пароль должен содержать минимум одну заглавную букву")
     
-    if not any(c.isdigit() for c in password):
+    if _DIGIT_RE.search(password) is None:
         errors.append("Пароль должен содержать минимум одну цифру")
     
-    if not any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password):
+    if _SPECIAL_CHAR_RE.search(password) is None:
         errors.append("Пароль должен содержать минимум один специальный символ")
     
     return len(errors) == 0, errors
@@ -4,6 +4,8 @@
 Содержит функции для генерации токенов верификации и восстановления пароля.
 """
 
+import hashlib
+import hmac
 import secrets
 from datetime import datetime, timedelta
 from typing import Optional
@@ -29,6 +31,23 @@ def generate_reset_token() -> str:
     return secrets.token_urlsafe(32)
 
 
+def hash_token(token: str, key: str) -> bytes:
+    """
+    Вычисление HMAC-SHA256 токена.
+    
+    В БД хранится только хэш; поиск по нему выполняется через индекс
+    без сравнения исходных токенов.
+    
+    Args:
+        token: Исходный токен
+        key: Секретный ключ HMAC
+        
+    Returns:
+        bytes: Хэш токена (32 байта)
+    """
+    return hmac.new(key.encode(), token.encode(), hashlib.sha256).digest()
+
+
 def get_token_expiry(minutes: int = 60) -> datetime:
     """
     Получение времени истечения токена.
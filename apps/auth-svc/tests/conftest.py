@@ -0,0 +1,49 @@
+"""
+Общие фикстуры для тестов auth-svc.
+
+Тесты запускаются из каталога сервиса: python -m pytest tests
+"""
+
+import os
+
+# Настройки сервиса читаются при импорте модулей app, поэтому задаются заранее
+os.environ.setdefault("JWT_SECRET", "test-secret-key-for-auth-svc-unit-tests")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from typing import AsyncGenerator
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.user import Base
+
+
+@pytest_asyncio.fixture
+async def db_engine():
+    """In-memory SQLite со схемой моделей сервиса."""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield engine
+    
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session(db_engine) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия тестовой базы данных.
+    
+    Yields:
+        AsyncSession: Сессия с expire_on_commit=False, как в app.database
+    """
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,176 @@
+"""
+Тесты для AuthService.
+
+Покрывают кэш результатов проверки токенов и его инвалидацию
+при изменении закэшированных полей пользователя.
+"""
+
+from types import SimpleNamespace
+
+import jwt
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import update
+
+from app.commons.security import create_access_token
+from app.models.user import User
+from app.services.auth_service import AuthService, settings
+from app.services.token_cache import token_cache_key, user_tokens_key, user_tokens_version_key
+from app.services.user_service import TOKEN_HASH_KEY
+from app.utils.tokens import hash_token
+
+PASSWORD = "Passw0rd!"
+
+
+@pytest_asyncio.fixture
+async def redis_client():
+    """Redis в памяти процесса."""
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def auth_service(db_session, redis_client) -> AuthService:
+    """AuthService с тестовыми БД и Redis."""
+    return AuthService(db_session, redis_client)
+
+
+@pytest_asyncio.fixture
+async def registered(auth_service):
+    """Зарегистрированный пользователь, его токен верификации и access токен."""
+    result = await auth_service.register("user@example.com", PASSWORD, first_name="Ivan")
+    user_id = result["user"]["id"]
+    access_token = create_access_token(subject=str(user_id), secret=settings.jwt_secret, minutes=15)
+    return user_id, result["verification_token"], access_token
+
+
+async def _cached_verify(auth_service, redis_client, access_token):
+    """Проверяет токен и убеждается, что результат попал в кэш."""
+    user_info = await auth_service.verify_token(access_token)
+    assert await redis_client.exists(token_cache_key(access_token))
+    return user_info
+
+
+class TestVerifyTokenCache:
+    """Тесты кэша /auth/verify."""
+    
+    @pytest.mark.asyncio
+    async def test_verify_token_served_from_cache(self, auth_service, redis_client, registered, db_session):
+        """Повторная проверка берется из кэша, без обращения к БД."""
+        user_id, _, access_token = registered
+        first = await _cached_verify(auth_service, redis_client, access_token)
+        
+        # Меняем строку в обход сервиса: кэш об этом не знает
+        await db_session.execute(update(User).where(User.id == user_id).values(first_name="Other"))
+        await db_session.commit()
+        
+        assert await auth_service.verify_token(access_token) == first
+    
+    @pytest.mark.asyncio
+    async def test_verify_token_returns_exp(self, auth_service, redis_client, registered):
+        """Ответ содержит exp токена, в том числе при выдаче из кэша."""
+        _, _, access_token = registered
+        exp = jwt.decode(access_token, options={"verify_signature": False})["exp"]
+        
+        assert (await _cached_verify(auth_service, redis_client, access_token))["exp"] == exp
+        assert (await auth_service.verify_token(access_token))["exp"] == exp
+        assert 0 < await redis_client.ttl(token_cache_key(access_token)) <= 15 * 60
+    
+    @pytest.mark.asyncio
+    async def test_verify_email_invalidates_cache(self, auth_service, redis_client, registered):
+        """После верификации email /verify сразу возвращает is_verified=True."""
+        _, verification_token, access_token = registered
+        assert (await _cached_verify(auth_service, redis_client, access_token))["is_verified"] is False
+        
+        assert await auth_service.verify_email(verification_token)
+        
+        assert not await redis_client.exists(token_cache_key(access_token))
+        assert (await auth_service.verify_token(access_token))["is_verified"] is True
+    
+    @pytest.mark.asyncio
+    async def test_deactivate_user_invalidates_cache(self, auth_service, redis_client, registered):
+        """После деактивации /verify сразу возвращает is_active=False."""
+        user_id, _, access_token = registered
+        assert (await _cached_verify(auth_service, redis_client, access_token))["is_active"] is True
+        
+        assert await auth_service.user_service.deactivate_user(user_id)
+        
+        assert not await redis_client.exists(token_cache_key(access_token))
+        assert (await auth_service.verify_token(access_token))["is_active"] is False
+    
+    @pytest.mark.asyncio
+    async def test_reset_password_invalidates_cache(self, auth_service, redis_client, registered, db_session):
+        """Сброс пароля по токену сбрасывает кэш проверки токенов пользователя."""
+        user_id, _, access_token = registered
+        await _cached_verify(auth_service, redis_client, access_token)
+        
+        await db_session.execute(
+            update(User).where(User.id == user_id).values(reset_token_hash=hash_token("reset", TOKEN_HASH_KEY))
+        )
+        await db_session.commit()
+        
+        assert await auth_service.reset_password("reset", "N3w-passw0rd!")
+        assert not await redis_client.exists(token_cache_key(access_token))
+    
+    @pytest.mark.asyncio
+    async def test_update_profile_invalidates_cache(self, auth_service, redis_client, registered):
+        """Обновление профиля сразу видно через /verify."""
+        user_id, _, access_token = registered
+        await _cached_verify(auth_service, redis_client, access_token)
+        
+        await auth_service.update_profile(user_id, first_name="Petr")
+        
+        assert (await auth_service.verify_token(access_token))["first_name"] == "Petr"
+    
+    @pytest.mark.asyncio
+    async def test_failed_writes_keep_cache(self, auth_service, redis_client, registered):
+        """Неудачная верификация и деактивация несуществующего пользователя кэш не трогают."""
+        _, _, access_token = registered
+        await _cached_verify(auth_service, redis_client, access_token)
+        
+        assert not await auth_service.verify_email("wrong-token")
+        assert not await auth_service.user_service.deactivate_user(999)
+        
+        assert await redis_client.exists(token_cache_key(access_token))
+    
+    @pytest.mark.asyncio
+    async def test_invalidation_removes_entries_and_bumps_version(self, auth_service, redis_client, registered):
+        """Инвалидация удаляет результаты и их множество и увеличивает версию."""
+        user_id, _, access_token = registered
+        await _cached_verify(auth_service, redis_client, access_token)
+        
+        await auth_service.invalidate_user_tokens(user_id)
+        
+        assert not await redis_client.exists(token_cache_key(access_token), user_tokens_key(user_id))
+        assert int(await redis_client.get(user_tokens_version_key(user_id))) == 1
+        assert 0 < await redis_client.ttl(user_tokens_version_key(user_id)) <= settings.verify_token_cache_ttl_seconds
+    
+    @pytest.mark.asyncio
+    async def test_stale_result_not_cached_after_concurrent_invalidation(
+        self, auth_service, redis_client, registered, monkeypatch
+    ):
+        """Результат, прочитанный до деактивации, не записывается в кэш после нее."""
+        user_id, _, access_token = registered
+        get_user_by_id = auth_service.user_service.get_user_by_id
+        
+        async def read_then_deactivate(requested_id):
+            # Строка прочитана, затем пользователя деактивируют до записи в кэш
+            user = await get_user_by_id(requested_id)
+            stale_user = SimpleNamespace(**{
+                field: getattr(user, field)
+                for field in ("id", "email", "first_name", "last_name", "is_active", "is_verified")
+            })
+            monkeypatch.setattr(auth_service.user_service, "get_user_by_id", get_user_by_id)
+            assert await auth_service.user_service.deactivate_user(requested_id)
+            return stale_user
+        
+        monkeypatch.setattr(auth_service.user_service, "get_user_by_id", read_then_deactivate)
+        
+        assert (await auth_service.verify_token(access_token))["is_active"] is True
+        
+        assert not await redis_client.exists(token_cache_key(access_token))
+        assert (await auth_service.verify_token(access_token))["is_active"] is False
+        assert await redis_client.exists(token_cache_key(access_token))
+
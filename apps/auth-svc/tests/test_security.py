@@ -0,0 +1,190 @@
+"""
+Тесты для проверки JWT токенов.
+
+Покрывают собственную проверку подписи HS256 и кэш decode_token.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import jwt
+import pytest
+
+from app.commons import security
+from app.commons.security import create_access_token, decode_token
+
+# Ключи не короче 64 байт, чтобы подходить и для HS512
+SECRET = "test-secret-key-for-auth-svc-unit-tests-".ljust(64, "x")
+OTHER_SECRET = "another-secret-key-for-auth-svc-unit-tests-".ljust(64, "y")
+
+
+def _b64(data: bytes) -> str:
+    """Base64url без выравнивания, как в JWT."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _segment(obj: dict) -> str:
+    """Кодирует часть JWT (header или payload)."""
+    return _b64(json.dumps(obj, separators=(",", ":")).encode())
+
+
+def _sign_hs256(header: dict, payload: dict, secret: str = SECRET) -> str:
+    """Собирает токен с подписью HMAC-SHA256 независимо от alg в заголовке."""
+    signing_input = f"{_segment(header)}.{_segment(payload)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64(signature)}"
+
+
+@pytest.fixture(autouse=True)
+def clear_decode_cache():
+    """Каждый тест начинается с пустым кэшем decode_token."""
+    security._decode_cache.clear()
+    yield
+    security._decode_cache.clear()
+
+
+class TestDecodeToken:
+    """Тесты decode_token."""
+    
+    def test_valid_token(self):
+        """Корректный токен декодируется."""
+        token = create_access_token("42", SECRET)
+        
+        payload = decode_token(token, SECRET)
+        
+        assert payload["sub"] == "42"
+        assert payload == jwt.decode(token, SECRET, algorithms=["HS256"])
+    
+    def test_wrong_secret(self):
+        """Токен, подписанный другим секретом, отклоняется."""
+        token = create_access_token("42", OTHER_SECRET)
+        
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(token, SECRET)
+    
+    def test_tampered_payload(self):
+        """Изменение payload при сохранении подписи отклоняется."""
+        header, _, signature = create_access_token("42", SECRET).split(".")
+        forged_payload = _segment({"sub": "1", "exp": int(time.time()) + 600})
+        
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(f"{header}.{forged_payload}.{signature}", SECRET)
+    
+    @pytest.mark.parametrize("signature", ["", "!!!", "Zm9v"])
+    def test_malformed_signature(self, signature):
+        """Пустая, некорректная или чужая подпись отклоняется."""
+        header, payload, _ = create_access_token("42", SECRET).split(".")
+        
+        with pytest.raises(jwt.InvalidTokenError):
+            decode_token(f"{header}.{payload}.{signature}", SECRET)
+    
+    def test_alg_none(self):
+        """Неподписанный токен (alg=none) отклоняется."""
+        payload = {"sub": "42", "exp": int(time.time()) + 600}
+        token = f"{_segment({'alg': 'none', 'typ': 'JWT'})}.{_segment(payload)}."
+        
+        with pytest.raises(jwt.InvalidTokenError):
+            decode_token(token, SECRET)
+    
+    def test_alg_mismatch_in_header(self):
+        """Заголовок с другим alg отклоняется, даже если подпись HS256 верна."""
+        payload = {"sub": "42", "exp": int(time.time()) + 600}
+        token = _sign_hs256({"alg": "HS512", "typ": "JWT"}, payload)
+        
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(token, SECRET)
+    
+    def test_token_signed_with_other_algorithm(self):
+        """Токен HS512 не проходит проверку как HS256."""
+        token = create_access_token("42", SECRET, algorithm="HS512")
+        
+        with pytest.raises(jwt.InvalidTokenError):
+            decode_token(token, SECRET, algorithm="HS256")
+    
+    def test_expired(self):
+        """Истекший токен отклоняется."""
+        now = int(time.time())
+        token = _sign_hs256({"alg": "HS256", "typ": "JWT"}, {"sub": "42", "iat": now - 120, "exp": now - 60})
+        
+        with pytest.raises(jwt.ExpiredSignatureError):
+            decode_token(token, SECRET)
+    
+    def test_not_before(self):
+        """Токен с nbf в будущем отклоняется."""
+        now = int(time.time())
+        token = _sign_hs256({"alg": "HS256", "typ": "JWT"}, {"sub": "42", "nbf": now + 600, "exp": now + 1200})
+        
+        with pytest.raises(jwt.ImmatureSignatureError):
+            decode_token(token, SECRET)
+    
+    def test_non_hs256_path_uses_library_verification(self):
+        """Для других алгоритмов подпись проверяет PyJWT."""
+        token = create_access_token("42", SECRET, algorithm="HS512")
+        
+        assert decode_token(token, SECRET, algorithm="HS512")["sub"] == "42"
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(token, OTHER_SECRET, algorithm="HS512")
+
+
+class TestDecodeCache:
+    """Тесты кэша decode_token."""
+    
+    def test_cache_hit_skips_verification(self, monkeypatch):
+        """Повторный токен возвращается из кэша без повторной проверки."""
+        token = create_access_token("42", SECRET)
+        decode_token(token, SECRET)
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("signature must not be re-verified")
+        monkeypatch.setattr(security, "_verify_hs256_signature", fail)
+        
+        assert decode_token(token, SECRET)["sub"] == "42"
+    
+    def test_cache_returns_copy(self):
+        """Изменение возвращенного payload не портит кэш."""
+        token = create_access_token("42", SECRET)
+        decode_token(token, SECRET)["sub"] = "mutated"
+        
+        assert decode_token(token, SECRET)["sub"] == "42"
+    
+    def test_cache_is_keyed_by_secret(self):
+        """Закэшированный токен не принимается с другим секретом."""
+        token = create_access_token("42", SECRET)
+        decode_token(token, SECRET)
+        
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(token, OTHER_SECRET)
+    
+    def test_failed_tokens_are_not_cached(self):
+        """Отклоненные токены в кэш не попадают."""
+        token = create_access_token("42", OTHER_SECRET)
+        with pytest.raises(jwt.InvalidSignatureError):
+            decode_token(token, SECRET)
+        
+        assert not security._decode_cache
+    
+    def test_cache_hit_after_expiry_is_rejected(self):
+        """Закэшированный токен отклоняется, как только истекает exp."""
+        exp = int(time.time()) + 1
+        token = _sign_hs256({"alg": "HS256", "typ": "JWT"}, {"sub": "42", "exp": exp})
+        assert decode_token(token, SECRET)["sub"] == "42"
+        assert security._decode_cache
+        
+        time.sleep(max(0.0, exp - time.time()) + 0.1)
+        
+        with pytest.raises(jwt.ExpiredSignatureError):
+            decode_token(token, SECRET)
+        assert not security._decode_cache
+    
+    def test_cache_size_is_bounded(self, monkeypatch):
+        """При переполнении вытесняется самая старая запись."""
+        monkeypatch.setattr(security, "DECODE_CACHE_MAX_SIZE", 2)
+        tokens = [create_access_token(str(user_id), SECRET) for user_id in range(3)]
+        for token in tokens:
+            decode_token(token, SECRET)
+        
+        cached_tokens = [key[0] for key in security._decode_cache]
+        assert cached_tokens == tokens[1:]
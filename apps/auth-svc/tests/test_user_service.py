@@ -0,0 +1,228 @@
+"""
+Тесты для UserService.
+
+Покрывают создание пользователей, обработку ошибок целостности
+и поиск токенов верификации и сброса пароля по HMAC хэшу.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import event, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models.user import User
+from app.services import user_service
+from app.services.user_service import TOKEN_HASH_KEY, UserService
+from app.utils.password import verify_password
+from app.utils.tokens import hash_token
+
+
+class TestCreateUser:
+    """Тесты создания пользователя."""
+    
+    @pytest.mark.asyncio
+    async def test_create_user_returns_server_timestamps(self, db_session):
+        """Временные метки проставляет БД и возвращает их через RETURNING."""
+        user, token = await UserService(db_session).create_user("New@Example.com", "Passw0rd!")
+        
+        assert user.id is not None
+        assert user.email == "new@example.com"
+        assert user.created_at is not None
+        assert user.updated_at is not None
+        assert token
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_email_race_is_reported_as_conflict(self, db_session, monkeypatch):
+        """Нарушение уникальности email при вставке превращается в ValueError."""
+        service = UserService(db_session)
+        await service.create_user("user@example.com", "Passw0rd!")
+        
+        # Имитируем гонку: предварительная проверка не видит существующего пользователя
+        async def no_existing_user(email):
+            return None
+        monkeypatch.setattr(service, "get_user_by_email", no_existing_user)
+        
+        with pytest.raises(ValueError, match="уже существует"):
+            await service.create_user("USER@example.com", "Passw0rd!")
+    
+    @pytest.mark.asyncio
+    async def test_schema_error_is_not_reported_as_duplicate(self, db_session):
+        """Прочие ошибки целостности не маскируются под дубликат email."""
+        # Схема до миграции 0002: created_at NOT NULL без значения по умолчанию
+        await db_session.execute(text("DROP TABLE users"))
+        await db_session.execute(text(
+            "CREATE TABLE users ("
+            "id INTEGER PRIMARY KEY, email VARCHAR(255) NOT NULL UNIQUE, "
+            "hashed_password VARCHAR(255) NOT NULL, first_name VARCHAR(100), last_name VARCHAR(100), "
+            "is_active BOOLEAN NOT NULL, is_verified BOOLEAN NOT NULL, is_superuser BOOLEAN NOT NULL, "
+            "created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL, last_login DATETIME, "
+            "reset_token_hash BLOB, reset_token_expires DATETIME, "
+            "verification_token_hash BLOB, verification_token_expires DATETIME)"
+        ))
+        await db_session.commit()
+        
+        with pytest.raises(IntegrityError):
+            await UserService(db_session).create_user("user@example.com", "Passw0rd!")
+
+
+class TestEmailLookup:
+    """Тесты поиска пользователя по email."""
+    
+    @pytest.mark.asyncio
+    async def test_lookup_is_case_insensitive(self, db_session):
+        """Пользователь находится по email в любом регистре."""
+        service = UserService(db_session)
+        user, _ = await service.create_user("user@example.com", "Passw0rd!")
+        
+        assert (await service.get_user_by_email("USER@Example.com")).id == user.id
+        assert (await service.get_auth_row_by_email("User@example.COM")).id == user.id
+    
+    @pytest.mark.asyncio
+    async def test_case_variant_duplicates_prefer_exact_match(self, db_session):
+        """Email, различающиеся регистром (до миграции 0003), не приводят к ошибке."""
+        await db_session.execute(text("DROP INDEX ix_users_email_lower"))
+        await db_session.execute(text(
+            "INSERT INTO users (email, hashed_password, is_active, is_verified, is_superuser) "
+            "VALUES ('Foo@x.com', 'h1', 1, 0, 0), ('foo@x.com', 'h2', 1, 0, 0)"
+        ))
+        await db_session.commit()
+        service = UserService(db_session)
+        
+        assert (await service.get_user_by_email("foo@x.com")).email == "foo@x.com"
+        assert (await service.get_user_by_email("Foo@x.com")).email == "Foo@x.com"
+        assert (await service.get_auth_row_by_email("FOO@X.COM")).hashed_password == "h1"
+
+
+class TestAuthenticateUser:
+    """Тесты входа пользователя."""
+    
+    @pytest.mark.asyncio
+    async def test_successful_login_records_last_login(self, db_session):
+        """Успешный вход возвращает пользователя с заполненным last_login."""
+        service = UserService(db_session)
+        await service.create_user("user@example.com", "Passw0rd!")
+        
+        user = await service.authenticate_user("User@example.com", "Passw0rd!")
+        
+        assert user is not None
+        assert user.last_login is not None
+        assert user.updated_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_wrong_password_does_not_write(self, db_session):
+        """Неверный пароль не приводит к записи в БД."""
+        service = UserService(db_session)
+        await service.create_user("user@example.com", "Passw0rd!")
+        statements = []
+        event.listen(
+            db_session.bind.sync_engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+        
+        assert await service.authenticate_user("user@example.com", "wrong") is None
+        
+        assert statements
+        assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+
+
+class TestTokenHashes:
+    """Тесты хранения и поиска токенов по HMAC хэшу."""
+    
+    @pytest_asyncio.fixture
+    async def service(self, db_session):
+        """UserService с Redis в памяти процесса."""
+        redis_client = FakeAsyncRedis()
+        yield UserService(db_session, redis_client)
+        await redis_client.aclose()
+    
+    @staticmethod
+    async def _get_user(db_session, user_id: int) -> User:
+        """Читает строку пользователя из БД."""
+        result = await db_session.execute(
+            select(User).where(User.id == user_id).execution_options(populate_existing=True)
+        )
+        return result.scalar_one()
+    
+    @pytest.mark.asyncio
+    async def test_only_hash_is_stored(self, service, db_session):
+        """В БД хранится HMAC токена верификации, а не сам токен."""
+        user, token = await service.create_user("user@example.com", "Passw0rd!")
+        
+        stored = (await self._get_user(db_session, user.id)).verification_token_hash
+        
+        assert stored == hash_token(token, TOKEN_HASH_KEY)
+        assert token.encode() not in stored
+    
+    @pytest.mark.asyncio
+    async def test_verify_user_by_token(self, service, db_session):
+        """Верификация по токену помечает пользователя и очищает хэш."""
+        user, token = await service.create_user("user@example.com", "Passw0rd!")
+        
+        assert await service.verify_user(token)
+        
+        stored = await self._get_user(db_session, user.id)
+        assert stored.is_verified is True
+        assert stored.verification_token_hash is None
+        assert stored.verification_token_expires is None
+        assert not await service.verify_user(token)
+    
+    @pytest.mark.asyncio
+    async def test_verify_user_wrong_token(self, service, db_session):
+        """Чужой токен не подходит."""
+        user, token = await service.create_user("user@example.com", "Passw0rd!")
+        
+        assert not await service.verify_user(token + "x")
+        assert (await self._get_user(db_session, user.id)).is_verified is False
+    
+    @pytest.mark.asyncio
+    async def test_verify_user_expired_token(self, service, db_session):
+        """Истекший токен не подходит."""
+        user, token = await service.create_user("user@example.com", "Passw0rd!")
+        await db_session.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(verification_token_expires=datetime.utcnow() - timedelta(minutes=1))
+        )
+        await db_session.commit()
+        
+        assert not await service.verify_user(token)
+        assert (await self._get_user(db_session, user.id)).is_verified is False
+    
+    @pytest.mark.asyncio
+    async def test_reset_password_by_token(self, service, db_session, monkeypatch):
+        """Сброс пароля находит пользователя по хэшу токена и очищает его."""
+        monkeypatch.setattr(user_service, "generate_reset_token", lambda: "reset-token")
+        user, _ = await service.create_user("user@example.com", "Passw0rd!")
+        assert await service.initiate_password_reset("user@example.com")
+        
+        stored = await self._get_user(db_session, user.id)
+        assert stored.reset_token_hash == hash_token("reset-token", TOKEN_HASH_KEY)
+        
+        assert not await service.reset_password("other-token", "N3wPassw0rd!")
+        assert await service.reset_password("reset-token", "N3wPassw0rd!")
+        
+        stored = await self._get_user(db_session, user.id)
+        assert stored.reset_token_hash is None
+        assert verify_password("N3wPassw0rd!", stored.hashed_password)
+        assert not await service.reset_password("reset-token", "Passw0rd!")
+    
+    @pytest.mark.asyncio
+    async def test_clear_expired_tokens(self, service, db_session):
+        """Очищаются только истекшие токены."""
+        expired, _ = await service.create_user("expired@example.com", "Passw0rd!")
+        active, _ = await service.create_user("active@example.com", "Passw0rd!")
+        await db_session.execute(
+            update(User)
+            .where(User.id == expired.id)
+            .values(verification_token_expires=datetime.utcnow() - timedelta(minutes=1))
+        )
+        await db_session.commit()
+        
+        assert await service.clear_expired_tokens() == 1
+        
+        assert (await self._get_user(db_session, expired.id)).verification_token_hash is None
+        assert (await self._get_user(db_session, active.id)).verification_token_hash is not None
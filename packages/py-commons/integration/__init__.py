@@ -6,12 +6,12 @@
 
 from .rabbitmq import RabbitMQClient, EventPublisher, EventConsumer
 from .http_client import ServiceHTTPClient, HTTPClientManager
-from .redis_client import RedisClient, CacheManager
+from .redis_client import RedisClient, CacheManager, AsyncPipelineWriter
 from .error_handling import IntegrationError, RetryConfig, CircuitBreaker
 
 __all__ = [
     "RabbitMQClient", "EventPublisher", "EventConsumer",
     "ServiceHTTPClient", "HTTPClientManager", 
-    "RedisClient", "CacheManager",
+    "RedisClient", "CacheManager", "AsyncPipelineWriter",
     "IntegrationError", "RetryConfig", "CircuitBreaker"
 ]
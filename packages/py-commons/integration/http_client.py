@@ -11,7 +11,7 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 import aiohttp
-from aiohttp import ClientSession, ClientTimeout, ClientError
+from aiohttp import ClientSession, ClientTimeout, ClientError, TCPConnector
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,8 @@ class ServiceConfig:
     max_retries: int = 3
     retry_delay: float = 1.0
     headers: Optional[Dict[str, str]] = None
+    max_connections: int = 100
+    keepalive_timeout: float = 30.0
 
 
 @dataclass
@@ -65,12 +67,41 @@ class ServiceHTTPClient:
         """Создание HTTP сессии."""
         if self.session is None or self.session.closed:
             timeout = ClientTimeout(total=self.config.timeout)
+            # Keep-alive соединения переиспользуются между запросами к сервису
+            connector = TCPConnector(
+                limit=self.config.max_connections,
+                keepalive_timeout=self.config.keepalive_timeout
+            )
             self.session = ClientSession(
                 base_url=self.config.base_url,
                 timeout=timeout,
-                headers=self.config.headers or {}
+                headers=self.config.headers or {},
+                connector=connector
             )
     
+    async def warm_up(self, path: str = "/health") -> bool:
+        """
+        Прогрев клиента: создание сессии и установка соединения с сервисом.
+        
+        Выполняет один запрос без повторных попыток, чтобы первый реальный
+        запрос не тратил время на установку соединения.
+        
+        Args:
+            path: Путь легкого эндпоинта сервиса
+            
+        Returns:
+            bool: True если сервис ответил
+        """
+        await self._create_session()
+        
+        try:
+            async with self.session.get(path) as response:
+                await response.read()
+                return True
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.config.name} failed: {e}")
+            return False
+    
     async def close(self) -> None:
         """Закрытие HTTP сессии."""
         if self.session and not self.session.closed:
@@ -5,19 +5,32 @@ Redis клиент для кэширования и межсервисного 
 """
 
 import asyncio
-import json
 import logging
-import pickle
 from typing import Any, Dict, Optional, List, Union, Callable
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+import orjson
 import redis.asyncio as redis
 from redis.asyncio import Redis, ConnectionPool
+from redis.asyncio.client import Pipeline
 
 logger = logging.getLogger(__name__)
 
 
+def _dumps(value: Any) -> bytes:
+    """
+    Сериализация значения для кэша в JSON через orjson.
+    
+    Args:
+        value: Значение
+        
+    Returns:
+        bytes: JSON представление значения
+    """
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
 @dataclass
 class CacheConfig:
     """Конфигурация кэша."""
@@ -30,6 +43,7 @@ class CacheConfig:
     socket_connect_timeout: int = 5
     retry_on_timeout: bool = True
     decode_responses: bool = True
+    health_check_interval: int = 30
 
 
 class RedisClient:
@@ -43,25 +57,34 @@ class RedisClient:
             config: Конфигурация Redis
         """
         self.config = config
+        self.pool: Optional[ConnectionPool] = None
         self.redis: Optional[Redis] = None
         self._is_connected = False
     
     async def connect(self) -> None:
-        """Подключение к Redis."""
+        """
+        Подключение к Redis.
+        
+        Пул соединений создается один раз и переиспользуется при повторных
+        подключениях: AUTH/SELECT выполняются один раз на соединение пула,
+        а не на каждую команду или переподключение.
+        """
         try:
-            pool = ConnectionPool(
-                host=self.config.host,
-                port=self.config.port,
-                db=self.config.db,
-                password=self.config.password,
-                max_connections=self.config.max_connections,
-                socket_timeout=self.config.socket_timeout,
-                socket_connect_timeout=self.config.socket_connect_timeout,
-                retry_on_timeout=self.config.retry_on_timeout,
-                decode_responses=self.config.decode_responses
-            )
-            
-            self.redis = Redis(connection_pool=pool)
+            if self.pool is None:
+                self.pool = ConnectionPool(
+                    host=self.config.host,
+                    port=self.config.port,
+                    db=self.config.db,
+                    password=self.config.password,
+                    max_connections=self.config.max_connections,
+                    socket_timeout=self.config.socket_timeout,
+                    socket_connect_timeout=self.config.socket_connect_timeout,
+                    retry_on_timeout=self.config.retry_on_timeout,
+                    decode_responses=self.config.decode_responses,
+                    health_check_interval=self.config.health_check_interval
+                )
+            if self.redis is None:
+                self.redis = Redis(connection_pool=self.pool)
             
             # Проверяем подключение
             await self.redis.ping()
@@ -75,7 +98,8 @@ class RedisClient:
     async def disconnect(self) -> None:
         """Отключение от Redis."""
         if self.redis:
-            await self.redis.close()
+            await self.redis.aclose()
+            await self.pool.disconnect()
             self._is_connected = False
             logger.info("Disconnected from Redis")
     
@@ -107,7 +131,7 @@ class RedisClient:
         
         try:
             if serialize:
-                value = json.dumps(value, default=str)
+                value = _dumps(value)
             
             result = await self.redis.set(key, value, ex=expire)
             return bool(result)
@@ -142,8 +166,8 @@ class RedisClient:
             
             if deserialize:
                 try:
-                    return json.loads(value)
-                except (json.JSONDecodeError, TypeError):
+                    return orjson.loads(value)
+                except (orjson.JSONDecodeError, TypeError):
                     return value
             
             return value
@@ -152,6 +176,44 @@ class RedisClient:
             logger.error(f"Failed to get key {key}: {e}")
             return default
     
+    async def mget(
+        self,
+        keys: List[str],
+        deserialize: bool = True,
+        default: Any = None
+    ) -> List[Any]:
+        """
+        Получение значений нескольких ключей за один запрос.
+        
+        Args:
+            keys: Ключи
+            deserialize: Десериализовать ли значения
+            default: Значение по умолчанию для отсутствующих ключей
+            
+        Returns:
+            List[Any]: Значения в порядке ключей
+        """
+        await self.ensure_connected()
+        
+        try:
+            values = await self.redis.mget(keys)
+        except Exception as e:
+            logger.error(f"Failed to get keys {keys}: {e}")
+            return [default] * len(keys)
+        
+        result = []
+        for value in values:
+            if value is None:
+                result.append(default)
+            elif deserialize:
+                try:
+                    result.append(orjson.loads(value))
+                except (orjson.JSONDecodeError, TypeError):
+                    result.append(value)
+            else:
+                result.append(value)
+        return result
+    
     async def delete(self, *keys: str) -> int:
         """
         Удаление ключей из кэша.
@@ -170,6 +232,26 @@ class RedisClient:
             logger.error(f"Failed to delete keys {keys}: {e}")
             return 0
     
+    async def unlink(self, *keys: str) -> int:
+        """
+        Удаление ключей с освобождением памяти в фоне на стороне Redis.
+        
+        В отличие от DEL не блокирует Redis при удалении больших значений.
+        
+        Args:
+            *keys: Ключи для удаления
+            
+        Returns:
+            int: Количество удаленных ключей
+        """
+        await self.ensure_connected()
+        
+        try:
+            return await self.redis.unlink(*keys)
+        except Exception as e:
+            logger.error(f"Failed to unlink keys {keys}: {e}")
+            return 0
+    
     async def exists(self, key: str) -> bool:
         """
         Проверка существования ключа.
@@ -188,6 +270,82 @@ class RedisClient:
             logger.error(f"Failed to check existence of key {key}: {e}")
             return False
     
+    async def incr(self, key: str, amount: int = 1) -> Optional[int]:
+        """
+        Атомарное увеличение целочисленного значения ключа.
+        
+        Args:
+            key: Ключ
+            amount: Величина увеличения
+            
+        Returns:
+            Optional[int]: Новое значение или None при ошибке
+        """
+        await self.ensure_connected()
+        
+        try:
+            return await self.redis.incrby(key, amount)
+        except Exception as e:
+            logger.error(f"Failed to increment key {key}: {e}")
+            return None
+    
+    async def smembers(self, key: str) -> set:
+        """
+        Получение всех элементов множества.
+        
+        Args:
+            key: Ключ множества
+            
+        Returns:
+            set: Элементы множества (пустое, если ключа нет)
+        """
+        await self.ensure_connected()
+        
+        try:
+            return await self.redis.smembers(key)
+        except Exception as e:
+            logger.error(f"Failed to get members of set {key}: {e}")
+            return set()
+    
+    async def sismember(self, key: str, member: str) -> bool:
+        """
+        Проверка принадлежности элемента множеству.
+        
+        Args:
+            key: Ключ множества
+            member: Элемент
+            
+        Returns:
+            bool: True если элемент входит в множество
+        """
+        await self.ensure_connected()
+        
+        try:
+            return bool(await self.redis.sismember(key, member))
+        except Exception as e:
+            logger.error(f"Failed to check member of set {key}: {e}")
+            return False
+    
+    async def zremrangebyscore(self, key: str, min_score: Union[float, str], max_score: Union[float, str]) -> int:
+        """
+        Удаление элементов сортированного множества по диапазону весов.
+        
+        Args:
+            key: Ключ сортированного множества
+            min_score: Минимальный вес (включительно, допускается "-inf")
+            max_score: Максимальный вес (включительно, допускается "+inf")
+            
+        Returns:
+            int: Количество удаленных элементов
+        """
+        await self.ensure_connected()
+        
+        try:
+            return await self.redis.zremrangebyscore(key, min_score, max_score)
+        except Exception as e:
+            logger.error(f"Failed to remove members from sorted set {key}: {e}")
+            return 0
+    
     async def expire(self, key: str, seconds: int) -> bool:
         """
         Установка времени жизни ключа.
@@ -243,6 +401,22 @@ class RedisClient:
             logger.error(f"Failed to get keys with pattern {pattern}: {e}")
             return []
     
+    def pipeline(self, transaction: bool = True) -> Pipeline:
+        """
+        Создание pipeline для отправки нескольких команд за один round-trip.
+        
+        Клиент должен быть подключен (см. ensure_connected).
+        
+        Args:
+            transaction: Выполнять ли команды в MULTI/EXEC
+            
+        Returns:
+            Pipeline: Pipeline Redis
+        """
+        if self.redis is None:
+            raise RuntimeError("Redis client is not connected")
+        return self.redis.pipeline(transaction=transaction)
+    
     async def flushdb(self) -> bool:
         """
         Очистка текущей базы данных.
@@ -260,6 +434,163 @@ class RedisClient:
             return False
 
 
+class AsyncPipelineWriter:
+    """
+    Фоновая запись некритичных команд в Redis.
+    
+    Команды ставятся в очередь без ожидания ответа Redis; фоновая задача
+    собирает их в пачки и отправляет одним pipeline. Ошибки записи
+    только логируются: вызывающий код результат не получает.
+    """
+    
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        max_batch_size: int = 128,
+        flush_interval: float = 0.005,
+        max_queue_size: int = 10000
+    ):
+        """
+        Инициализация писателя.
+        
+        Args:
+            redis_client: Клиент Redis
+            max_batch_size: Максимальное количество команд в одном pipeline
+            flush_interval: Время накопления пачки в секундах
+            max_queue_size: Максимальный размер очереди (при переполнении команды отбрасываются)
+        """
+        self.redis_client = redis_client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._dropped = 0
+    
+    def start(self) -> None:
+        """Запуск фоновой задачи записи."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Остановка фоновой задачи с записью оставшихся в очереди команд."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        while not self._queue.empty():
+            await self._flush(self._drain([]))
+    
+    def submit(self, command: Callable[[Pipeline], Any]) -> bool:
+        """
+        Постановка команды в очередь на запись.
+        
+        Args:
+            command: Функция, добавляющая команду в pipeline
+            
+        Returns:
+            bool: True если команда поставлена в очередь
+        """
+        self.start()
+        
+        try:
+            self._queue.put_nowait(command)
+            return True
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning("Redis write queue is full, command dropped")
+            return False
+    
+    def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """
+        Постановка в очередь установки значения (сериализация как в RedisClient.set).
+        
+        Args:
+            key: Ключ
+            value: Значение
+            expire: Время жизни в секундах
+            
+        Returns:
+            bool: True если команда поставлена в очередь
+        """
+        data = _dumps(value)
+        return self.submit(lambda pipe: pipe.set(key, data, ex=expire))
+    
+    def delete(self, *keys: str) -> bool:
+        """
+        Постановка в очередь удаления ключей.
+        
+        Args:
+            *keys: Ключи для удаления
+            
+        Returns:
+            bool: True если команда поставлена в очередь
+        """
+        return self.submit(lambda pipe: pipe.delete(*keys))
+    
+    def unlink(self, *keys: str) -> bool:
+        """
+        Постановка в очередь удаления ключей через UNLINK.
+        
+        Args:
+            *keys: Ключи для удаления
+            
+        Returns:
+            bool: True если команда поставлена в очередь
+        """
+        return self.submit(lambda pipe: pipe.unlink(*keys))
+    
+    @property
+    def dropped(self) -> int:
+        """Количество команд, отброшенных из-за переполнения очереди."""
+        return self._dropped
+    
+    def _drain(self, batch: List[Callable[[Pipeline], Any]]) -> List[Callable[[Pipeline], Any]]:
+        """
+        Добор команд из очереди в пачку без ожидания.
+        
+        Args:
+            batch: Уже набранные команды
+            
+        Returns:
+            List[Callable[[Pipeline], Any]]: Пачка команд
+        """
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _run(self) -> None:
+        """Цикл фоновой записи: ожидание команды, накопление пачки и отправка."""
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.flush_interval)
+            await self._flush(self._drain(batch))
+    
+    async def _flush(self, batch: List[Callable[[Pipeline], Any]]) -> None:
+        """
+        Отправка пачки команд одним pipeline.
+        
+        Args:
+            batch: Команды
+        """
+        try:
+            await self.redis_client.ensure_connected()
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for command in batch:
+                    command(pipe)
+                results = await pipe.execute(raise_on_error=False)
+            
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                logger.error(f"{len(errors)} of {len(batch)} queued Redis writes failed: {errors[0]}")
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} queued Redis commands: {e}")
+
+
 class CacheManager:
     """Менеджер кэширования с поддержкой различных стратегий."""
     
@@ -503,16 +834,23 @@ class CacheManager:
         """
         return await self.redis.get(self._make_key("analytics", key))
     
-    async def invalidate_user_cache(self, user_id: int) -> int:
+    async def invalidate_user_cache(self, user_id: int, pipe: Optional[Pipeline] = None) -> int:
         """
         Инвалидация кэша пользователя.
         
         Args:
             user_id: ID пользователя
+            pipe: Pipeline, в который нужно добавить удаление вместо отдельного запроса
             
         Returns:
-            int: Количество удаленных ключей
+            int: Количество удаленных ключей (0, если UNLINK добавлен в pipe;
+                результат возвращает pipe.execute())
         """
+        if pipe is not None:
+            # Шаблон не содержит glob-символов, поэтому ключ удаляется напрямую без KEYS
+            pipe.unlink(self._make_key("cache", f"user:{user_id}"))
+            return 0
+        
         return await self.invalidate(f"user:{user_id}")
     
     async def invalidate_album_cache(self, album_id: int) -> int:
@@ -0,0 +1,138 @@
+"""
+Unit тесты для AsyncPipelineWriter.
+
+Тестирует фоновую запись команд в Redis пачками через pipeline.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+
+from packages.py_commons.integration.redis_client import (
+    AsyncPipelineWriter, CacheConfig, RedisClient
+)
+
+
+@pytest_asyncio.fixture
+async def redis_client():
+    """RedisClient поверх Redis в памяти процесса."""
+    client = RedisClient(CacheConfig())
+    client.redis = FakeAsyncRedis(decode_responses=True)
+    client._is_connected = True
+    yield client
+    await client.redis.aclose()
+
+
+@pytest.fixture
+def pipelines(redis_client, monkeypatch) -> list:
+    """Записывает количество команд в каждом отправленном pipeline."""
+    sizes = []
+    create_pipeline = redis_client.pipeline
+    
+    def counting_pipeline(transaction: bool = True):
+        pipe = create_pipeline(transaction=transaction)
+        execute = pipe.execute
+        
+        async def counting_execute(*args, **kwargs):
+            sizes.append(len(pipe.command_stack))
+            return await execute(*args, **kwargs)
+        
+        pipe.execute = counting_execute
+        return pipe
+    
+    monkeypatch.setattr(redis_client, "pipeline", counting_pipeline)
+    return sizes
+
+
+async def _wait_flushed(writer: AsyncPipelineWriter) -> None:
+    """Ожидает, пока фоновая задача отправит все команды из очереди."""
+    for _ in range(100):
+        await asyncio.sleep(writer.flush_interval)
+        if writer._queue.empty():
+            await asyncio.sleep(writer.flush_interval)
+            return
+    raise AssertionError("queued commands were not flushed")
+
+
+class TestAsyncPipelineWriter:
+    """Тесты для AsyncPipelineWriter."""
+    
+    @pytest.mark.unit
+    async def test_set_written_in_background(self, redis_client):
+        """set сериализует значение как RedisClient.set и задает TTL."""
+        writer = AsyncPipelineWriter(redis_client)
+        
+        assert writer.set("user:1", {"id": 1, "email": "user@example.com"}, expire=60)
+        await _wait_flushed(writer)
+        
+        assert await redis_client.get("user:1") == {"id": 1, "email": "user@example.com"}
+        assert 0 < await redis_client.redis.ttl("user:1") <= 60
+        await writer.stop()
+    
+    @pytest.mark.unit
+    async def test_delete_and_unlink(self, redis_client):
+        """delete и unlink удаляют ключи."""
+        await redis_client.redis.mset({"a": "1", "b": "2", "c": "3"})
+        writer = AsyncPipelineWriter(redis_client)
+        
+        writer.delete("a")
+        writer.unlink("b", "c")
+        await _wait_flushed(writer)
+        
+        assert await redis_client.redis.exists("a", "b", "c") == 0
+        await writer.stop()
+    
+    @pytest.mark.unit
+    async def test_commands_batched_by_max_batch_size(self, redis_client, pipelines):
+        """Накопленные команды отправляются пачками не больше max_batch_size."""
+        writer = AsyncPipelineWriter(redis_client, max_batch_size=4)
+        
+        for i in range(10):
+            writer.set(f"key:{i}", i)
+        await _wait_flushed(writer)
+        
+        assert pipelines == [4, 4, 2]
+        assert await redis_client.redis.dbsize() == 10
+        await writer.stop()
+    
+    @pytest.mark.unit
+    async def test_queue_overflow_drops_commands(self, redis_client):
+        """При переполнении очереди команда отбрасывается и учитывается."""
+        writer = AsyncPipelineWriter(redis_client, max_queue_size=2)
+        
+        results = [writer.set(f"key:{i}", i) for i in range(3)]
+        
+        assert results == [True, True, False]
+        assert writer.dropped == 1
+        await writer.stop()
+        assert await redis_client.redis.dbsize() == 2
+    
+    @pytest.mark.unit
+    async def test_stop_flushes_queue(self, redis_client):
+        """stop записывает оставшиеся в очереди команды."""
+        writer = AsyncPipelineWriter(redis_client, flush_interval=60)
+        writer.set("key", "value")
+        
+        await writer.stop()
+        
+        assert await redis_client.get("key") == "value"
+        assert writer._task is None
+    
+    @pytest.mark.unit
+    async def test_failed_command_does_not_stop_writer(self, redis_client):
+        """Ошибка одной команды не отменяет остальные и не останавливает запись."""
+        await redis_client.redis.set("text", "not a number")
+        writer = AsyncPipelineWriter(redis_client)
+        
+        writer.submit(lambda pipe: pipe.incr("text"))
+        writer.set("after_error", 1)
+        await _wait_flushed(writer)
+        writer.set("next_batch", 2)
+        await _wait_flushed(writer)
+        
+        assert await redis_client.get("after_error") == 1
+        assert await redis_client.get("next_batch") == 2
+        assert not writer._task.done()
+        await writer.stop()